@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+
+# Deterministic generator for synthetic RTF documents. Each workload stresses
+# a different part of the parser and DOM builder, and the same workload, size
+# and seed always produce exactly the same document, so timings taken on
+# different revisions can be compared.
+#
+# Documents can also be written to disk for use with other tools:
+#
+#   python -m benchmarks.corpus -o corpus/ --size 1048576
+
+import argparse, os, random
+
+# Words that make up the text of every workload
+WORDS = (
+	'lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod '
+	'tempor incididunt ut labore et dolore magna aliqua enim ad minim veniam '
+	'quis nostrud exercitation ullamco laboris nisi aliquip ex ea commodo '
+	'consequat duis aute irure in reprehenderit voluptate velit esse cillum '
+	'fugiat nulla pariatur excepteur sint occaecat cupidatat non proident'
+).split()
+
+# Character formatting that can be switched on and off, as (on, off) pairs
+TOGGLES = [('\\b ', '\\b0 '), ('\\i ', '\\i0 '), ('\\ul ', '\\ulnone '), ('\\strike ', '\\strike0 ')]
+
+# Default size of a generated document in bytes
+DEFAULT_SIZE = 64 * 1024
+
+# Depth of the groups in the nesting workload
+NESTING_DEPTH = 64
+
+###############################################################################
+
+# Returns the start of a document, including the font and color tables.
+# Anything else that belongs in the header (such as a stylesheet) can be
+# passed in extra.
+def _header(extra = ''):
+
+	return (
+		'{\\rtf1\\ansi\\deff0{\\fonttbl{\\f0\\froman Times New Roman;}{\\f1\\fswiss Arial;}}\n'
+		'{\\colortbl;\\red0\\green0\\blue0;\\red255\\green0\\blue0;\\red0\\green0\\blue255;}\n' +
+		extra
+	)
+
+###############################################################################
+
+# Returns a run of count random words.
+def _words(rng, count):
+
+	return ' '.join(rng.choice(WORDS) for i in range(count))
+
+###############################################################################
+
+# Calls paragraph(rng, i) for i = 0, 1, 2, ... and adds what it returns to the
+# document (after header) until the document is at least size bytes long.
+def _fill(header, size, seed, paragraph):
+
+	rng = random.Random(seed)
+	parts = [header]
+	length = len(header)
+	i = 0
+
+	while length < size:
+		part = paragraph(rng, i)
+		parts.append(part)
+		length += len(part)
+		i += 1
+
+	parts.append('}')
+	return ''.join(parts)
+
+###############################################################################
+
+# Long paragraphs of plain text with the occasional escaped character.
+def textHeavy(size = DEFAULT_SIZE, seed = 0):
+
+	def paragraph(rng, i):
+		return _words(rng, rng.randint(50, 150)) + (" caf\\'e9 " if 0 == i % 7 else ' ') + '\\par\n'
+
+	return _fill(_header(), size, seed, paragraph)
+
+###############################################################################
+
+# Short runs of text separated by bold, italic, underline and strikethrough
+# switching on and off.
+def toggleHeavy(size = DEFAULT_SIZE, seed = 0):
+
+	def paragraph(rng, i):
+
+		parts = []
+		for j in range(rng.randint(10, 30)):
+			on, off = rng.choice(TOGGLES)
+			parts.append(on + _words(rng, rng.randint(1, 3)) + ' ' + off)
+
+		return ''.join(parts) + '\\par\n'
+
+	return _fill(_header(), size, seed, paragraph)
+
+###############################################################################
+
+# Groups nested NESTING_DEPTH deep, each with its own formatting and a little
+# text.
+def deepNesting(size = DEFAULT_SIZE, seed = 0):
+
+	def paragraph(rng, i):
+
+		opening = []
+		for depth in range(NESTING_DEPTH):
+			on = TOGGLES[depth % len(TOGGLES)][0]
+			opening.append('{' + on + rng.choice(WORDS) + ' ')
+
+		return ''.join(opening) + '}' * NESTING_DEPTH + '\\par\n'
+
+	return _fill(_header(), size, seed, paragraph)
+
+###############################################################################
+
+# A stylesheet that makes up most of the document, followed by paragraphs
+# that use its styles.
+def largeStylesheet(size = DEFAULT_SIZE, seed = 0):
+
+	rng = random.Random(seed)
+	alignments = ['\\ql', '\\qc', '\\qr', '\\qj']
+
+	# Roughly 40 bytes per style, with three quarters of the document spent
+	# on the stylesheet
+	styleCount = max(2, size * 3 // 4 // 40)
+	styles = ['{\\s0 Normal;}']
+
+	for i in range(1, styleCount):
+		styles.append(
+			'{\\s' + str(i) + rng.choice(alignments) + rng.choice(TOGGLES)[0].rstrip() +
+			' Style ' + str(i) + ';}\n'
+		)
+
+	stylesheet = '{\\stylesheet' + ''.join(styles) + '}\n'
+
+	def paragraph(rng, i):
+		return '\\pard\\s' + str(rng.randrange(styleCount)) + ' ' + _words(rng, rng.randint(5, 20)) + '\\par\n'
+
+	return _fill(_header(stylesheet), size, seed, paragraph)
+
+###############################################################################
+
+# Paragraphs full of HYPERLINK fields, some of them with formatting inside
+# their results.
+def manyFields(size = DEFAULT_SIZE, seed = 0):
+
+	def paragraph(rng, i):
+
+		parts = []
+		for j in range(rng.randint(2, 6)):
+			parts.append(
+				_words(rng, rng.randint(2, 8)) +
+				' {\\field{\\*\\fldinst HYPERLINK "http://example.com/' + str(i) + '/' + str(j) + '"}'
+				'{\\fldrslt ' + ('\\b ' if 0 == j % 3 else '') + _words(rng, rng.randint(1, 3)) + '}} '
+			)
+
+		return ''.join(parts) + '\\par\n'
+
+	return _fill(_header(), size, seed, paragraph)
+
+###############################################################################
+
+# A few paragraphs, each with a large embedded PNG in hexadecimal.
+def largePict(size = DEFAULT_SIZE, seed = 0):
+
+	imageSize = max(1024, size // 8)
+
+	def paragraph(rng, i):
+
+		data = '89504e470d0a1a0a' + ''.join('%02x' % rng.randrange(256) for j in range(imageSize // 2))
+		lines = [data[j:j + 128] for j in range(0, len(data), 128)]
+
+		return (
+			_words(rng, 10) +
+			' {\\pict\\pngblip\\picw640\\pich480\\picwgoal9600\\pichgoal7200\n' + '\n'.join(lines) + '}' +
+			' ' + _words(rng, 10) + '\\par\n'
+		)
+
+	return _fill(_header(), size, seed, paragraph)
+
+###############################################################################
+
+# Huge \rsidtbl and \listtable groups (which the parser skips) taking up most
+# of the document, followed by a little text.
+def skippedGroups(size = DEFAULT_SIZE, seed = 0):
+
+	rng = random.Random(seed)
+
+	# Roughly 13 bytes per rsid and 200 per list, with a third of the
+	# document spent on each table
+	rsids = ''.join('\\rsid' + str(rng.randrange(10000000, 99999999)) for i in range(max(1, size // 3 // 13)))
+
+	lists = []
+	for i in range(max(1, size // 3 // 200)):
+		lists.append(
+			'{\\list\\listtemplateid' + str(rng.randrange(100000000)) +
+			'{\\listlevel\\levelnfc0\\levelstartat1{\\leveltext\\\'02\\\'00.;}{\\levelnumbers\\\'01;}\\fi-360\\li720}'
+			'{\\listlevel\\levelnfc23\\levelstartat1{\\leveltext\\\'01\\u-3913 ?;}{\\levelnumbers;}\\fi-360\\li1440}'
+			'\\listid' + str(i + 1) + '}\n'
+		)
+
+	header = _header('{\\*\\rsidtbl' + rsids + '}\n{\\*\\listtable' + ''.join(lists) + '}\n')
+
+	def paragraph(rng, i):
+		return _words(rng, rng.randint(20, 60)) + '\\par\n'
+
+	return _fill(header, size, seed, paragraph)
+
+###############################################################################
+
+# Every workload by name, in the order they're reported
+WORKLOADS = {
+	'text':       textHeavy,
+	'toggles':    toggleHeavy,
+	'nesting':    deepNesting,
+	'stylesheet': largeStylesheet,
+	'fields':     manyFields,
+	'pict':       largePict,
+	'skipped':    skippedGroups
+}
+
+###############################################################################
+
+# Returns the document for a workload.
+def generate(workload, size = DEFAULT_SIZE, seed = 0):
+
+	if workload not in WORKLOADS:
+		raise ValueError(str(workload) + ' is not a known workload.')
+
+	return WORKLOADS[workload](size, seed)
+
+###############################################################################
+
+def main(argv = None):
+
+	parser = argparse.ArgumentParser(description = 'Writes synthetic RTF documents for benchmarking.')
+	parser.add_argument('-o', '--output-dir', default = '.', help = 'directory to write documents to')
+	parser.add_argument('--size', type = int, default = DEFAULT_SIZE, help = 'approximate size of each document in bytes')
+	parser.add_argument('--seed', type = int, default = 0, help = 'random seed')
+	parser.add_argument('workloads', nargs = '*', metavar = 'workload', help = 'workloads to generate (defaults to all of them): ' + ', '.join(WORKLOADS))
+
+	options = parser.parse_args(argv)
+
+	for workload in options.workloads:
+		if workload not in WORKLOADS:
+			parser.error(workload + ' is not a known workload.')
+
+	os.makedirs(options.output_dir, exist_ok = True)
+
+	for workload in options.workloads or WORKLOADS:
+		with open(os.path.join(options.output_dir, workload + '.rtf'), 'w') as rtfFile:
+			rtfFile.write(generate(workload, options.size, options.seed))
+
+if __name__ == '__main__':
+	main()
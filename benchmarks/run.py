@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+
+# Benchmarks the parser and DOM builder against the synthetic workloads in
+# corpus.py. For each workload, we time every phase of turning RTF into
+# something useful, report throughput in tokens and megabytes per second and
+# measure peak memory use while the DOM is built. Results can be saved as a
+# baseline and later runs compared against it, so that regressions stand out:
+#
+#   python -m benchmarks.run --save baseline.json
+#   python -m benchmarks.run --baseline baseline.json
+#
+# Phases:
+#
+#   parser     RTFParser.parse() with callbacks that do nothing
+#   dom        RTFDOM.parse()
+#   normalize  RTFDOM.normalize() on the parsed tree
+#   export     RTFDOM.toJSON() on the normalized tree
+#
+# Each phase is run several times and the fastest time is kept, since slower
+# runs only tell us about whatever else the machine was doing.
+
+import argparse, gc, json, platform, re, sys, time, tracemalloc
+
+from pyrtfdom import RTFDOM
+from pyrtfdom.parse import RTFParser
+from pyrtfdom.version import VERSION
+
+from .corpus import DEFAULT_SIZE, WORKLOADS, generate
+
+# Phases in the order they're run and reported
+PHASES = ['parser', 'dom', 'normalize', 'export']
+
+# Phases whose throughput is reported
+THROUGHPUT_PHASES = ['parser', 'dom']
+
+# Default number of times each phase is run
+DEFAULT_REPEAT = 3
+
+# A phase that's this much slower than the baseline (as a fraction) is
+# reported as a regression
+DEFAULT_TOLERANCE = 0.10
+
+# Phases that take only a moment vary a lot from run to run, so a phase also
+# has to be at least this many seconds slower to count as a regression
+NOISE_SECONDS = 0.002
+
+# Matches the tokens the parser reads (see ParseState._getNextToken()):
+# braces, control words with their parameter and delimiting space, control
+# symbols and single characters of text.
+TOKENS = re.compile(r"\\(?:[^\W\d_]+(?:-?\d+)?\s?|'[0-9a-fA-F]{0,2}|.)|.", re.DOTALL)
+
+# Callbacks for benchmarking the parser on its own. onStateChange is left
+# unset, since the parser copies its whole state for every state change it
+# delivers, and that's the DOM's cost rather than the parser's.
+NULL_CALLBACKS = {
+	'onOpenParagraph':   lambda parser: None,
+	'onAppendParagraph': lambda parser, text: None,
+	'onStateChange':     None,
+	'onField':           lambda parser, fldinst, fldrslt: None
+}
+
+###############################################################################
+
+# Returns the number of tokens the parser will read from content.
+def countTokens(content):
+
+	return sum(1 for match in TOKENS.finditer(content))
+
+###############################################################################
+
+# Runs each phase on content repeat times and returns a dict mapping each
+# phase to its fastest time in seconds.
+def timePhases(content, repeat = DEFAULT_REPEAT):
+
+	times = {phase: float('inf') for phase in PHASES}
+	parser = RTFParser({'callbacks': NULL_CALLBACKS})
+
+	for i in range(repeat):
+
+		# Garbage left over from the last run shouldn't be collected on our
+		# time
+		gc.collect()
+
+		parser.openString(content)
+		start = time.perf_counter()
+		parser.parse()
+		times['parser'] = min(times['parser'], time.perf_counter() - start)
+
+		dom = RTFDOM()
+		dom.openString(content)
+		start = time.perf_counter()
+		dom.parse()
+		times['dom'] = min(times['dom'], time.perf_counter() - start)
+
+		start = time.perf_counter()
+		dom.normalize()
+		times['normalize'] = min(times['normalize'], time.perf_counter() - start)
+
+		start = time.perf_counter()
+		dom.toJSON()
+		times['export'] = min(times['export'], time.perf_counter() - start)
+
+	return times
+
+###############################################################################
+
+# Returns the peak number of bytes allocated while building the DOM for
+# content. Tracing allocations slows everything down, so this is done
+# separately from the timed runs.
+def peakMemory(content):
+
+	gc.collect()
+	dom = RTFDOM()
+	dom.openString(content)
+
+	tracemalloc.start()
+
+	try:
+		dom.parse()
+		return tracemalloc.get_traced_memory()[1]
+
+	finally:
+		tracemalloc.stop()
+
+###############################################################################
+
+# Benchmarks a single workload and returns its results as a dict.
+def runWorkload(workload, size = DEFAULT_SIZE, seed = 0, repeat = DEFAULT_REPEAT, memory = True):
+
+	content = generate(workload, size, seed)
+	tokens = countTokens(content)
+	megabytes = len(content.encode('utf-8')) / (1024 * 1024)
+	times = timePhases(content, repeat)
+
+	result = {
+		'bytes':   len(content.encode('utf-8')),
+		'tokens':  tokens,
+		'seconds': times
+	}
+
+	for phase in THROUGHPUT_PHASES:
+		result[phase + 'TokensPerSecond'] = tokens / times[phase] if times[phase] else 0
+		result[phase + 'MBPerSecond'] = megabytes / times[phase] if times[phase] else 0
+
+	if memory:
+		result['peakBytes'] = peakMemory(content)
+
+	return result
+
+###############################################################################
+
+# Runs every workload in workloads and returns the results as a dict that can
+# be saved as a baseline.
+def runAll(workloads, size = DEFAULT_SIZE, seed = 0, repeat = DEFAULT_REPEAT, memory = True, out = None):
+
+	results = {}
+
+	for workload in workloads:
+		results[workload] = runWorkload(workload, size, seed, repeat, memory)
+		if out is not None:
+			writeResult(out, workload, results[workload])
+
+	return {
+		'version':  VERSION,
+		'python':   platform.python_version(),
+		'size':     size,
+		'seed':     seed,
+		'repeat':   repeat,
+		'results':  results
+	}
+
+###############################################################################
+
+# Writes the header of the table written by writeResult().
+def writeHeader(out):
+
+	out.write('%-11s %9s %9s %12s %8s %12s %8s %9s %9s %9s %9s %9s\n' % (
+		'workload', 'bytes', 'tokens',
+		'parse tok/s', 'MB/s', 'dom tok/s', 'MB/s',
+		'parser s', 'dom s', 'normal s', 'export s', 'peak MB'
+	))
+
+###############################################################################
+
+# Writes a line of the results table for a workload.
+def writeResult(out, workload, result):
+
+	seconds = result['seconds']
+
+	out.write('%-11s %9d %9d %12.0f %8.3f %12.0f %8.3f %9.4f %9.4f %9.4f %9.4f %9s\n' % (
+		workload,
+		result['bytes'],
+		result['tokens'],
+		result['parserTokensPerSecond'],
+		result['parserMBPerSecond'],
+		result['domTokensPerSecond'],
+		result['domMBPerSecond'],
+		seconds['parser'],
+		seconds['dom'],
+		seconds['normalize'],
+		seconds['export'],
+		'%.2f' % (result['peakBytes'] / (1024 * 1024)) if 'peakBytes' in result else '-'
+	))
+	out.flush()
+
+###############################################################################
+
+# Compares results with a baseline (both as returned by runAll()), writes a
+# line for every phase of every workload they have in common and returns the
+# number of regressions: phases that took more than tolerance longer than
+# they did in the baseline (and at least NOISE_SECONDS longer), or peak
+# memory that grew by more than tolerance.
+def compare(results, baseline, out, tolerance = DEFAULT_TOLERANCE):
+
+	regressions = 0
+
+	if (results['size'], results['seed']) != (baseline['size'], baseline['seed']):
+		out.write(
+			'Warning: baseline was generated with size %d and seed %d, not %d and %d.\n' %
+			(baseline['size'], baseline['seed'], results['size'], results['seed'])
+		)
+
+	out.write('\n%-11s %-10s %12s %12s %9s\n' % ('workload', 'phase', 'baseline', 'current', 'change'))
+
+	for workload, result in results['results'].items():
+
+		if workload not in baseline['results']:
+			continue
+
+		old = baseline['results'][workload]
+		pairs = [(phase, old['seconds'].get(phase), result['seconds'][phase], NOISE_SECONDS) for phase in PHASES]
+
+		if 'peakBytes' in old and 'peakBytes' in result:
+			pairs.append(('peak MB', old['peakBytes'] / (1024 * 1024), result['peakBytes'] / (1024 * 1024), 0))
+
+		for phase, before, after, noise in pairs:
+
+			if not before:
+				continue
+
+			change = (after - before) / before
+			flag = ''
+
+			if change > tolerance and after - before > noise:
+				flag = '  REGRESSION'
+				regressions += 1
+
+			out.write('%-11s %-10s %12.4f %12.4f %+8.1f%%%s\n' % (workload, phase, before, after, change * 100, flag))
+
+	return regressions
+
+###############################################################################
+
+def main(argv = None):
+
+	parser = argparse.ArgumentParser(description = 'Benchmarks the RTF parser and DOM builder on synthetic documents.')
+	parser.add_argument('workloads', nargs = '*', metavar = 'workload', help = 'workloads to run (defaults to all of them): ' + ', '.join(WORKLOADS))
+	parser.add_argument('--size', type = int, default = DEFAULT_SIZE, help = 'approximate size of each document in bytes')
+	parser.add_argument('--seed', type = int, default = 0, help = 'random seed for the generated documents')
+	parser.add_argument('--repeat', type = int, default = DEFAULT_REPEAT, help = 'number of times to run each phase')
+	parser.add_argument('--no-memory', action = 'store_true', help = "don't measure peak memory")
+	parser.add_argument('--save', metavar = 'FILE', help = 'save the results to FILE as JSON')
+	parser.add_argument('--baseline', metavar = 'FILE', help = 'compare the results with a baseline saved by --save')
+	parser.add_argument('--tolerance', type = float, default = DEFAULT_TOLERANCE, help = 'fraction by which a phase can slow down before it counts as a regression')
+
+	options = parser.parse_args(argv)
+
+	for workload in options.workloads:
+		if workload not in WORKLOADS:
+			parser.error(workload + ' is not a known workload.')
+
+	baseline = None
+	if options.baseline:
+		with open(options.baseline) as baselineFile:
+			baseline = json.load(baselineFile)
+
+	writeHeader(sys.stdout)
+	results = runAll(
+		options.workloads or list(WORKLOADS),
+		options.size,
+		options.seed,
+		options.repeat,
+		not options.no_memory,
+		sys.stdout
+	)
+
+	if options.save:
+		with open(options.save, 'w') as saveFile:
+			json.dump(results, saveFile, indent = '\t', sort_keys = True)
+
+	if baseline is not None and compare(results, baseline, sys.stdout, options.tolerance):
+		return 1
+
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
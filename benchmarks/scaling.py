@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+
+# Checks that the time it takes to build a DOM grows linearly with the size of
+# whatever's being parsed. Each dimension generates documents in which one
+# thing (the length of a paragraph, the depth of nested groups, the number of
+# styles, ...) doubles from one step to the next while everything else stays
+# the same, and a straight line is fitted to log(time) against log(size). Its
+# slope is the exponent of the growth: about 1 for linear time, about 2 for
+# quadratic time. A dimension whose slope is above the limit fails:
+#
+#   python -m benchmarks.scaling
+#   python -m benchmarks.scaling paragraph nesting --steps 6
+#
+# Timings of small documents are dominated by the fixed cost of setting up a
+# parse, which makes slopes come out lower than they should, so the smallest
+# size of each dimension is picked to take a noticeable amount of time.
+
+import argparse, gc, math, sys, time
+
+from pyrtfdom import RTFDOM
+
+from .corpus import _header
+
+# Default number of sizes each dimension is timed at (each twice the last)
+DEFAULT_STEPS = 5
+
+# Default number of times each document is parsed (the fastest time is kept)
+DEFAULT_REPEAT = 3
+
+# Slope above which a dimension is reported as superlinear. Linear work comes
+# out a little above 1 because of the garbage collector and caches, but
+# quadratic work comes out near 2.
+DEFAULT_MAX_SLOPE = 1.25
+
+###############################################################################
+
+# One paragraph with n words of text in it.
+def paragraphLength(n):
+
+	return _header() + 'lorem ' * n + '\\par}'
+
+###############################################################################
+
+# A paragraph inside n nested groups, each of which changes the formatting.
+def nestingDepth(n):
+
+	return _header() + '{\\b x ' * n + '}' * n + '\\par}'
+
+###############################################################################
+
+# A stylesheet with n styles in it.
+def styleCount(n):
+
+	styles = ''.join('{\\s' + str(i) + '\\qc\\b Style ' + str(i) + ';}' for i in range(n))
+	return _header('{\\stylesheet' + styles + '}') + 'x\\par}'
+
+###############################################################################
+
+# A stylesheet with one style whose name is n words long.
+def styleNameLength(n):
+
+	return _header('{\\stylesheet{\\s1\\qc ' + 'heading ' * n + ';}}') + '\\s1 x\\par}'
+
+###############################################################################
+
+# A \pict with n bytes of image data.
+def imageSize(n):
+
+	data = '89' * n
+	lines = '\n'.join(data[i:i + 128] for i in range(0, len(data), 128))
+	return _header() + 'x {\\pict\\pngblip\\picw1\\pich1\n' + lines + '} y\\par}'
+
+###############################################################################
+
+# A paragraph with n hyperlink fields in it.
+def fieldCount(n):
+
+	field = '{\\field{\\*\\fldinst HYPERLINK "http://example.com/"}{\\fldrslt link}} '
+	return _header() + field * n + '\\par}'
+
+###############################################################################
+
+# One hyperlink field whose result is n words long.
+def fieldResultLength(n):
+
+	return (
+		_header() + '{\\field{\\*\\fldinst HYPERLINK "http://example.com/"}{\\fldrslt ' +
+		'link ' * n + '}}\\par}'
+	)
+
+###############################################################################
+
+# Every dimension by name, as (document generator, smallest size) pairs. The
+# smallest sizes are chosen so that each step takes long enough to time
+# reliably, without the last step taking more than a second or two.
+DIMENSIONS = {
+	'paragraph':  (paragraphLength, 4000),
+	'nesting':    (nestingDepth, 250),
+	'styles':     (styleCount, 250),
+	'stylename':  (styleNameLength, 4000),
+	'pict':       (imageSize, 16000),
+	'fields':     (fieldCount, 200),
+	'fldrslt':    (fieldResultLength, 4000)
+}
+
+###############################################################################
+
+# Returns the fastest of repeat times it takes to build a DOM for content.
+def timeParse(content, repeat = DEFAULT_REPEAT, backend = 'object'):
+
+	best = float('inf')
+
+	for i in range(repeat):
+
+		gc.collect()
+
+		dom = RTFDOM(backend = backend)
+		dom.openString(content)
+
+		start = time.perf_counter()
+		dom.parse()
+		best = min(best, time.perf_counter() - start)
+
+	return best
+
+###############################################################################
+
+# Returns the slope of the least squares line through points, a list of
+# (x, y) pairs.
+def fitSlope(points):
+
+	meanX = sum(x for x, y in points) / len(points)
+	meanY = sum(y for x, y in points) / len(points)
+
+	numerator = sum((x - meanX) * (y - meanY) for x, y in points)
+	denominator = sum((x - meanX) ** 2 for x, y in points)
+
+	return numerator / denominator if denominator else 0.0
+
+###############################################################################
+
+# Times a dimension at steps sizes, doubling from its smallest size (scaled
+# by scale), and returns a list of (size, seconds) pairs along with the slope
+# of log(seconds) against log(size).
+def measure(dimension, steps = DEFAULT_STEPS, repeat = DEFAULT_REPEAT, scale = 1.0, backend = 'object'):
+
+	if dimension not in DIMENSIONS:
+		raise ValueError(str(dimension) + ' is not a known dimension.')
+
+	generator, smallest = DIMENSIONS[dimension]
+	smallest = max(1, int(smallest * scale))
+
+	timings = []
+	for step in range(steps):
+		size = smallest << step
+		timings.append((size, timeParse(generator(size), repeat, backend)))
+
+	slope = fitSlope([(math.log(size), math.log(max(seconds, 1e-9))) for size, seconds in timings])
+
+	return timings, slope
+
+###############################################################################
+
+def main(argv = None):
+
+	parser = argparse.ArgumentParser(description = 'Checks that DOM construction time grows linearly with the size of its input.')
+	parser.add_argument('dimensions', nargs = '*', metavar = 'dimension', help = 'dimensions to check (defaults to all of them): ' + ', '.join(DIMENSIONS))
+	parser.add_argument('--steps', type = int, default = DEFAULT_STEPS, help = 'number of sizes to time each dimension at')
+	parser.add_argument('--repeat', type = int, default = DEFAULT_REPEAT, help = 'number of times to parse each document')
+	parser.add_argument('--scale', type = float, default = 1.0, help = 'factor to multiply the smallest size of each dimension by')
+	parser.add_argument('--max-slope', type = float, default = DEFAULT_MAX_SLOPE, help = 'slope above which a dimension fails')
+	parser.add_argument('--backend', choices = ['object', 'columnar'], default = 'object', help = 'DOM backend to build')
+
+	options = parser.parse_args(argv)
+
+	if options.steps < 2:
+		parser.error('At least two steps are needed to fit a slope.')
+
+	for dimension in options.dimensions:
+		if dimension not in DIMENSIONS:
+			parser.error(dimension + ' is not a known dimension.')
+
+	failures = 0
+
+	sys.stdout.write('%-10s %s %7s\n' % ('dimension', ' '.join('%16s' % ('step ' + str(step)) for step in range(options.steps)), 'slope'))
+
+	for dimension in options.dimensions or DIMENSIONS:
+
+		timings, slope = measure(dimension, options.steps, options.repeat, options.scale, options.backend)
+		flag = ''
+
+		if slope > options.max_slope:
+			flag = '  SUPERLINEAR'
+			failures += 1
+
+		sys.stdout.write('%-10s %s %7.2f%s\n' % (
+			dimension,
+			' '.join('%7d %7.4fs' % (size, seconds) for size, seconds in timings),
+			slope,
+			flag
+		))
+		sys.stdout.flush()
+
+	return 1 if failures else 0
+
+if __name__ == '__main__':
+	sys.exit(main())
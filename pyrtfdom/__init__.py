@@ -1,2 +1,8 @@
 from pyrtfdom.dom import RTFDOM
-from pyrtfdom import elements
\ No newline at end of file
+from pyrtfdom.events import iterparse, EventType
+from pyrtfdom.cache import ParseCache
+from pyrtfdom.batch import parseMany
+from pyrtfdom.pool import DOMPool
+from pyrtfdom.profile import ParseProfiler
+from pyrtfdom.trace import ParseTracer
+from pyrtfdom import elements
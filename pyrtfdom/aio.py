@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+
+# An asyncio front end. Documents are read from an asyncio.StreamReader (or
+# any async iterator of chunks) without blocking, and then parsed
+# cooperatively: the parser hands control back to the event loop every few
+# hundred tokens, so many documents can be parsed concurrently on one loop
+# without any of them starving the others (or anything else the loop is
+# doing.)
+#
+# The parser needs the whole document before it can start, so reading always
+# finishes before parsing begins. Groups handled by nested parser states
+# (fields, images, the stylesheet, etc.) are parsed in a single step, which
+# blocks the event loop for as long as the group takes: a document with a
+# large embedded image or field result can hold up the loop even though its
+# token count is low. parse() can instead run large documents in the loop's
+# default executor (see executorSize.)
+
+import asyncio
+
+from .dom import RTFDOM
+from .events import _iterEventSteps
+
+# Number of tokens to parse between each time we yield to the event loop
+DEFAULT_YIELD_EVERY = 256
+
+# Number of bytes to request from a StreamReader at a time
+READ_CHUNK_SIZE = 65536
+
+###############################################################################
+
+# Reads a whole document from source, which is either an object with an async
+# read() method (such as an asyncio.StreamReader) or an async iterator of
+# bytes or str chunks, and returns it as a string. Bytes are decoded as UTF-8.
+async def readSource(source):
+
+	chunks = []
+
+	if hasattr(source, 'read'):
+		while True:
+			chunk = await source.read(READ_CHUNK_SIZE)
+			if not chunk:
+				break
+			chunks.append(chunk)
+
+	else:
+		async for chunk in source:
+			chunks.append(chunk)
+
+	if chunks and isinstance(chunks[0], (bytes, bytearray)):
+		return b''.join(chunks).decode('utf-8')
+
+	return ''.join(chunks)
+
+###############################################################################
+
+# Runs a generator that yields after every token (such as
+# RTFDOM.iterParse()), yielding to the event loop every yieldEvery tokens.
+# Anything other than None that the generator yields is passed along.
+async def _cooperate(steps, yieldEvery):
+
+	count = 0
+
+	for step in steps:
+
+		if step is not None:
+			yield step
+
+		count += 1
+		if count >= yieldEvery:
+			count = 0
+			await asyncio.sleep(0)
+
+###############################################################################
+
+# Reads and parses a document from source (see readSource()), and returns the
+# resulting RTFDOM. Any keyword arguments are passed on to RTFDOM, including
+# cache (results are loaded from and stored in the cache the same way
+# RTFDOM.parse() does it.) If executorSize is given, documents of at least
+# that many characters are parsed in the event loop's default executor
+# rather than cooperatively on the loop itself, so that no single group can
+# block the loop.
+async def parse(source, yieldEvery = DEFAULT_YIELD_EVERY, executorSize = None, **domOptions):
+
+	dom = RTFDOM(**domOptions)
+	content = await readSource(source)
+	dom.openString(content)
+
+	if executorSize is not None and len(content) >= executorSize:
+		await asyncio.get_running_loop().run_in_executor(None, dom.parse)
+
+	else:
+		async for step in _cooperate(dom.iterParse(), yieldEvery):
+			pass
+
+	return dom
+
+###############################################################################
+
+# Reads a document from source (see readSource()) and asynchronously yields
+# each paragraph as soon as it's been parsed (see
+# RTFDOM.iterParseParagraphs().) Any keyword arguments are passed on to
+# RTFDOM.
+async def iterParagraphs(source, yieldEvery = DEFAULT_YIELD_EVERY, **domOptions):
+
+	dom = RTFDOM(**domOptions)
+	dom.openString(await readSource(source))
+
+	async for para in _cooperate(dom.iterParseParagraphs(True), yieldEvery):
+		yield para
+
+###############################################################################
+
+# Reads a document from source (see readSource()) and asynchronously yields
+# the same Events that events.iterparse() does.
+async def iterparse(source, yieldEvery = DEFAULT_YIELD_EVERY):
+
+	async for events in _cooperate(_iterEventSteps(await readSource(source)), yieldEvery):
+		for event in events:
+			yield event
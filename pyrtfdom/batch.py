@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+# Parses many documents in parallel. Parsing is CPU-bound pure Python, so a
+# single process can only ever use one core. parseMany() spreads files across
+# a pool of worker processes, each of which keeps one warm RTFDOM around for
+# every file it's given, and sends back results in a compact form (serialized
+# trees, text or JSON) rather than pickled object trees, which are slow to
+# transfer and recursive.
+
+import concurrent.futures, os, time, traceback
+
+from collections import Counter, namedtuple
+
+from . import serialize
+from .dom import RTFDOM
+
+###############################################################################
+
+# Returns a dict of counts describing a parsed document: the number of
+# paragraphs, the number of nodes of each type, and the number of characters
+# of text.
+def documentStats(dom):
+
+	nodes = Counter()
+	characters = 0
+
+	for node in dom.iterNodes():
+		nodes[node.nodeType] += 1
+		if 'text' == node.nodeType and node.value:
+			characters += len(node.value)
+
+	return {
+		'paragraphs': dom.paragraphCount(),
+		'nodes':      dict(nodes),
+		'characters': characters
+	}
+
+###############################################################################
+
+# What a worker can send back for each document, and how to produce it
+OUTPUTS = {
+	'serialized': lambda dom: serialize.dumps(dom.rootNode),
+	'text':       lambda dom: dom.toPlainText(),
+	'json':       lambda dom: dom.toJSON(),
+	'markdown':   lambda dom: dom.toMarkdown(),
+	'html':       lambda dom: dom.toHTML(),
+	'rtf':        lambda dom: dom.toRTF(),
+	'stats':      documentStats
+}
+
+# The outcome of parsing a single file. If parsing succeeded, result holds the
+# requested output and error is None. Otherwise, result is None and error is a
+# string describing what went wrong (exceptions themselves aren't always safe
+# to send between processes.) seconds is how long the worker spent reading,
+# parsing and producing output for the file, and size is the file's size in
+# bytes.
+BatchResult = namedtuple('BatchResult', ['path', 'result', 'error', 'seconds', 'size'])
+
+# Each worker process's RTFDOM and the output it should produce
+_workerDOM = None
+_workerOutput = None
+
+###############################################################################
+
+# Sets up a worker process.
+def _initWorker(output, domOptions):
+
+	global _workerDOM, _workerOutput
+
+	_workerDOM = RTFDOM(**domOptions)
+	_workerOutput = OUTPUTS[output]
+
+###############################################################################
+
+# Parses a single file in a worker process. Errors are captured and returned
+# rather than raised, so one bad file can't take the whole batch down.
+def _parseFile(path):
+
+	start = time.perf_counter()
+	size = None
+
+	try:
+		size = os.path.getsize(path)
+		_workerDOM.openFile(path)
+		_workerDOM.parse()
+		result = _workerOutput(_workerDOM)
+		return BatchResult(path, result, None, time.perf_counter() - start, size)
+
+	except Exception as e:
+		return BatchResult(
+			path,
+			None,
+			''.join(traceback.format_exception_only(type(e), e)).strip(),
+			time.perf_counter() - start,
+			size
+		)
+
+	finally:
+		_workerDOM.reset()
+
+###############################################################################
+
+# Parses every file in paths using a pool of worker processes and yields a
+# BatchResult for each one. workers is the number of processes to use
+# (defaults to the number of CPUs), and output is one of the keys in OUTPUTS
+# ('serialized' trees can be loaded with serialize.loads().) If ordered is
+# True, results are yielded in the same order as paths. Otherwise, they're
+# yielded as soon as they're ready. Any other keyword arguments are passed on
+# to each worker's RTFDOM.
+def parseMany(paths, workers = None, output = 'serialized', ordered = True, **domOptions):
+
+	if output not in OUTPUTS:
+		raise ValueError(str(output) + ' is not a supported output.')
+
+	if workers is None:
+		workers = os.cpu_count() or 1
+
+	executor = concurrent.futures.ProcessPoolExecutor(
+		max_workers = workers,
+		initializer = _initWorker,
+		initargs = (output, domOptions)
+	)
+
+	try:
+
+		if ordered:
+			yield from executor.map(_parseFile, paths)
+
+		else:
+			futures = [executor.submit(_parseFile, path) for path in paths]
+			for future in concurrent.futures.as_completed(futures):
+				yield future.result()
+
+	# If we're abandoned partway through, don't leave work queued up
+	finally:
+		executor.shutdown(wait = True, cancel_futures = True)
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+
+# An on-disk cache of parse results. Each entry is a tree in the binary format
+# described in serialize.py, stored under a hash of the RTF it was parsed
+# from, the package version, the serialization format version, the package's
+# source code and whatever options affect the result, so a stale result can
+# never be served, even if the parser changes without a new version. The cache
+# is bounded in size, and once it grows too large the least recently used
+# entries are evicted.
+#
+# Entries are written atomically, so several processes can safely share the
+# same cache directory.
+
+import hashlib, json, os, tempfile
+
+from .serialize import FORMAT_VERSION
+from .version import VERSION
+
+# Default maximum size of the cache in bytes
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Fraction of the maximum size the cache is brought down to once it grows too
+# large, so that a full cache isn't scanned again on every put
+EVICTION_TARGET = 0.9
+
+# Extension given to cache entries
+ENTRY_EXTENSION = '.rtfdom'
+
+# Hash of the package's source code, computed the first time it's needed
+_sourceHash = None
+
+###############################################################################
+
+# Returns a hash of every Python source file in the package, so that cache
+# keys change along with the code that produced the cached trees. If the
+# source isn't available (for example, when the package is loaded from a
+# zip file), the package version is all we have to go on.
+def _getSourceHash():
+
+	global _sourceHash
+
+	if _sourceHash is None:
+
+		sourceHash = hashlib.sha256()
+		packageDir = os.path.dirname(os.path.abspath(__file__))
+
+		for directory, subdirectories, filenames in os.walk(packageDir):
+
+			subdirectories.sort()
+
+			for filename in sorted(filenames):
+				if filename.endswith('.py'):
+
+					path = os.path.join(directory, filename)
+
+					sourceHash.update(os.path.relpath(path, packageDir).encode('utf-8') + b'\0')
+					with open(path, 'rb') as sourceFile:
+						sourceHash.update(sourceFile.read() + b'\0')
+
+		_sourceHash = sourceHash.hexdigest()
+
+	return _sourceHash
+
+class ParseCache(object):
+
+	# directory is where entries are stored (it's created if it doesn't
+	# exist) and maxBytes is how large the cache is allowed to grow.
+	def __init__(self, directory, maxBytes = DEFAULT_MAX_BYTES):
+
+		self.__directory = directory
+		self.__maxBytes = maxBytes
+
+		# Total size of the entries, kept up to date as entries are stored so
+		# that the directory only has to be scanned once the cache might have
+		# grown too large (None until the first scan.) Entries stored by other
+		# processes sharing the directory are picked up by the next scan.
+		self.__totalBytes = None
+
+		os.makedirs(directory, exist_ok = True)
+
+	###########################################################################
+
+	# The directory entries are stored in
+	@property
+	def directory(self):
+
+		return self.__directory
+
+	###########################################################################
+
+	# Returns the path of the entry with the specified key.
+	def __path(self, key):
+
+		return os.path.join(self.__directory, key + ENTRY_EXTENSION)
+
+	###########################################################################
+
+	# Returns the cache key for RTF content (a string or bytes) parsed with
+	# the specified options, which must be JSON serializable.
+	@staticmethod
+	def key(content, options = None):
+
+		if isinstance(content, str):
+			content = content.encode('utf-8')
+
+		keyHash = hashlib.sha256()
+
+		keyHash.update(json.dumps({
+			'version':       VERSION,
+			'formatVersion': FORMAT_VERSION,
+			'source':        _getSourceHash(),
+			'options':       options or {}
+		}, sort_keys = True).encode('utf-8'))
+
+		keyHash.update(b'\0')
+		keyHash.update(content)
+
+		return keyHash.hexdigest()
+
+	###########################################################################
+
+	# Returns the serialized tree stored under key, or None if there isn't
+	# one. Hits count as a use for the purposes of eviction.
+	def get(self, key):
+
+		path = self.__path(key)
+
+		try:
+			with open(path, 'rb') as entryFile:
+				data = entryFile.read()
+		except FileNotFoundError:
+			return None
+
+		# Entries are evicted in order of modification time, so touching an
+		# entry marks it as recently used.
+		try:
+			os.utime(path)
+		except FileNotFoundError:
+			pass
+
+		return data
+
+	###########################################################################
+
+	# Stores a serialized tree under key, then evicts old entries if the cache
+	# has grown too large.
+	def put(self, key, data):
+
+		path = self.__path(key)
+
+		try:
+			replacedBytes = os.stat(path).st_size
+		except FileNotFoundError:
+			replacedBytes = 0
+
+		# Write to a temporary file first and then move it into place, so
+		# nobody can ever read a partially written entry.
+		descriptor, temporaryPath = tempfile.mkstemp(dir = self.__directory, suffix = '.tmp')
+
+		try:
+			with os.fdopen(descriptor, 'wb') as entryFile:
+				entryFile.write(data)
+			os.replace(temporaryPath, path)
+		except BaseException:
+			os.unlink(temporaryPath)
+			raise
+
+		if self.__totalBytes is None:
+			self.__totalBytes = self.__scan()[1]
+		else:
+			self.__totalBytes += len(data) - replacedBytes
+
+		if self.__totalBytes > self.__maxBytes:
+			self.evict()
+
+	###########################################################################
+
+	# Returns a list of (modification time, size, path) tuples for every entry
+	# in the cache, along with their total size.
+	def __scan(self):
+
+		entries = []
+		totalBytes = 0
+
+		with os.scandir(self.__directory) as directoryEntries:
+			for entry in directoryEntries:
+				if entry.name.endswith(ENTRY_EXTENSION):
+					try:
+						stat = entry.stat()
+					except FileNotFoundError:
+						continue
+					entries.append((stat.st_mtime, stat.st_size, entry.path))
+					totalBytes += stat.st_size
+
+		return entries, totalBytes
+
+	###########################################################################
+
+	# If the cache is larger than its maximum size, removes the least recently
+	# used entries until it's no larger than EVICTION_TARGET of that size.
+	def evict(self):
+
+		entries, totalBytes = self.__scan()
+		self.__totalBytes = totalBytes
+
+		if totalBytes <= self.__maxBytes:
+			return
+
+		entries.sort()
+
+		for mtime, size, path in entries:
+
+			try:
+				os.unlink(path)
+			except FileNotFoundError:
+				pass
+
+			totalBytes -= size
+			if totalBytes <= self.__maxBytes * EVICTION_TARGET:
+				break
+
+		self.__totalBytes = totalBytes
+
+	###########################################################################
+
+	# Removes every entry from the cache.
+	def clear(self):
+
+		with os.scandir(self.__directory) as directoryEntries:
+			for entry in directoryEntries:
+				if entry.name.endswith(ENTRY_EXTENSION):
+					try:
+						os.unlink(entry.path)
+					except FileNotFoundError:
+						pass
+
+		self.__totalBytes = 0
@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+
+# The pyrtfdom command. Converts RTF files (named directly, matched by globs,
+# found in directories or read from stdin) to other formats or reports
+# statistics about them, using a pool of worker processes (see batch.py.)
+# Results are written as soon as they're ready, and a summary of throughput
+# and per-file timing is written to stderr at the end.
+#
+# Examples:
+#
+#   pyrtfdom convert -f html -o out/ -j 8 'docs/**/*.rtf'
+#   pyrtfdom text < letter.rtf
+#   pyrtfdom stats corpus/
+
+import argparse, glob, os, sys, time
+
+from .batch import BatchResult, OUTPUTS, parseMany
+from .dom import RTFDOM
+
+# Formats files can be converted to, and the extensions given to the files
+# they're written to
+FORMATS = {
+	'text':     '.txt',
+	'markdown': '.md',
+	'html':     '.html',
+	'json':     '.json',
+	'rtf':      '.rtf'
+}
+
+# Columns written by the stats command
+STATS_COLUMNS = ['path', 'bytes', 'paragraphs', 'nodes', 'characters', 'seconds']
+
+# Default number of slowest files listed in the summary
+DEFAULT_TIMINGS = 10
+
+###############################################################################
+
+# Expands the command line's inputs into a list of paths. Globs are expanded
+# (** matches any number of directories), directories are searched
+# recursively for .rtf files, and '-' stands for stdin. Anything else is
+# assumed to be a file, and if it doesn't exist, that's reported like any
+# other error when we try to parse it.
+def expandInputs(inputs):
+
+	paths = []
+
+	for pattern in inputs:
+
+		if '-' == pattern:
+			paths.append(pattern)
+
+		elif glob.has_magic(pattern):
+			matches = sorted(path for path in glob.glob(pattern, recursive = True) if os.path.isfile(path))
+			if not matches:
+				raise ValueError('No files match ' + pattern + '.')
+			paths.extend(matches)
+
+		elif os.path.isdir(pattern):
+			paths.extend(sorted(glob.glob(os.path.join(pattern, '**', '*.rtf'), recursive = True)))
+
+		else:
+			paths.append(pattern)
+
+	return paths
+
+###############################################################################
+
+# Returns a dict mapping each path to the name of the file it's converted to,
+# relative to the output directory. Files keep their location relative to the
+# deepest directory that contains all of them, so that files with the same
+# name in different directories don't overwrite each other. Raises ValueError
+# if two different inputs would still be written to the same file (such as
+# x.rtf and x.RTF.)
+def outputNames(paths, extension):
+
+	names = {}
+	files = [path for path in paths if '-' != path]
+
+	if '-' in paths:
+		names['-'] = 'stdin' + extension
+
+	if files:
+
+		root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in files])
+
+		for path in files:
+			names[path] = os.path.splitext(os.path.relpath(os.path.abspath(path), root))[0] + extension
+
+	written = {}
+
+	for path, name in names.items():
+
+		key = os.path.normcase(name)
+
+		if key in written and os.path.abspath(written[key]) != os.path.abspath(path):
+			raise ValueError(written[key] + ' and ' + path + ' would both be written to ' + name + '.')
+
+		written[key] = path
+
+	return names
+
+###############################################################################
+
+# Parses RTF read from stdin in this process and returns a BatchResult, just
+# as if it had been parsed by a worker.
+def _parseStdin(output, domOptions):
+
+	start = time.perf_counter()
+	content = sys.stdin.read()
+
+	try:
+		dom = RTFDOM(**domOptions)
+		dom.openString(content)
+		dom.parse()
+		result = OUTPUTS[output](dom)
+		return BatchResult('-', result, None, time.perf_counter() - start, len(content.encode('utf-8')))
+
+	except Exception as e:
+		return BatchResult('-', None, str(e), time.perf_counter() - start, len(content.encode('utf-8')))
+
+###############################################################################
+
+# Parses every path (stdin first, if '-' is one of them) and yields a
+# BatchResult for each.
+def _parseAll(paths, output, options):
+
+	domOptions = {'normalize': options.normalize}
+
+	if '-' in paths:
+		yield _parseStdin(output, domOptions)
+		paths = [path for path in paths if '-' != path]
+
+	if paths:
+		yield from parseMany(
+			paths,
+			workers = options.jobs,
+			output = output,
+			ordered = not options.unordered,
+			**domOptions
+		)
+
+###############################################################################
+
+# Writes a converted document to its file in outputDir (names is the dict
+# returned by outputNames()), or to stdout if outputDir is None.
+def _writeConverted(result, outputDir, names):
+
+	if outputDir is None:
+		sys.stdout.write(result.result)
+		if result.result and not result.result.endswith('\n'):
+			sys.stdout.write('\n')
+		sys.stdout.flush()
+		return
+
+	outPath = os.path.join(outputDir, names[result.path])
+	os.makedirs(os.path.dirname(outPath), exist_ok = True)
+
+	with open(outPath, 'w') as outFile:
+		outFile.write(result.result)
+
+###############################################################################
+
+# Writes a line of document statistics to stdout.
+def _writeStats(result):
+
+	row = [
+		result.path,
+		result.size,
+		result.result['paragraphs'],
+		sum(result.result['nodes'].values()),
+		result.result['characters'],
+		'%.4f' % result.seconds
+	]
+
+	sys.stdout.write('\t'.join(str(value) for value in row) + '\n')
+	sys.stdout.flush()
+
+###############################################################################
+
+# Writes a summary of how long everything took to stderr: overall throughput,
+# followed by the slowest files.
+def _writeSummary(results, failures, elapsed, timings):
+
+	totalBytes = sum(result.size or 0 for result in results)
+	workerSeconds = sum(result.seconds for result in results)
+	megabytes = totalBytes / (1024 * 1024)
+
+	sys.stderr.write(
+		'%d files (%d failed), %.2f MB in %.2fs: %.2f MB/s, %.1f files/s\n' % (
+			len(results),
+			failures,
+			megabytes,
+			elapsed,
+			megabytes / elapsed if elapsed else 0,
+			len(results) / elapsed if elapsed else 0
+		)
+	)
+
+	# Throughput of a single worker, which is what the parser itself manages
+	if workerSeconds:
+		sys.stderr.write('Per worker: %.2f MB/s\n' % (megabytes / workerSeconds))
+
+	if timings and results:
+
+		slowest = sorted(results, key = lambda result: result.seconds, reverse = True)[:timings]
+		sys.stderr.write('Slowest files:\n')
+
+		for result in slowest:
+			size = result.size or 0
+			sys.stderr.write('  %8.4fs %10d bytes %8.2f MB/s  %s\n' % (
+				result.seconds,
+				size,
+				size / (1024 * 1024) / result.seconds if result.seconds else 0,
+				result.path
+			))
+
+###############################################################################
+
+# Builds the command line parser.
+def _argumentParser():
+
+	parser = argparse.ArgumentParser(prog = 'pyrtfdom', description = 'Converts RTF documents and measures how quickly they parse.')
+	commands = parser.add_subparsers(dest = 'command', required = True)
+
+	common = argparse.ArgumentParser(add_help = False)
+	common.add_argument('inputs', nargs = '+', metavar = 'input', help = "files, globs or directories to parse ('-' reads stdin)")
+	common.add_argument('-j', '--jobs', type = int, default = None, help = 'number of worker processes (defaults to the number of CPUs)')
+	common.add_argument('--unordered', action = 'store_true', help = 'write results as soon as they are ready instead of in input order')
+	common.add_argument('--normalize', action = 'store_true', help = 'normalize each paragraph as it is parsed')
+	common.add_argument('-q', '--quiet', action = 'store_true', help = "don't write a summary to stderr")
+	common.add_argument('--timings', type = int, default = DEFAULT_TIMINGS, metavar = 'N', help = 'number of slowest files to list in the summary')
+
+	convert = commands.add_parser('convert', parents = [common], help = 'convert documents to another format')
+	convert.add_argument('-f', '--format', choices = sorted(FORMATS), default = 'text', help = 'output format (defaults to text)')
+	convert.add_argument('-o', '--output-dir', default = None, help = "directory to write converted files to, keeping their paths relative to the inputs' common directory (defaults to stdout)")
+
+	commands.add_parser('text', parents = [common], help = 'write the plain text of documents to stdout')
+	commands.add_parser('stats', parents = [common], help = 'write statistics about each document to stdout')
+
+	return parser
+
+###############################################################################
+
+def main(argv = None):
+
+	options = _argumentParser().parse_args(argv)
+
+	try:
+		paths = expandInputs(options.inputs)
+	except ValueError as e:
+		sys.stderr.write('pyrtfdom: ' + str(e) + '\n')
+		return 2
+
+	if 'stats' == options.command:
+		output = 'stats'
+		sys.stdout.write('\t'.join(STATS_COLUMNS) + '\n')
+	else:
+		output = options.format if 'convert' == options.command else 'text'
+
+	outputDir = getattr(options, 'output_dir', None)
+	names = None
+
+	if outputDir is not None:
+
+		try:
+			names = outputNames(paths, FORMATS[output])
+		except ValueError as e:
+			sys.stderr.write('pyrtfdom: ' + str(e) + '\n')
+			return 2
+
+		os.makedirs(outputDir, exist_ok = True)
+
+	results = []
+	failures = 0
+	start = time.perf_counter()
+
+	for result in _parseAll(paths, output, options):
+
+		results.append(result._replace(result = None))
+
+		if result.error:
+			failures += 1
+			sys.stderr.write(result.path + ': ' + result.error + '\n')
+		elif 'stats' == output:
+			_writeStats(result)
+		else:
+			_writeConverted(result, outputDir, names)
+
+	if not options.quiet:
+		_writeSummary(results, failures, time.perf_counter() - start, options.timings)
+
+	return 1 if failures else 0
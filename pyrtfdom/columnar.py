@@ -0,0 +1,795 @@
+# -*- coding: utf-8 -*-
+
+# An alternative, column-oriented storage backend for the DOM. Instead of
+# allocating one Python object (plus an attributes dict and a children list)
+# per node, every node is just a row index into a handful of typed arrays, and
+# all the document's text lives in one shared buffer. ColumnarNode is a
+# lightweight proxy that's only created when a node is actually accessed, and
+# it exposes the same traversal API as DOMElement (nodeType, parent, children,
+# value, attributes), so code that walks the tree doesn't need to know which
+# backend built it.
+
+import array, bisect
+from collections.abc import MutableMapping
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+# Every supported node type and the integer code it's stored as. The order
+# here must never change, since codes are what actually get stored.
+NODE_TYPES = [
+	'rtf',
+	'pagebreak',
+	'text',
+	'img',
+	'para',
+	'hyperlink',
+	'footnote',
+	'bold',
+	'italic',
+	'underline',
+	'strikethrough'
+]
+
+NODE_TYPE_CODES = {nodeType: code for code, nodeType in enumerate(NODE_TYPES)}
+
+# Node types that aren't allowed to have children (mirrors elements.py, where
+# these set self._children to False.)
+LEAF_TYPES = {'pagebreak', 'text', 'img'}
+
+# Marks the absence of a parent, child or sibling
+NONE = -1
+
+###############################################################################
+###############################################################################
+
+# Stores the text of every node in the tree. Text is appended in small pieces
+# as the parser works its way through a paragraph, so rather than
+# concatenating strings over and over again, we collect pieces and only join
+# them when somebody needs to read them back.
+class _TextBuffer(object):
+
+	def __init__(self):
+
+		# Joined pieces of text and the offset where each one starts
+		self.__pieces = []
+		self.__starts = array.array('q')
+
+		# Text appended since the last flush (usually the current text node)
+		self.__pending = []
+		self.__pendingLength = 0
+
+		# Length of everything in self.__pieces
+		self.__flushedLength = 0
+
+	###########################################################################
+
+	# Total length of the buffer, including pending text.
+	def __len__(self):
+
+		return self.__flushedLength + self.__pendingLength
+
+	###########################################################################
+
+	# Joins any pending text into a single piece.
+	def __flush(self):
+
+		if self.__pending:
+			self.__pieces.append(''.join(self.__pending))
+			self.__starts.append(self.__flushedLength)
+			self.__flushedLength += self.__pendingLength
+			self.__pending = []
+			self.__pendingLength = 0
+
+	###########################################################################
+
+	# Appends text to the end of the buffer and returns the offset where it
+	# was written.
+	def append(self, text):
+
+		offset = len(self)
+		self.__pending.append(text)
+		self.__pendingLength += len(text)
+
+		# Don't let a single enormous paragraph turn into millions of one
+		# character strings.
+		if len(self.__pending) >= 4096:
+			self.__flush()
+
+		return offset
+
+	###########################################################################
+
+	# Returns the text between the start and end offsets.
+	def slice(self, start, end):
+
+		if start >= end:
+			return ''
+
+		if end > self.__flushedLength:
+			self.__flush()
+
+		first = bisect.bisect_right(self.__starts, start) - 1
+		last = bisect.bisect_left(self.__starts, end) - 1
+		base = self.__starts[first]
+
+		if first == last:
+			return self.__pieces[first][start - base:end - base]
+		else:
+			return ''.join(self.__pieces[first:last + 1])[start - base:end - base]
+
+	###########################################################################
+
+	# Consolidates the buffer into a single string and returns it.
+	def getvalue(self):
+
+		self.__flush()
+
+		if len(self.__pieces) > 1:
+			self.__pieces = [''.join(self.__pieces)]
+			self.__starts = array.array('q', [0])
+
+		return self.__pieces[0] if self.__pieces else ''
+
+###############################################################################
+###############################################################################
+
+# Dict-like view of a node's attributes. Most nodes never have any, so the
+# backing dict is only allocated the first time something is written.
+class _AttributeView(MutableMapping):
+
+	def __init__(self, tree, index):
+
+		self.__tree = tree
+		self.__index = index
+
+	def __attributes(self):
+
+		return self.__tree._attributes.get(self.__index, {})
+
+	def __getitem__(self, key):
+
+		return self.__attributes()[key]
+
+	def __setitem__(self, key, value):
+
+		self.__tree._attributes.setdefault(self.__index, {})[key] = value
+
+	def __delitem__(self, key):
+
+		attributes = self.__tree._attributes[self.__index]
+		del attributes[key]
+		if not attributes:
+			del self.__tree._attributes[self.__index]
+
+	def __iter__(self):
+
+		return iter(self.__attributes())
+
+	def __len__(self):
+
+		return len(self.__attributes())
+
+	def __repr__(self):
+
+		return repr(self.__attributes())
+
+###############################################################################
+###############################################################################
+
+# A proxy for a single node stored in a ColumnarTree.
+class ColumnarNode(object):
+
+	__slots__ = ('__tree', '__index')
+
+	def __init__(self, tree, index):
+
+		self.__tree = tree
+		self.__index = index
+
+	###########################################################################
+
+	def __eq__(self, other):
+
+		return (
+			isinstance(other, ColumnarNode) and
+			self.__tree is other.tree and
+			self.__index == other.index
+		)
+
+	def __ne__(self, other):
+
+		return not self.__eq__(other)
+
+	def __hash__(self):
+
+		return hash((id(self.__tree), self.__index))
+
+	###########################################################################
+
+	# The tree the node is stored in
+	@property
+	def tree(self):
+
+		return self.__tree
+
+	###########################################################################
+
+	# The node's row in the tree's arrays
+	@property
+	def index(self):
+
+		return self.__index
+
+	###########################################################################
+
+	# Read-only property that identifies the node's type
+	@property
+	def nodeType(self):
+
+		return self.__tree.nodeType(self.__index)
+
+	###########################################################################
+
+	# Identifies the parent node
+	@property
+	def parent(self):
+
+		return self.__tree.node(self.__tree.parent(self.__index))
+
+	###########################################################################
+
+	# Returns a list of the node's children, or False if children aren't
+	# allowed for the node type (same as DOMElement.)
+	@property
+	def children(self):
+
+		if self.__tree.nodeType(self.__index) in LEAF_TYPES:
+			return False
+
+		return [self.__tree.node(child) for child in self.__tree.iterChildren(self.__index)]
+
+	###########################################################################
+
+	# The node's value
+	@property
+	def value(self):
+
+		return self.__tree.getValue(self.__index)
+
+	@value.setter
+	def value(self, value):
+
+		self.__tree.setValue(self.__index, value)
+
+	###########################################################################
+
+	# The node's attributes
+	@property
+	def attributes(self):
+
+		return _AttributeView(self.__tree, self.__index)
+
+	###########################################################################
+
+	# The (start, end) offsets into the RTF that the node was parsed from, or
+	# None if they weren't recorded.
+	@property
+	def sourceSpan(self):
+
+		return self.__tree.getSourceSpan(self.__index)
+
+	@sourceSpan.setter
+	def sourceSpan(self, span):
+
+		self.__tree.setSourceSpan(self.__index, span)
+
+	###########################################################################
+
+	# Appends text to the node's value without copying what's already there.
+	def appendText(self, text):
+
+		self.__tree.appendText(self.__index, text)
+
+	###########################################################################
+
+	# Append a node to another node's children.
+	def appendChild(self, child):
+
+		self.__tree.appendChild(self.__index, child)
+
+	###########################################################################
+
+	# Inserts a node into another node's children just before reference.
+	def insertBefore(self, child, reference):
+
+		self.__tree.insertBefore(self.__index, child, reference)
+
+	###########################################################################
+
+	# Removes the passed node from another node's children.
+	def removeChild(self, child):
+
+		self.__tree.removeChild(self.__index, child)
+
+	###########################################################################
+
+	# Replaces all of the node's children with the passed list of nodes.
+	def replaceChildren(self, children):
+
+		self.__tree.replaceChildren(self.__index, children)
+
+	###########################################################################
+
+	# Returns the number of child nodes.
+	def childCount(self):
+
+		return self.__tree.childCount(self.__index)
+
+###############################################################################
+###############################################################################
+
+# Struct-of-arrays storage for a DOM tree. Nodes are identified by their
+# integer index and linked together through parent, first/last child and
+# next/previous sibling arrays, which gives us O(1) appends and removals
+# without a per-node children list.
+class ColumnarTree(object):
+
+	def __init__(self):
+
+		# One entry per node
+		self.__types = array.array('B')
+		self.__parents = array.array('i')
+		self.__firstChildren = array.array('i')
+		self.__lastChildren = array.array('i')
+		self.__nextSiblings = array.array('i')
+		self.__prevSiblings = array.array('i')
+		self.__textStarts = array.array('q')
+		self.__textEnds = array.array('q')
+
+		# Text for every node in the tree
+		self.__text = _TextBuffer()
+
+		# Sparse storage for the few nodes that have attributes or non-text
+		# values (such as an image's binary data.) Keyed by node index.
+		self._attributes = {}
+		self.__objects = {}
+
+		# Optional NodeIndex (see index.py) and a flag per node recording
+		# whether it's registered with it.
+		self.__index = None
+		self.__indexed = bytearray()
+
+		# Where each node came from in the RTF (see RTFDOM), or -1 if that
+		# wasn't recorded. These are only created once the first span is set.
+		self.__spanStarts = None
+		self.__spanEnds = None
+
+	###########################################################################
+
+	# The number of nodes in the tree (including detached ones.)
+	def __len__(self):
+
+		return len(self.__types)
+
+	###########################################################################
+
+	# Returns a proxy for the node at the specified index, or None if the index
+	# doesn't refer to a node.
+	def node(self, index):
+
+		if NONE == index:
+			return None
+
+		return ColumnarNode(self, index)
+
+	###########################################################################
+
+	# Creates a new detached node of the specified type and returns its proxy.
+	def createElement(self, nodeType):
+
+		if nodeType not in NODE_TYPE_CODES:
+			raise Exception(nodeType + ' is an unsupported Element type.')
+
+		index = len(self.__types)
+		textOffset = len(self.__text)
+
+		self.__types.append(NODE_TYPE_CODES[nodeType])
+		self.__parents.append(NONE)
+		self.__firstChildren.append(NONE)
+		self.__lastChildren.append(NONE)
+		self.__nextSiblings.append(NONE)
+		self.__prevSiblings.append(NONE)
+		self.__textStarts.append(textOffset)
+		self.__textEnds.append(textOffset)
+		self.__indexed.append(0)
+
+		if self.__spanStarts is not None:
+			self.__spanStarts.append(-1)
+			self.__spanEnds.append(-1)
+
+		return ColumnarNode(self, index)
+
+	###########################################################################
+
+	def nodeType(self, index):
+
+		return NODE_TYPES[self.__types[index]]
+
+	###########################################################################
+
+	def parent(self, index):
+
+		return self.__parents[index]
+
+	###########################################################################
+
+	# Iterates through the indexes of a node's children in order.
+	def iterChildren(self, index):
+
+		child = self.__firstChildren[index]
+		while NONE != child:
+			yield child
+			child = self.__nextSiblings[child]
+
+	###########################################################################
+
+	def childCount(self, index):
+
+		if NODE_TYPES[self.__types[index]] in LEAF_TYPES:
+			return 0
+
+		count = 0
+		for child in self.iterChildren(index):
+			count += 1
+
+		return count
+
+	###########################################################################
+
+	def getValue(self, index):
+
+		if index in self.__objects:
+			return self.__objects[index]
+
+		return self.__text.slice(self.__textStarts[index], self.__textEnds[index])
+
+	###########################################################################
+
+	# Replaces a node's value. Text goes into the shared buffer and anything
+	# else (like an image's bytes) is stored on the side.
+	def setValue(self, index, value):
+
+		if isinstance(value, str):
+			self.__objects.pop(index, None)
+			offset = len(self.__text)
+			self.__textStarts[index] = offset
+			self.__textEnds[index] = offset
+			if value:
+				self.__text.append(value)
+				self.__textEnds[index] = offset + len(value)
+
+		else:
+			self.__objects[index] = value
+			self.__textStarts[index] = self.__textEnds[index] = len(self.__text)
+
+	###########################################################################
+
+	# Appends text to a node's value. If the node's text isn't at the end of
+	# the buffer (which only happens if we've written text for another node
+	# in the meantime), it's moved there first.
+	def appendText(self, index, text):
+
+		if index in self.__objects:
+			self.setValue(index, self.__objects[index] + text)
+			return
+
+		end = self.__textEnds[index]
+
+		if end != len(self.__text):
+			start = self.__textStarts[index]
+			if start == end:
+				self.__textStarts[index] = len(self.__text)
+			else:
+				self.__textStarts[index] = self.__text.append(self.__text.slice(start, end))
+
+		self.__text.append(text)
+		self.__textEnds[index] = len(self.__text)
+
+	###########################################################################
+
+	# Returns the (start, end) offsets into the RTF that a node was parsed
+	# from, or None if they weren't recorded.
+	def getSourceSpan(self, index):
+
+		if self.__spanStarts is None or -1 == self.__spanStarts[index]:
+			return None
+
+		return self.__spanStarts[index], self.__spanEnds[index]
+
+	###########################################################################
+
+	# Records the (start, end) offsets into the RTF that a node was parsed
+	# from (or forgets them if span is None.)
+	def setSourceSpan(self, index, span):
+
+		if self.__spanStarts is None:
+			if span is None:
+				return
+			self.__spanStarts = array.array('q', [-1]) * len(self.__types)
+			self.__spanEnds = array.array('q', [-1]) * len(self.__types)
+
+		if span is None:
+			self.__spanStarts[index] = self.__spanEnds[index] = -1
+		else:
+			self.__spanStarts[index], self.__spanEnds[index] = span
+
+	###########################################################################
+
+	# Attaches a NodeIndex to the tree, with root as the node whose subtree
+	# it should track. The index's keys are node indexes, so it should be
+	# created with resolve set to self.node.
+	def setIndex(self, index, root):
+
+		self.__index = index
+		self.__register(root, True)
+
+	###########################################################################
+
+	# Adds the subtree rooted at index to the NodeIndex (or removes it if
+	# register is False.)
+	def __register(self, index, register):
+
+		stack = [index]
+
+		while stack:
+
+			node = stack.pop()
+			nodeType = NODE_TYPES[self.__types[node]]
+
+			if register:
+				self.__indexed[node] = 1
+				self.__index.add(nodeType, node)
+			else:
+				self.__indexed[node] = 0
+				self.__index.remove(nodeType, node)
+
+			stack.extend(self.iterChildren(node))
+
+	###########################################################################
+
+	# Detaches a node from its parent (if it has one.)
+	def __unlink(self, index):
+
+		parent = self.__parents[index]
+		if NONE == parent:
+			return
+
+		prevSibling = self.__prevSiblings[index]
+		nextSibling = self.__nextSiblings[index]
+
+		if NONE == prevSibling:
+			self.__firstChildren[parent] = nextSibling
+		else:
+			self.__nextSiblings[prevSibling] = nextSibling
+
+		if NONE == nextSibling:
+			self.__lastChildren[parent] = prevSibling
+		else:
+			self.__prevSiblings[nextSibling] = prevSibling
+
+		self.__parents[index] = NONE
+		self.__prevSiblings[index] = NONE
+		self.__nextSiblings[index] = NONE
+
+	###########################################################################
+
+	# Links a detached node in as the last child of parent.
+	def __link(self, parent, index):
+
+		lastChild = self.__lastChildren[parent]
+
+		if NONE == lastChild:
+			self.__firstChildren[parent] = index
+		else:
+			self.__nextSiblings[lastChild] = index
+
+		self.__prevSiblings[index] = lastChild
+		self.__lastChildren[parent] = index
+		self.__parents[index] = parent
+
+	###########################################################################
+
+	# Copies a node from some other tree (either another ColumnarTree or a
+	# tree of DOMElements) into this one and returns its index. Done
+	# iteratively so deep trees can't blow the stack.
+	def __import(self, foreign):
+
+		root = None
+		stack = [(foreign, NONE)]
+
+		while stack:
+
+			source, parent = stack.pop()
+
+			index = self.createElement(source.nodeType).index
+			if NONE == parent:
+				root = index
+			else:
+				self.__link(parent, index)
+
+			# An empty image is still bytes rather than the default ''
+			if not isinstance(source.value, str) or source.value:
+				self.setValue(index, source.value)
+
+			if len(source.attributes):
+				self._attributes[index] = dict(source.attributes)
+
+			if source.sourceSpan is not None:
+				self.setSourceSpan(index, source.sourceSpan)
+
+			if source.children:
+				for child in reversed(source.children):
+					stack.append((child, index))
+
+		return root
+
+	###########################################################################
+
+	# Append a node to another node's children. Nodes from a different tree
+	# are copied in.
+	def appendChild(self, parent, child):
+
+		if NODE_TYPES[self.__types[parent]] in LEAF_TYPES:
+			raise Exception('Children not allowed for node type ' + self.nodeType(parent))
+
+		if isinstance(child, ColumnarNode) and child.tree is self:
+			index = child.index
+			self.__unlink(index)
+		else:
+			index = self.__import(child)
+
+		self.__link(parent, index)
+
+		if self.__index is not None and self.__indexed[parent] != self.__indexed[index]:
+			self.__register(index, self.__indexed[parent])
+
+	###########################################################################
+
+	# Inserts a node into another node's children just before reference (one
+	# of parent's children, or None to append.) Nodes from a different tree
+	# are copied in.
+	def insertBefore(self, parent, child, reference):
+
+		if reference is None:
+			return self.appendChild(parent, child)
+
+		if NODE_TYPES[self.__types[parent]] in LEAF_TYPES:
+			raise Exception('Children not allowed for node type ' + self.nodeType(parent))
+
+		if parent != self.__parents[reference.index]:
+			raise ValueError('Reference node is not a child of the parent node.')
+
+		if isinstance(child, ColumnarNode) and child.tree is self:
+			index = child.index
+			self.__unlink(index)
+		else:
+			index = self.__import(child)
+
+		referenceIndex = reference.index
+		prevSibling = self.__prevSiblings[referenceIndex]
+
+		if NONE == prevSibling:
+			self.__firstChildren[parent] = index
+		else:
+			self.__nextSiblings[prevSibling] = index
+
+		self.__prevSiblings[index] = prevSibling
+		self.__nextSiblings[index] = referenceIndex
+		self.__prevSiblings[referenceIndex] = index
+		self.__parents[index] = parent
+
+		if self.__index is not None and self.__indexed[parent] != self.__indexed[index]:
+			self.__register(index, self.__indexed[parent])
+
+	###########################################################################
+
+	# Removes the passed node from another node's children.
+	def removeChild(self, parent, child):
+
+		if isinstance(child, ColumnarNode) and child.tree is self and parent == self.__parents[child.index]:
+			self.__unlink(child.index)
+			if self.__indexed[child.index]:
+				self.__register(child.index, False)
+
+	###########################################################################
+
+	# Replaces all of a node's children with the passed list of nodes.
+	def replaceChildren(self, parent, children):
+
+		if NODE_TYPES[self.__types[parent]] in LEAF_TYPES:
+			raise Exception('Children not allowed for node type ' + self.nodeType(parent))
+
+		kept = set(child.index for child in children if isinstance(child, ColumnarNode) and child.tree is self)
+
+		for child in list(self.iterChildren(parent)):
+			self.__unlink(child)
+			if child not in kept and self.__indexed[child]:
+				self.__register(child, False)
+
+		for child in children:
+			self.appendChild(parent, child)
+
+	###########################################################################
+
+	# The shared text buffer, consolidated into a single string. Node text
+	# offsets index into this.
+	@property
+	def text(self):
+
+		return self.__text.getvalue()
+
+	###########################################################################
+
+	# Returns the number of nodes of each type (including any that have been
+	# removed from the tree.) This runs entirely in C, so it's cheap even for
+	# trees with millions of nodes.
+	def countByType(self):
+
+		counts = {}
+		for nodeType, code in NODE_TYPE_CODES.items():
+			count = self.__types.count(code)
+			if count:
+				counts[nodeType] = count
+
+		return counts
+
+	###########################################################################
+
+	# Returns the tree's columns as (zero-copy) NumPy arrays so that bulk
+	# queries over nodes can be vectorized. Requires NumPy.
+	def asNumPy(self):
+
+		if numpy is None:
+			raise ImportError('NumPy is required to export columnar arrays.')
+
+		columns = {
+			'nodeType':    numpy.frombuffer(self.__types, dtype = numpy.uint8),
+			'parent':      numpy.frombuffer(self.__parents, dtype = numpy.int32),
+			'firstChild':  numpy.frombuffer(self.__firstChildren, dtype = numpy.int32),
+			'nextSibling': numpy.frombuffer(self.__nextSiblings, dtype = numpy.int32),
+			'textStart':   numpy.frombuffer(self.__textStarts, dtype = numpy.int64),
+			'textEnd':     numpy.frombuffer(self.__textEnds, dtype = numpy.int64)
+		}
+
+		if self.__spanStarts is not None:
+			columns['spanStart'] = numpy.frombuffer(self.__spanStarts, dtype = numpy.int64)
+			columns['spanEnd'] = numpy.frombuffer(self.__spanEnds, dtype = numpy.int64)
+
+		return columns
+
+	###########################################################################
+
+	# Number of bytes used by the tree's arrays (one entry per node in each.)
+	def columnBytes(self):
+
+		total = 0
+		for column in (
+			self.__types, self.__parents, self.__firstChildren,
+			self.__lastChildren, self.__nextSiblings, self.__prevSiblings,
+			self.__textStarts, self.__textEnds,
+			self.__spanStarts, self.__spanEnds
+		):
+			if column is not None:
+				total += column.itemsize * len(column)
+
+		return total + len(self.__indexed)
+
+	###########################################################################
+
+	# Approximate number of bytes used by the tree's arrays and text buffer.
+	def nbytes(self):
+
+		return self.columnBytes() + len(self.__text)
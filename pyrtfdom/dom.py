@@ -1,9 +1,29 @@
 # -*- coding: utf-8 -*-
 
-import copy, queue
-
-from pyrtfdom import elements
+import array, collections, copy, itertools, os, sys
+
+from pyrtfdom import elements, fields, memory, parallel, serialize
+from pyrtfdom.columnar import ColumnarTree
+from pyrtfdom.export.html import HTMLExporter
+from pyrtfdom.export.json import JSONExporter
+from pyrtfdom.export.markdown import MarkdownExporter
+from pyrtfdom.export.rtf import RTFExporter
+from pyrtfdom.export.text import TextExporter
+from pyrtfdom.incremental import SegmentTable
+from pyrtfdom.index import NodeIndex
+from pyrtfdom.normalize import normalizeTree
+from pyrtfdom.parallel import Chunk, SplitScanner
 from pyrtfdom.parse import RTFParser
+from pyrtfdom.pool import DOMPool
+from pyrtfdom.profile import ParseProfiler
+
+# Supported storage backends for the DOM tree. 'object' builds a tree of
+# DOMElement objects, while 'columnar' stores nodes in a ColumnarTree, which
+# uses a fraction of the memory for very large documents.
+BACKENDS = ['object', 'columnar']
+
+# DOMs used by RTFDOM.parseSubRTF() (created the first time it's needed)
+_subDOMPool = None
 
 class RTFDOM(object):
 
@@ -23,37 +43,76 @@ class RTFDOM(object):
 
 	###########################################################################
 
+	# Read-only property that returns the ParseProfiler (see profile.py)
+	# collecting statistics about the parser, or None if this DOM wasn't
+	# created with profile set to True.
+	@property
+	def profiler(self):
+
+		return self.parser.profiler
+
+	###########################################################################
+
+	# Read-only property that returns the ParseTracer (see trace.py) recording
+	# the parser's events, or None if this DOM wasn't created with one.
+	@property
+	def tracer(self):
+
+		return self.parser.tracer
+
+	###########################################################################
+
 	# Utility function that parses an RTF snippet and returns its DOM tree.
+	# This is called for every field in a document, so the DOMs that parse
+	# snippets are pooled rather than constructed every time.
 	@staticmethod
 	def parseSubRTF(rtfString):
 
-		subTree = RTFDOM()
-		subTree.openString(rtfString)
-		subTree.parse()
+		global _subDOMPool
+
+		if _subDOMPool is None:
+			_subDOMPool = DOMPool(RTFDOM)
 
-		return subTree.getTreeNodes()
+		return _subDOMPool.parseString(rtfString)
 
 	###########################################################################
 
-	# Finds the attribute DOM element closest to the current node, then calculates
-	# and returns its distance from the root RTF node. If an element for the
-	# given attribute doesn't exist in the chain from current to root node, -1
-	# will be returned.
-	def __distanceFromRoot(self, attribute):
+	# Closes the open formatting elements for the specified attributes. Every
+	# element opened after the outermost of them is closed too (since it's
+	# nested inside), and those that should remain on are reopened in their
+	# original order. Returns True if anything was closed.
+	def __closeFormatting(self, attributes, characterState):
+
+		cutoff = None
+		for depth, (attribute, node) in enumerate(self.__openFormats):
+			if attribute in attributes:
+				cutoff = depth
+				break
+
+		if cutoff is None:
+			return False
 
-		distance = 0
-		node = self.__curNode
+		closed = self.__openFormats[cutoff:]
+		del self.__openFormats[cutoff:]
 
-		# First, locate the attribute's node
-		while node.nodeType != attribute:
-			node = node.parent
+		self.__curNode = closed[0][1].parent
 
-		# Next, calculate its distance from the root
-		while node != self.__rootNode:
-			distance = distance + 1
-			node = node.parent
+		for attribute, node in closed:
+			if attribute not in attributes and characterState.get(attribute):
+				self.__openFormatting(attribute)
 
-		return distance
+		return True
+
+	###########################################################################
+
+	# Opens a new formatting element for attribute inside the current node
+	# and makes it the current node.
+	def __openFormatting(self, attribute):
+
+		node = self.createElement(attribute)
+		self.__curNode.appendChild(node)
+		self.__curNode = node
+		self.__openFormats.append((attribute, node))
 
 	###########################################################################
 
@@ -64,6 +123,10 @@ class RTFDOM(object):
 		# corresponding to the specified format.
 		def __setCharacterFormatNodes(RTFParser, curParNode, state):
 
+			# We're starting over inside curParNode, so nothing that was open
+			# before is open anymore.
+			self.__openFormats = []
+
 			for attribute in state:
 
 				# TODO
@@ -75,9 +138,7 @@ class RTFDOM(object):
 
 				elif type(state[attribute]) == bool:
 					if state[attribute]:
-						node = elements.DOMElement.getElement(attribute)
-						self.__curNode.appendChild(node)
-						self.__curNode = node
+						self.__openFormatting(attribute)
 
 				# TODO: are there any non-boolean and non-color attributes, and
 				# if so, how do we handle them?
@@ -88,14 +149,16 @@ class RTFDOM(object):
 		# Inserts a page break into the current paragraph node.
 		def onPageBreak(RTFParser):
 
-			# First, walk up to the current paragraph node
-			while 'para' != self.__curNode.nodeType:
-				self.__curNode = self.__curNode.parent
+			# First, move up to the current paragraph node
+			self.__curNode = self.__curPara
 
 			# Second, create and append the page break node
-			node = elements.PageBreakElement()
+			node = self.createElement('pagebreak')
 			self.__curNode.appendChild(node)
 
+			if self.__recordSpans:
+				node.sourceSpan = (RTFParser._tokenStart, RTFParser._curPos)
+
 			# Any paragraph formatting attributes should be set on the new
 			# paragraph node.
 			parAttributes = RTFParser.fullStateAttributes['paragraph']
@@ -106,7 +169,7 @@ class RTFDOM(object):
 			# and append to it a new text node. Create a new text node to append
 			# any text that might be in the same paragraph.
 			__setCharacterFormatNodes(RTFParser, self.__curNode, RTFParser.fullStateAttributes['character'])
-			textNode = elements.TextElement()
+			textNode = self.createElement('text')
 			self.__curNode.appendChild(textNode)
 			self.__curNode = textNode
 
@@ -116,10 +179,15 @@ class RTFDOM(object):
 		# state.
 		def onOpenParagraph(RTFParser):
 
+			if self.__paraOffsets is not None:
+				self.__paraOffsets.append(RTFParser._curPos)
+				self.__nodeCounts.extend(self.__indexCounts())
+
 			# Create the paragraph node
-			para = elements.ParaElement()
+			para = self.createElement('para')
 			self.__rootNode.appendChild(para)
 			self.__curNode = para
+			self.__curPara = para
 
 			# Any paragraph formatting attributes should be set on the new
 			# paragraph node.
@@ -132,16 +200,41 @@ class RTFDOM(object):
 			__setCharacterFormatNodes(RTFParser, para, RTFParser.fullStateAttributes['character'])
 
 			# Create a text node where we'll append text for the paragraph
-			textNode = elements.TextElement()
+			textNode = self.createElement('text')
 			self.__curNode.appendChild(textNode)
 			self.__curNode = textNode
 
 		#####
 
+		# The current paragraph is finished.
+		def onCloseParagraph(RTFParser):
+
+			# The paragraph is complete, so we know where all of its nodes end
+			if self.__recordSpans:
+				self.__curPara.sourceSpan = (self.__curPara.sourceSpan[0], RTFParser._curPos)
+				self.__finishSpans(self.__curPara)
+
+			# If we're normalizing as we go, now's the time to do it.
+			if self.__normalize:
+				normalizeTree(self.__curPara)
+
+			# If we're streaming paragraphs, this one is ready to be handed out
+			if self.__completedParas is not None:
+				self.__completedParas.append(self.__curPara)
+
+		#####
+
 		# Append text to the current paragraph.
 		def onAppendParagraph(RTFParser, text):
 
-			self.__curNode.value += text
+			self.__curNode.appendText(text)
+
+			# A text node that's still empty starts with this text
+			if self.__recordSpans:
+				start, end = self.__curNode.sourceSpan
+				if start == end:
+					start = RTFParser._tokenStart
+				self.__curNode.sourceSpan = (start, RTFParser._curPos)
 
 		#####
 
@@ -149,9 +242,9 @@ class RTFDOM(object):
 		# elements such as bold, italic, etc.
 		def onStateChange(RTFParser, oldState, newState):
 
-			# Keeps track of which attributes have been turned off and their DOM
-			# element's distance from the root node.
-			turnedOff = {}
+			# Attributes that have been turned on and off, respectively
+			turnedOn = []
+			turnedOff = set()
 
 			for attribute in newState['character']:
 
@@ -169,20 +262,10 @@ class RTFDOM(object):
 					# We're dealing with on/off attributes like bold, italic, etc.
 					elif type(newState['character'][attribute]) == bool:
 
-						# we're turning the attribute on
 						if newState['character'][attribute]:
-
-							# elements[attribute] means the element type that
-							# corresponds to the attribute
-							node = elements.DOMElement.getElement(attribute)
-							textNode = elements.TextElement()
-							node.appendChild(textNode)
-							self.__curNode.parent.appendChild(node)
-							self.__curNode = textNode
-
-						# we're turning the attribute off
+							turnedOn.append(attribute)
 						else:
-							turnedOff[attribute] = self.__distanceFromRoot(attribute)
+							turnedOff.add(attribute)
 
 					# TODO: Not sure if I'll need to handle non-boolean character
 					# formatting attributes yet. I'm placing this here so that if
@@ -199,36 +282,24 @@ class RTFDOM(object):
 				if attribute not in oldState['paragraph'].keys() or (
 					newState['paragraph'][attribute] != oldState['paragraph'][attribute]
 				):
+					self.__curPara.attributes[attribute] = newState['paragraph'][attribute]
 
-					parNode = self.__curNode
-					while 'para' != parNode.nodeType:
-						parNode = parNode.parent
-
-					parNode.attributes[attribute] = newState['paragraph'][attribute]
-
-			# If we turned off one or more formatting attributes, find the DOM
-			# element closest to the root RTF node that got turned off and
-			# create a new chain of DOM elements for all the other attributes
-			# that are on in the current state.
-			if len(turnedOff):
-
-				# Move up beyond the DOM element we need to terminate
-				cutoffNodeType = min(turnedOff, key=turnedOff.get)
+			# If we turned off one or more formatting attributes, close the
+			# outermost of their DOM elements (along with everything nested
+			# inside it) and start a new text node for whatever remains on.
+			if turnedOff and self.__closeFormatting(turnedOff, newState['character']):
+				textNode = self.createElement('text')
+				self.__curNode.appendChild(textNode)
+				self.__curNode = textNode
 
-				while self.__curNode.nodeType != cutoffNodeType:
-					self.__curNode = self.__curNode.parent
+			# Open a DOM element for each attribute we turned on. Its text node
+			# becomes a sibling of the current one.
+			for attribute in turnedOn:
 
 				self.__curNode = self.__curNode.parent
+				self.__openFormatting(attribute)
 
-				# Now, start a new series of DOM elements that will represent the current state
-				for attribute in newState:
-					if type(newState[attribute]) == bool:
-						if newState[attribute]:
-							node = elements.DOMElement.getElement(attribute)
-							self.__curNode.appendChild(node)
-							self.__curNode = node
-
-				textNode = elements.TextElement()
+				textNode = self.createElement('text')
 				self.__curNode.appendChild(textNode)
 				self.__curNode = textNode
 
@@ -236,14 +307,23 @@ class RTFDOM(object):
 
 		def onField(RTFParser, fldinst, fldrslt):
 
-			fieldParts = fldinst.split(' ')
+			fieldType, fldPara = fields.splitInstruction(fldinst)
+
+			# Whatever the driver adds came from the whole field group.
+			# Drivers only append to the current paragraph (after removing
+			# the current text element if it's empty), so the field's nodes
+			# are the ones after the current text element's index.
+			if self.__recordSpans:
+				previousNode = self.__curNode
+				container = previousNode.parent
+				firstNew = max(0, container.childCount() - 1)
 
 			# If we recognize the field type, we should invoke the appropriate
 			# driver.
-			if fieldParts[0] in self.__fieldDriverOverrides:
-				self.__fieldDriverOverrides[fieldParts[0]](self, fieldParts[1], fldrslt)
-			elif fieldParts[0] in self.__fieldDrivers:
-				self.__fieldDrivers[fieldParts[0]](self, fieldParts[1], fldrslt)
+			if fieldType in self.__fieldDriverOverrides:
+				self.__fieldDriverOverrides[fieldType](self, fldPara, fldrslt)
+			elif fieldType in self.__fieldDrivers:
+				self.__fieldDrivers[fieldType](self, fldPara, fldrslt)
 
 			# If we don't know how to process the field, default to inserting
 			# the contents of fldrslt into the current paragraph. Since we're
@@ -253,6 +333,17 @@ class RTFDOM(object):
 			else:
 				self.insertFldrslt(fldrslt)
 
+			if self.__recordSpans:
+
+				fieldSpan = (RTFParser._groupStart, RTFParser._curPos)
+
+				for child in container.children[firstNew:]:
+					if child != previousNode and child != self.__curNode:
+						for node in self.iterNodes(child):
+							node.sourceSpan = fieldSpan
+
+				self.__curNode.sourceSpan = (RTFParser._curPos, RTFParser._curPos)
+
 		#####
 
 		def onImage(RTFParser, attributes, image):
@@ -262,16 +353,19 @@ class RTFDOM(object):
 				self.__curNode = self.__curNode.parent
 
 			# Second, create and append the image node
-			node = elements.ImageElement()
+			node = self.createElement('img')
 			node.value = image
 			for attribute in attributes.keys():
 				node.attributes[attribute] = attributes[attribute]
 
+			if self.__recordSpans:
+				node.sourceSpan = (RTFParser._groupStart, RTFParser._curPos)
+
 			self.__curNode.appendChild(node)
 
 			# Finally, create a new text node to append any text that might be
 			# in the same paragraph.
-			textNode = elements.TextElement()
+			textNode = self.createElement('text')
 			self.__curNode.appendChild(textNode)
 			self.__curNode = textNode
 
@@ -280,6 +374,7 @@ class RTFDOM(object):
 		self.__parserCallbacks = {
 			'onPageBreak': onPageBreak,
 			'onOpenParagraph': onOpenParagraph,
+			'onCloseParagraph': onCloseParagraph,
 			'onAppendParagraph': onAppendParagraph,
 			'onStateChange': onStateChange,
 			'onField': onField,
@@ -296,6 +391,12 @@ class RTFDOM(object):
 
 		def hyperlinkDriver(dom, fldPara, fldrslt):
 
+			# A link that doesn't go anywhere is just its text
+			href = fields.hyperlinkTarget(fldPara)
+			if href is None:
+				dom.insertFldrslt(fldrslt)
+				return
+
 			curParNode = dom.curNode.parent
 
 			# If the previous text element was empty, it's unnecessary and can
@@ -303,16 +404,23 @@ class RTFDOM(object):
 			if 0 == len(dom.curNode.value):
 				dom.removeCurNode()
 
-			hyperNode = elements.HyperlinkElement()
-			hyperNode.attributes['href'] = fldPara[1:len(fldPara) - 1]
+			hyperNode = dom.createElement('hyperlink')
+			hyperNode.attributes['href'] = href
 			curParNode.appendChild(hyperNode)
 
-			textNode = elements.TextElement()
+			textNode = dom.createElement('text')
 			hyperNode.appendChild(textNode)
 			dom.__curNode = textNode
 
 			dom.insertFldrslt(fldrslt)
 
+			# Text that follows the field belongs to the paragraph, not the
+			# hyperlink.
+			if 0 == len(dom.curNode.value):
+				dom.removeCurNode()
+
+			dom.initTextElement(curParNode)
+
 		#####
 
 		self.__fieldDrivers = {
@@ -322,32 +430,129 @@ class RTFDOM(object):
 		# This is where drivers that override built-in defaults are registered.
 		self.__fieldDriverOverrides = {}
 
-	###########################################################################
+		# True once any driver has been registered through registerFieldDriver()
+		self.__customFieldDrivers = False
 
-	def __init__(self):
+	###########################################################################
 
-		self.reset()
+	# backend selects how the DOM tree is stored and must be one of the values
+	# in BACKENDS. Either way, nodes expose the same traversal API. If
+	# normalize is True, each paragraph is normalized (see normalize()) as soon
+	# as it's complete, so the tree never grows larger than necessary. If
+	# cache is a ParseCache (see cache.py), parse() looks for a previous
+	# result for the same content and options there before parsing, and
+	# stores what it parses. If incremental is True, parse() also records
+	# where each top-level paragraph came from, so that update() can re-parse
+	# just the part of the document an edit touched. If sourceSpans is True,
+	# every node parsed from the RTF records the (start, end) offsets of the
+	# RTF it came from as its sourceSpan (see getSource().) Spans aren't
+	# saved by save() or stored in the cache, so the cache isn't used when
+	# they're being tracked, and parseParallel() parses sequentially. If
+	# profile is True, the parser is instrumented by a ParseProfiler (see the
+	# profiler property), which keeps collecting statistics across documents
+	# until it's reset. Chunks parsed by parseParallel()'s workers aren't
+	# profiled. If trackMemory is True, parse() measures the peak amount of
+	# memory allocated while it runs (see memoryReport()), which slows it down
+	# considerably and can't be done if tracemalloc is already tracing. If
+	# tracer is a ParseTracer (see trace.py), it records the
+	# parser's events. As with profiling, chunks parsed by parseParallel()'s
+	# workers aren't traced.
+	def __init__(self, backend = 'object', normalize = False, cache = None, incremental = False, sourceSpans = False, profile = False, trackMemory = False, tracer = None):
+
+		if backend not in BACKENDS:
+			raise ValueError(str(backend) + ' is not a supported DOM backend.')
+
+		self.__backend = backend
+		self.__normalize = normalize
+		self.__cache = cache
+		self.__incremental = incremental
+		self.__sourceSpans = sourceSpans
+		self.__trackMemory = trackMemory
 
 		# Will reference the RTF Parser with custom callbacks
 		self.parser = None
 
+		self.reset()
+
 		self.__initParserCallbacks()
 		self.__initFieldDrivers()
 
 		self.parser = RTFParser({
-			'callbacks': self.__parserCallbacks
+			'callbacks': self.__parserCallbacks,
+			'profiler':  ParseProfiler() if profile else None,
+			'tracer':    tracer
 		})
 
 	###########################################################################
 
 	# Resets the DOM parser to an initialized state. Allows us to parse another
-	# document.
+	# document. Only per-document state (the tree and the parser's content) is
+	# cleared: the parser, its callbacks and any registered field drivers are
+	# kept, so one DOM can parse any number of documents without being
+	# constructed again (see pool.py.) Trees that were already parsed remain
+	# valid, since the DOM simply lets go of them.
 	def reset(self):
 
+		if self.parser is not None:
+			self.parser.reset()
+
 		# The head and current position in the DOM, respectively
 		self.__rootNode = None
 		self.__curNode = None
 
+		# Node storage when using the columnar backend
+		self.__tree = None
+
+		# Keeps track of nodes by type as they're added to the tree
+		self.__index = None
+
+		# The paragraph we're currently appending to
+		self.__curPara = None
+
+		# Formatting elements that are currently open, as (attribute, node)
+		# tuples ordered from outermost to innermost. An element's position in
+		# the list is its nesting depth.
+		self.__openFormats = []
+
+		# Paragraphs that have been closed but not yet handed out by
+		# iterParseParagraphs() (None unless we're streaming.)
+		self.__completedParas = None
+
+		# Offsets into the source at which each paragraph was opened and the
+		# number of indexed nodes of each type before it (None unless we're
+		# recording them), and the segments of the document update() uses
+		# (None until an incremental parse has finished.)
+		self.__paraOffsets = None
+		self.__nodeCounts = None
+		self.__segments = None
+
+		# True while the parser is building the tree and nodes should record
+		# where they came from (see sourceSpans in __init__().)
+		self.__recordSpans = False
+
+		# Peak number of bytes allocated by the last call to parse(), if
+		# we're tracking memory (see trackMemory in __init__().)
+		self.__peakBytes = None
+
+	###########################################################################
+
+	# Returns a new DOM element of the specified type, stored using whichever
+	# backend this DOM was configured with. Custom field drivers should always
+	# create their nodes through this.
+	def createElement(self, nodeType):
+
+		if self.__tree is not None:
+			node = self.__tree.createElement(nodeType)
+		else:
+			node = elements.DOMElement.getElement(nodeType)
+
+		# Until we know better, a new node starts (and ends) wherever the
+		# parser is.
+		if self.__recordSpans:
+			node.sourceSpan = (self.parser._curPos, self.parser._curPos)
+
+		return node
+
 	###########################################################################
 
 	# Removes the current node and sets the new current node to its parent.
@@ -367,7 +572,7 @@ class RTFDOM(object):
 
 		# Append a new text element after the contents of fldrslt so we can
 		# continue appending text to the current paragraph.
-		textNode = elements.TextElement()
+		textNode = self.createElement('text')
 		parent.appendChild(textNode)
 		self.__curNode = textNode
 
@@ -410,7 +615,9 @@ class RTFDOM(object):
 	# Overrides an existing or adds a new driver for a given field type.
 	def registerFieldDriver(self, field, driver):
 
-		if self.__fieldDrivers[field]:
+		self.__customFieldDrivers = True
+
+		if field in self.__fieldDrivers:
 			self.__fieldDriverOverrides[field] = driver
 		else:
 			self.__fieldDrivers[field] = driver
@@ -449,52 +656,775 @@ class RTFDOM(object):
 	# Parse the RTF file and populate the DOM.
 	def parse(self):
 
-		self.__rootNode = elements.RTFElement()
-		self.__curNode = self.__rootNode
+		if self.__trackMemory:
+			result, self.__peakBytes = memory.tracePeak(self.__parse)
+		else:
+			self.__parse()
+
+	###########################################################################
+
+	# Does the work of parse().
+	def __parse(self):
+
+		key = self.__cacheKey()
+		if self.__loadCached(key):
+			return
+
+		self.__beginParse()
 		self.parser.parse()
+		self.__endParse(key)
+
+	###########################################################################
+
+	# Sets up an empty tree for a sequential parse of the whole document.
+	def __beginParse(self):
+
+		self.__initTree(parsing = True)
+
+		if self.__incremental:
+			self.__paraOffsets = array.array('q')
+			self.__nodeCounts = array.array('q')
 
 	###########################################################################
 
-	def printTree(self, curNode = None, indent = ''):
+	# Finishes a sequential parse of the whole document and stores the result
+	# in the cache under key.
+	def __endParse(self, key):
+
+		self.__recordSpans = False
+
+		if self.__incremental:
+			self.__segments = SegmentTable.build(self.parser.content, self.__paraOffsets, self.__nodeCounts, self.__indexCounts())
+			self.__paraOffsets = None
+			self.__nodeCounts = None
+
+		self.__storeCached(key)
+
+	###########################################################################
+
+	# Same as parse(), except that a large document is split into chunks at
+	# top-level paragraph boundaries which are parsed in parallel by a pool of
+	# worker processes (see parallel.py.) The result is the same as a
+	# sequential parse. workers defaults to the number of CPUs, and chunkSize
+	# (the minimum number of characters per chunk) is chosen automatically if
+	# it's not given. Documents too small to be split, DOMs with custom field
+	# drivers (which can't be sent to the workers) and DOMs that track source
+	# spans are parsed sequentially.
+	def parseParallel(self, workers = None, chunkSize = None):
+
+		key = self.__cacheKey()
+		if self.__loadCached(key):
+			return
+
+		content = self.parser.content
+		chunks = []
+
+		if workers is None:
+			workers = os.cpu_count() or 1
 
-		if curNode is None:
-			curNode = self.__rootNode
+		if content and workers > 1 and not self.__customFieldDrivers and not self.__sourceSpans:
+			if chunkSize is None:
+				chunkSize = parallel.chunkSizeFor(len(content), workers)
+			chunks = parallel.splitDocument(content, chunkSize)
 
-		nodeAttributes = '{'
-		for key in curNode.attributes.keys():
-			nodeAttributes += "'" + key + "': " + str(curNode.attributes[key]) + ", "
-		if len(nodeAttributes) > 1:
-			nodeAttributes = nodeAttributes[0:len(nodeAttributes) - 2]
-		nodeAttributes += '}'
+		self.__initTree(parsing = len(chunks) < 2)
 
-		if isinstance(curNode.value, (bytes, bytearray)):
-			nodeValue = '<Binary Data>'
+		if len(chunks) > 1:
+			for data in parallel.parseChunks(content, chunks, type(self), {'normalize': self.__normalize}, workers):
+				serialize.SerializedTree(data).materialize(self.createElement, self.__rootNode)
 		else:
-			nodeValue = curNode.value
+			self.parser.parse()
+			self.__recordSpans = False
+
+		self.__storeCached(key)
+
+	###########################################################################
+
+	# Replaces the characters in editRange (a (start, end) tuple of offsets
+	# into the RTF) with newText and brings the tree up to date. Only the
+	# top-level paragraphs the edit touched are parsed again, along with any
+	# that follow whose formatting the edit changed, and their nodes are
+	# spliced into the tree in place of the old ones. This requires the
+	# document to have been parsed by parse() with incremental set to True.
+	# Otherwise (or if the tree came from the cache), the whole document is
+	# parsed again. If source spans are being tracked, the spans of every node
+	# after the edit have to be shifted, which takes time proportional to the
+	# rest of the document. If parsing fails, the content and tree are left as
+	# they were before the edit.
+	def update(self, editRange, newText):
+
+		start, end = editRange
+		content = self.parser.content
+
+		if not content or start < 0 or end < start or end > len(content):
+			raise ValueError('Edit range is outside the document.')
+
+		newContent = content[:start] + newText + content[end:]
+		delta = len(newText) - (end - start)
+
+		if self.__segments is None:
+
+			savedTree = self.__saveTree()
+			self.parser.openString(newContent)
+
+			try:
+				self.parse()
+
+			except Exception:
+				self.__restoreTree(savedTree)
+				self.parser.openString(content)
+				raise
+
+			return
+
+		segments = self.__segments
+
+		# Find the segments that have to be parsed again. We start with the
+		# one the edit begins in and keep going until we reach one of the old
+		# segments that starts after the edit with the same state as before.
+		first = segments.find(start)
+		segmentStart, header, state = segments.segment(first)
+		scanner = SplitScanner(newContent, segmentStart, header, state) if first else SplitScanner(newContent)
+
+		chunks = []
+		resync = first + 1
+		last = True
+
+		for chunk in scanner.iterChunks(0):
+
+			chunks.append(chunk)
+
+			if chunk.end >= start + len(newText) and chunk.end < len(newContent):
+				resync = segments.seek(resync, chunk.end, delta)
+				if segments.matches(resync, chunk.end, delta, scanner.header, scanner.state):
+					last = False
+					break
+
+		if last:
+			resync = len(segments)
+
+		# Parse the region on its own (see parallel.py) into a temporary tree
+		region = Chunk(chunks[0].start, chunks[-1].end, chunks[0].header, chunks[0].state)
+		source, dropFirst, dropLast = parallel.chunkSource(newContent, region, 0 == first, last)
+		prefix = len(source) - (region.end - region.start) - (0 if last else 1)
+
+		savedTree = self.__saveTree()
+
+		self.__initTree(parsing = True)
+		self.__paraOffsets = array.array('q')
+		self.__nodeCounts = array.array('q')
+		self.parser.openString(source)
+
+		try:
+			self.parser.parse()
+
+			# Paragraphs the region's source added around it don't count
+			keptFirst = 1 if dropFirst else 0
+			keptEnd = len(self.__paraOffsets) - (1 if dropLast else 0)
+			types = len(self.__index.nodeTypes)
+
+			paragraphs = self.__rootNode.children[keptFirst:keptEnd]
+			paraOffsets = self.__paraOffsets[keptFirst:keptEnd]
+			nodeCounts = self.__nodeCounts[keptFirst * types:keptEnd * types]
+			endCounts = self.__nodeCounts[keptEnd * types:(keptEnd + 1) * types] if dropLast else self.__indexCounts()
+			indexOrder = self.__indexOrder(paragraphs)
+
+		except Exception:
+			self.__restoreTree(savedTree)
+			self.parser.openString(content)
+			raise
+
+		self.__restoreTree(savedTree)
+		self.parser.openString(newContent)
+
+		# Swap the old paragraphs for the new ones
+		root = self.__rootNode
+		firstParagraph = segments.firstParagraph(first)
+		oldCount = segments.paragraphCount(first, resync)
+		oldParagraphs = self.__topLevel(firstParagraph, firstParagraph + oldCount + 1)
+		reference = oldParagraphs.pop() if len(oldParagraphs) > oldCount else None
+
+		for para in oldParagraphs:
+			root.removeChild(para)
+
+		for para in paragraphs:
+			root.insertBefore(para, reference)
+
+		# (The columnar backend copies inserted nodes, so we have to look the
+		# new paragraphs up again.)
+		paragraphs = self.__topLevel(firstParagraph, firstParagraph + len(paragraphs))
+		self.__placeIndexed(paragraphs, segments.nodesBefore(first), indexOrder)
+
+		# Spans in the new paragraphs are relative to the region's source, and
+		# everything after them has moved by delta.
+		if self.__sourceSpans:
+
+			root.sourceSpan = (0, len(newContent))
+
+			for para in paragraphs:
+				self.__shiftSpans(para, region.start - prefix)
+
+			if delta:
+				for para in root.children[firstParagraph + len(paragraphs):]:
+					self.__shiftSpans(para, delta)
+
+		segments.replace(
+			first,
+			resync,
+			chunks,
+			[offset - prefix + region.start for offset in paraOffsets],
+			nodeCounts,
+			endCounts,
+			delta
+		)
+
+	###########################################################################
+
+	# Returns what __restoreTree() needs to put back the current tree.
+	def __saveTree(self):
+
+		return self.__rootNode, self.__tree, self.__index
+
+	###########################################################################
+
+	# Puts back a tree saved by __saveTree(), after something else has been
+	# parsed in its place.
+	def __restoreTree(self, savedTree):
+
+		self.__rootNode, self.__tree, self.__index = savedTree
+		self.__curNode = self.__rootNode
+		self.__curPara = None
+		self.__openFormats = []
+		self.__completedParas = None
+		self.__paraOffsets = None
+		self.__nodeCounts = None
+		self.__recordSpans = False
+
+	###########################################################################
+
+	# Returns the number of indexed nodes of each type (in the order given by
+	# NodeIndex.nodeTypes.)
+	def __indexCounts(self):
+
+		return [self.__index.count(nodeType) for nodeType in self.__index.nodeTypes]
+
+	###########################################################################
+
+	# Returns a list of the top-level paragraphs from position start up to
+	# (but not including) stop. The columnar backend links siblings together
+	# rather than keeping a list, so we walk to start without creating nodes
+	# for the paragraphs along the way.
+	def __topLevel(self, start, stop):
+
+		if self.__tree is not None:
+			children = self.__tree.iterChildren(self.__rootNode.index)
+			return [self.__tree.node(child) for child in itertools.islice(children, start, stop)]
+
+		return self.__rootNode.children[start:stop]
+
+	###########################################################################
+
+	# Returns the key each indexed node in paragraphs is stored under in the
+	# index, by type, in the order the nodes appear in the tree.
+	def __indexedKeys(self, paragraphs):
+
+		keys = {nodeType: [] for nodeType in self.__index.nodeTypes}
+
+		for para in paragraphs:
+			for node in self.iterNodes(para):
+				if node.nodeType in keys:
+					keys[node.nodeType].append(node if self.__tree is None else node.index)
+
+		return keys
+
+	###########################################################################
+
+	# Returns, by type, the positions of the indexed nodes in paragraphs
+	# (counting in the order the nodes appear in the tree) in the order they
+	# were added to the index. The two orders differ when fields are nested,
+	# since a field's result is parsed on its own and only added to the tree
+	# once the field ends.
+	def __indexOrder(self, paragraphs):
+
+		order = {}
+
+		for nodeType, keys in self.__indexedKeys(paragraphs).items():
+			positions = {key: position for position, key in enumerate(keys)}
+			order[nodeType] = []
+			for node in self.__index.getElementsByType(nodeType):
+				key = node if self.__tree is None else node.index
+				if key in positions:
+					order[nodeType].append(positions[key])
+
+		return order
+
+	###########################################################################
+
+	# Puts the indexed nodes in paragraphs (which were just inserted into the
+	# tree) in the index in the order a full parse would have added them
+	# (indexOrder, from __indexOrder() before they were inserted.) Inserted
+	# nodes are added to the end of the index, so each type's nodes are moved
+	# to just after the nodes of that type that come before the paragraphs
+	# (nodesBefore holds how many of those there are, by type.)
+	def __placeIndexed(self, paragraphs, nodesBefore, indexOrder):
+
+		keys = self.__indexedKeys(paragraphs)
+
+		for nodeType, position in zip(self.__index.nodeTypes, nodesBefore):
+			if keys[nodeType]:
+				self.__index.move(nodeType, [keys[nodeType][number] for number in indexOrder[nodeType]], position)
+
+	###########################################################################
+
+	# Returns the cache key for the current content, or None if there's no
+	# cache (or if we're tracking source spans, which the cache can't store.)
+	def __cacheKey(self):
 
-		print('')
-		print(indent + 'nodeType: ' + curNode.nodeType)
-		print(indent + 'attributes: ' + nodeAttributes)
-		print(indent + 'value: ' + nodeValue)
-		print(indent + 'children: ' + str(curNode.childCount()))
+		if self.__cache is None or self.__sourceSpans:
+			return None
+
+		return self.__cache.key(self.parser.content, self.__cacheOptions())
+
+	###########################################################################
+
+	# If the cache has a result stored under key, loads it into the tree and
+	# returns True. Otherwise, returns False.
+	def __loadCached(self, key):
+
+		if key is None:
+			return False
+
+		data = self.__cache.get(key)
+		if data is None:
+			return False
+
+		self.__initTree()
+		serialize.SerializedTree(data).materialize(self.createElement, self.__rootNode)
+		return True
+
+	###########################################################################
+
+	# Stores the tree in the cache under key, if there's a cache.
+	def __storeCached(self, key):
+
+		if key is not None:
+			self.__cache.put(key, serialize.dumps(self.__rootNode))
+
+	###########################################################################
+
+	# Returns the options that affect the tree parse() produces, for use in
+	# cache keys. Custom field drivers can change the tree too, so they're
+	# identified by name.
+	def __cacheOptions(self):
+
+		return {
+			'backend':   self.__backend,
+			'normalize': self.__normalize,
+			'fieldDrivers': sorted(
+				field + ':' + driver.__module__ + '.' + driver.__qualname__
+				for drivers in (self.__fieldDrivers, self.__fieldDriverOverrides)
+				for field, driver in drivers.items()
+			)
+		}
+
+	###########################################################################
+
+	# Saves the parsed tree to out (a filename or binary file object) in the
+	# compact binary format described in serialize.py, so that it can be
+	# reloaded later without parsing the RTF again.
+	def save(self, out):
+
+		serialize.dump(self.__rootNode, out)
+
+	###########################################################################
+
+	# Loads a tree that was previously saved with save(). source is a filename
+	# or binary file object. By default, the tree is rebuilt using this DOM's
+	# backend and can be modified as usual. If lazy is True, the file is
+	# instead memory-mapped and the tree is read-only, with nodes decoded only
+	# as they're accessed.
+	def load(self, source, lazy = False):
+
+		self.reset()
+		root = serialize.load(source)
+
+		if lazy:
+			self.__rootNode = root
+			self.__curNode = root
+
+		else:
+			self.__initTree()
+			root.tree.materialize(self.createElement, self.__rootNode, root.index)
+
+	###########################################################################
+
+	# Same as parse(), except that this is a generator which yields None after
+	# each top-level token, so that parsing can be interleaved with other work
+	# (see aio.py.) If the tree is loaded from the cache, nothing is yielded.
+	def iterParse(self):
+
+		key = self.__cacheKey()
+		if self.__loadCached(key):
+			return
+
+		self.__beginParse()
+		yield from self.parser.iterParse()
+		self.__endParse(key)
+
+	###########################################################################
+
+	# Parses the RTF, yielding each paragraph as soon as it's complete. Yielded
+	# paragraphs are detached from the root, so with the default object
+	# backend memory stays proportional to a single paragraph rather than the
+	# whole document. (The columnar backend keeps detached nodes in its arrays,
+	# so it doesn't benefit.) Abandoning the generator stops parsing. If
+	# yieldSteps is True, None is also yielded after each top-level token (see
+	# iterParse().)
+	def iterParseParagraphs(self, yieldSteps = False):
+
+		self.__initTree(parsing = True)
+		self.__completedParas = collections.deque()
+
+		for step in self.parser.iterParse():
+			while self.__completedParas:
+				yield self.__detachParagraph(self.__completedParas.popleft())
+			if yieldSteps:
+				yield None
+
+		while self.__completedParas:
+			yield self.__detachParagraph(self.__completedParas.popleft())
+
+		self.__completedParas = None
+		self.__recordSpans = False
+
+	###########################################################################
+
+	# Removes a completed paragraph from the tree and returns it.
+	def __detachParagraph(self, para):
+
+		self.__rootNode.removeChild(para)
+		return para
+
+	###########################################################################
+
+	# Sets up an empty tree for the parser callbacks (or whatever else is
+	# building the tree) to populate. parsing should be True if the parser is
+	# about to fill it in, in which case nodes record their source spans if
+	# we're tracking them.
+	def __initTree(self, parsing = False):
+
+		if 'columnar' == self.__backend:
+			self.__tree = ColumnarTree()
+		else:
+			self.__tree = None
+
+		self.__recordSpans = parsing and self.__sourceSpans
+
+		self.__rootNode = self.createElement('rtf')
+		if self.__recordSpans:
+			self.__rootNode.sourceSpan = (0, len(self.parser.content or ''))
+		self.__curNode = self.__rootNode
+		self.__curPara = None
+		self.__openFormats = []
+		self.__completedParas = None
+
+		if self.__tree is not None:
+			self.__index = NodeIndex(resolve = self.__tree.node)
+			self.__tree.setIndex(self.__index, self.__rootNode.index)
+		else:
+			self.__index = NodeIndex()
+			self.__rootNode._setIndex(self.__index)
+
+	###########################################################################
+
+	# Called once a paragraph is complete to finish off the source spans of
+	# its nodes. Every container ends where its last descendant does (the
+	# parser only knows where a formatting element starts), and nodes that
+	# didn't record a span, such as those added by a custom field driver
+	# without going through createElement(), take their parent's. Iterative,
+	# so deeply nested paragraphs can't exhaust the stack.
+	def __finishSpans(self, para):
+
+		stack = [(para, False)]
+
+		while stack:
+
+			node, visited = stack.pop()
+			children = node.children
+
+			if not children:
+				continue
+
+			elif visited:
+				start, end = node.sourceSpan
+				for child in children:
+					end = max(end, child.sourceSpan[1])
+				node.sourceSpan = (start, end)
+
+			else:
+				stack.append((node, True))
+				span = node.sourceSpan
+				for child in children:
+					if child.sourceSpan is None:
+						child.sourceSpan = span
+					stack.append((child, False))
+
+	###########################################################################
+
+	# Adds delta to the source span of every node in the subtree rooted at
+	# node.
+	def __shiftSpans(self, node, delta):
+
+		for node in self.iterNodes(node):
+			span = node.sourceSpan
+			if span is not None:
+				node.sourceSpan = (span[0] + delta, span[1] + delta)
+
+	###########################################################################
+
+	# Returns the RTF that node was parsed from, or None if its source span
+	# wasn't recorded (see sourceSpans in __init__().)
+	def getSource(self, node):
+
+		span = node.sourceSpan
+
+		if span is None:
+			return None
+
+		return self.parser.content[span[0]:span[1]]
+
+	###########################################################################
+
+	# Reduces the tree (or the subtree rooted at node) to its canonical minimal
+	# form by dropping empty text and formatting nodes, merging adjacent text
+	# nodes and adjacent formatting elements of the same type, and unwrapping
+	# formatting that's already in effect. Runs in linear time.
+	def normalize(self, node = None):
+
+		if node is None:
+			node = self.__rootNode
+
+		normalizeTree(node)
+
+	###########################################################################
+
+	# Returns a list of every node of the specified type in the tree. Commonly
+	# needed types (paragraphs, hyperlinks, images, etc.; see
+	# index.INDEXED_TYPES) are tracked as the tree is built, so looking them
+	# up doesn't require a traversal. The returned list shouldn't be modified.
+	def getElementsByType(self, nodeType):
+
+		if self.__rootNode is None:
+			return []
+
+		elif self.__index is not None and self.__index.indexes(nodeType):
+			return self.__index.getElementsByType(nodeType)
+
+		return [node for node in self.iterNodes() if nodeType == node.nodeType]
+
+	###########################################################################
+
+	# Returns the paragraph at the specified (zero-based) position in the
+	# document.
+	def getParagraph(self, ordinal):
+
+		return self.getElementsByType('para')[ordinal]
+
+	###########################################################################
+
+	# Returns the number of paragraphs in the document.
+	def paragraphCount(self):
+
+		return len(self.getElementsByType('para'))
+
+	###########################################################################
+
+	# Returns a list of every image in the document.
+	def getImages(self):
+
+		return self.getElementsByType('img')
+
+	###########################################################################
+
+	# Returns an estimate of the memory used by the current tree and the RTF
+	# it was parsed from, as a dict. See memory.measureTree() for what's in
+	# it. Two more keys are added: 'sourceBytes' (the size of the RTF the
+	# parser holds on to) and 'parsePeakBytes' (the peak number of bytes
+	# allocated by the last call to parse(), or None if trackMemory isn't on.)
+	def memoryReport(self):
+
+		report = memory.measureTree(self.__rootNode)
+		report['sourceBytes'] = sys.getsizeof(self.parser.content) if self.parser.content else 0
+		report['parsePeakBytes'] = self.__peakBytes
+
+		return report
+
+	###########################################################################
+
+	# Iterates through the tree (or the subtree rooted at node) depth-first in
+	# document order, yielding (node, depth) tuples. Iterative rather than
+	# recursive, so deeply nested documents can't exhaust the stack.
+	def __walk(self, node):
+
+		if node is None:
+			node = self.__rootNode
+
+		stack = [(node, 0)]
+
+		while stack:
+
+			node, depth = stack.pop()
+			yield node, depth
+
+			children = node.children
+			if children:
+				for child in reversed(children):
+					stack.append((child, depth + 1))
+
+	###########################################################################
+
+	# Iterates through every node in the tree (or the subtree rooted at node)
+	# in document order.
+	def iterNodes(self, node = None):
+
+		for node, depth in self.__walk(node):
+			yield node
+
+	###########################################################################
+
+	# Iterates through the value of every text node in the tree (or the subtree
+	# rooted at node) in document order.
+	def iterText(self, node = None):
+
+		for node, depth in self.__walk(node):
+			if 'text' == node.nodeType and node.value:
+				yield node.value
+
+	###########################################################################
+
+	# Iterates through the document's paragraphs in order.
+	def iterParagraphs(self):
+
+		if self.__rootNode is not None:
+			for node in self.__rootNode.children:
+				if 'para' == node.nodeType:
+					yield node
+
+	###########################################################################
+
+	# Returns the document's text in reading order, with paragraphs separated
+	# by paragraphSeparator. The result is built with a single join, so this is
+	# linear in the size of the document.
+	def toPlainText(self, paragraphSeparator = '\n'):
+
+		return paragraphSeparator.join(
+			''.join(self.iterText(para)) for para in self.iterParagraphs()
+		)
+
+	###########################################################################
+
+	# Writes the document (or the subtree rooted at node) to out as plain text
+	# in a single pass. If out is None, the text is returned as a string. Any
+	# other keyword arguments are passed on to TextExporter.
+	def toText(self, out = None, node = None, **options):
+
+		return TextExporter(out, **options).writeTree(node or self.__rootNode)
+
+	###########################################################################
+
+	# Writes the document (or the subtree rooted at node) to out as Markdown
+	# in a single pass. If out is None, the Markdown is returned as a string.
+	# Any other keyword arguments are passed on to MarkdownExporter.
+	def toMarkdown(self, out = None, node = None, **options):
+
+		return MarkdownExporter(out, **options).writeTree(node or self.__rootNode)
+
+	###########################################################################
+
+	# Writes the document (or the subtree rooted at node) to out as HTML in a
+	# single pass. If out is None, the HTML is returned as a string. Any other
+	# keyword arguments are passed on to HTMLExporter.
+	def toHTML(self, out = None, node = None, **options):
+
+		return HTMLExporter(out, **options).writeTree(node or self.__rootNode)
+
+	###########################################################################
+
+	# Writes the document (or the subtree rooted at node) to out as RTF in a
+	# single pass. If out is None, the RTF is returned as a string. Any other
+	# keyword arguments are passed on to RTFExporter.
+	def toRTF(self, out = None, node = None, **options):
+
+		return RTFExporter(out, **options).writeTree(node or self.__rootNode)
+
+	###########################################################################
+
+	# Writes the document (or the subtree rooted at node) to out as JSON,
+	# depth-first and without building an intermediate dict. If out is None,
+	# the JSON is returned as a string. Any other keyword arguments are passed
+	# on to JSONExporter.
+	def toJSON(self, out = None, node = None, **options):
+
+		return JSONExporter(out, **options).writeTree(node or self.__rootNode)
+
+	###########################################################################
+
+	# Writes each paragraph to out as a JSON document on its own line. If the
+	# document has been opened but not parsed yet, it's parsed as it's
+	# written, so each paragraph is output as soon as it's complete. If out is
+	# None, the output is returned as a string. Any other keyword arguments
+	# are passed on to JSONExporter.
+	def toNDJSON(self, out = None, **options):
+
+		if self.__rootNode is None:
+			paragraphs = self.iterParseParagraphs()
+		else:
+			paragraphs = self.iterParagraphs()
+
+		return JSONExporter(out, **options).writeNDJSON(paragraphs)
+
+	###########################################################################
+
+	# Prints the tree (or the subtree rooted at curNode) to out, which
+	# defaults to stdout.
+	def printTree(self, curNode = None, indent = '', out = None):
+
+		if out is None:
+			out = sys.stdout
+
+		for node, depth in self.__walk(curNode):
+
+			nodeIndent = indent + '\t' * depth
+
+			nodeAttributes = ', '.join(
+				"'" + key + "': " + str(node.attributes[key]) for key in node.attributes.keys()
+			)
+
+			if isinstance(node.value, (bytes, bytearray)):
+				nodeValue = '<Binary Data>'
+			else:
+				nodeValue = node.value
+
+			out.write(
+				'\n' +
+				nodeIndent + 'nodeType: ' + node.nodeType + '\n' +
+				nodeIndent + 'attributes: {' + nodeAttributes + '}\n' +
+				nodeIndent + 'value: ' + nodeValue + '\n' +
+				nodeIndent + 'children: ' + str(node.childCount()) + '\n'
+			)
+
+	###########################################################################
 
-		if curNode.children:
-			for child in curNode.children:
-				self.printTree(child, indent + '\t')
+	# Returns the values of every node in document order, each preceded by
+	# separator. Binary values are represented by a placeholder.
+	def concatAllValues(self, separator = ''):
 
-	def concatAllValues(self, separator=''):
+		values = []
 
-		nodes = queue.SimpleQueue()
-		nodes.put(self.__rootNode)
-		value = ''
-		while not nodes.empty():
-			node = nodes.get()
+		for node in self.iterNodes():
 			if isinstance(node.value, (bytes, bytearray)):
-				value += separator + '<Binary Data>'
+				values.append('<Binary Data>')
 			else:
-				value += separator + node.value
-			if node.children:
-				for child in node.children:
-					nodes.put(child)
-		return value
+				values.append(node.value)
 
+		return ''.join(separator + value for value in values)
@@ -1,7 +1,20 @@
 # -*- coding: utf-8 -*-
 
+# Node types that represent character formatting. Each corresponds to a
+# boolean character attribute of the same name in the parser's state.
+FORMAT_TYPES = ['bold', 'italic', 'underline', 'strikethrough']
+
 class DOMElement(object):
 
+	# The NodeIndex (see index.py) the node is registered with, if any. This is
+	# only set on nodes that are attached to an indexed tree.
+	_index = None
+
+	# The (start, end) offsets of the RTF the node was parsed from, if source
+	# spans are being tracked (see RTFDOM.) Only set on nodes that have one,
+	# so nodes don't pay for it otherwise.
+	_sourceSpan = None
+
 	def __init__(self, nodeType):
 
 		self.__parent = None
@@ -46,6 +59,27 @@ class DOMElement(object):
 
 	###########################################################################
 
+	# The (start, end) offsets into the RTF that the node was parsed from, or
+	# None if they weren't recorded.
+	@property
+	def sourceSpan(self):
+
+		return self._sourceSpan
+
+	@sourceSpan.setter
+	def sourceSpan(self, span):
+
+		self._sourceSpan = span
+
+	###########################################################################
+
+	# Appends text to the node's value.
+	def appendText(self, text):
+
+		self.value += text
+
+	###########################################################################
+
 	# Append a node to another node's children.
 	def appendChild(self, child):
 
@@ -53,6 +87,28 @@ class DOMElement(object):
 			self._children.append(child)
 			child.parent = self
 
+			if child._index is not self._index:
+				child._setIndex(self._index)
+
+		else:
+			raise Exception('Children not allowed for node type ' + self.nodeType)
+
+	###########################################################################
+
+	# Inserts a node into another node's children just before reference. If
+	# reference is None, the node is appended.
+	def insertBefore(self, child, reference):
+
+		if reference is None:
+			return self.appendChild(child)
+
+		if list is type(self._children):
+			self._children.insert(self._children.index(reference), child)
+			child.parent = self
+
+			if child._index is not self._index:
+				child._setIndex(self._index)
+
 		else:
 			raise Exception('Children not allowed for node type ' + self.nodeType)
 
@@ -65,6 +121,57 @@ class DOMElement(object):
 			self.children.remove(child)
 			child.parent = None
 
+			if child._index is not None:
+				child._setIndex(None)
+
+	###########################################################################
+
+	# Replaces all of the node's children with the passed list of nodes.
+	def replaceChildren(self, children):
+
+		if list is type(self._children):
+
+			kept = set(map(id, children))
+			for child in self._children:
+				if child.parent is self and id(child) not in kept:
+					child.parent = None
+					if child._index is not None:
+						child._setIndex(None)
+
+			self._children = list(children)
+			for child in self._children:
+				child.parent = self
+				if child._index is not self._index:
+					child._setIndex(self._index)
+
+		else:
+			raise Exception('Children not allowed for node type ' + self.nodeType)
+
+	###########################################################################
+
+	# Registers the subtree rooted at this node with index, removing it from
+	# whatever index it was registered with before. Passing None just removes
+	# it. Nodes that have since been moved elsewhere are left alone.
+	def _setIndex(self, index):
+
+		stack = [self]
+
+		while stack:
+
+			node = stack.pop()
+
+			if node._index is not None:
+				node._index.remove(node.nodeType, node)
+
+			node._index = index
+			if index is not None:
+				index.add(node.nodeType, node)
+
+			if node._children:
+				for child in node._children:
+					if child.parent is node:
+						stack.append(child)
+
 	###########################################################################
 
 	# Returns the number of child nodes.
@@ -146,6 +253,10 @@ class PageBreakElement(DOMElement):
 # Text
 class TextElement(DOMElement):
 
+	# Number of appended pieces of text that are joined together at a time
+	# while the node is being built
+	CHUNK_SIZE = 1024
+
 	def __init__(self):
 
 		super().__init__('text')
@@ -153,6 +264,47 @@ class TextElement(DOMElement):
 		# Children aren't allowed in a text node
 		self._children = False
 
+	###########################################################################
+
+	# Text is appended to the node a character or two at a time, and adding
+	# each piece to the end of the value would copy everything before it,
+	# taking time proportional to the square of the text's length. Instead,
+	# pieces are collected in _pending, joined into _chunks CHUNK_SIZE at a
+	# time and only joined into a single string when the value is read. Both
+	# are None when there's nothing waiting to be joined, so that finished
+	# nodes don't carry around empty lists.
+	@property
+	def value(self):
+
+		if self._pending is not None:
+			self._value = ''.join([self._value] + self._chunks + self._pending)
+			self._chunks = None
+			self._pending = None
+
+		return self._value
+
+	@value.setter
+	def value(self, value):
+
+		self._value = value
+		self._chunks = None
+		self._pending = None
+
+	###########################################################################
+
+	# Appends text to the node's value.
+	def appendText(self, text):
+
+		if self._pending is None:
+			self._chunks = []
+			self._pending = []
+
+		self._pending.append(text)
+
+		if len(self._pending) >= self.CHUNK_SIZE:
+			self._chunks.append(''.join(self._pending))
+			self._pending = []
+
 ###############################################################################
 ###############################################################################
 
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+
+# A pull-based alternative to building a DOM. iterparse() runs the parser one
+# token at a time and yields typed events as they become available, so a
+# client can process large documents without ever materializing the whole
+# tree, and can stop early just by abandoning the generator.
+#
+# Only the output is incremental. The parser works on the document as a
+# single string, so the RTF itself is read into memory in full before the
+# first event is produced, and memory use still grows with the size of the
+# input (though not with the size of the tree that would have been built.)
+
+from collections import namedtuple
+from enum import Enum
+
+from .parse import RTFParser
+
+# Event types
+class EventType(Enum):
+	PARAGRAPH_START = 1
+	PARAGRAPH_END   = 2
+	TEXT            = 3
+	FORMAT_CHANGE   = 4
+	IMAGE           = 5
+	FIELD           = 6
+	PAGE_BREAK      = 7
+
+# A single parser event. What value and attributes contain depends on type:
+#
+# PARAGRAPH_START: attributes is a dict with the full 'paragraph' and
+#                  'character' formatting attributes in effect.
+# PARAGRAPH_END:   value and attributes are both None.
+# TEXT:            value is a run of text.
+# FORMAT_CHANGE:   attributes is a dict with 'paragraph' and 'character'
+#                  dicts containing only the attributes that changed (and
+#                  their new values.)
+# IMAGE:           value is the image's binary data and attributes are the
+#                  image's attributes (same as an ImageElement's.)
+# FIELD:           value is the field's result as raw RTF and attributes is a
+#                  dict containing the field's 'instruction'.
+# PAGE_BREAK:      value and attributes are both None.
+Event = namedtuple('Event', ['type', 'value', 'attributes'])
+
+# Consecutive characters are combined into a single TEXT event, but we'll
+# break a run into more than one event once it gets this long so that memory
+# stays bounded.
+MAX_TEXT_RUN = 65536
+
+###############################################################################
+
+# Turns the parser's callbacks into a list of events. If onEvent is provided,
+# each event is passed to it as soon as it's ready instead.
+class _EventCollector(object):
+
+	def __init__(self, onEvent = None):
+
+		# Events that are ready to be handed out
+		self.events = []
+		self.__emit = onEvent if onEvent is not None else self.events.append
+
+		# Characters that haven't been turned into a TEXT event yet
+		self.__text = []
+		self.__textLength = 0
+
+		self.callbacks = {
+			'onOpenParagraph':   self.onOpenParagraph,
+			'onCloseParagraph':  self.onCloseParagraph,
+			'onAppendParagraph': self.onAppendParagraph,
+			'onStateChange':     self.onStateChange,
+			'onField':           self.onField,
+			'onImage':           self.onImage,
+			'onPageBreak':       self.onPageBreak
+		}
+
+	###########################################################################
+
+	# Turns any pending text into a TEXT event.
+	def flushText(self):
+
+		if self.__text:
+			self.__emit(Event(EventType.TEXT, ''.join(self.__text), None))
+			self.__text = []
+			self.__textLength = 0
+
+	###########################################################################
+
+	# Adds an event, making sure any text that preceded it comes first.
+	def __append(self, eventType, value = None, attributes = None):
+
+		self.flushText()
+		self.__emit(Event(eventType, value, attributes))
+
+	###########################################################################
+
+	def onOpenParagraph(self, parser):
+
+		attributes = parser.fullStateAttributes
+		self.__append(EventType.PARAGRAPH_START, None, {
+			'paragraph': attributes['paragraph'],
+			'character': attributes['character']
+		})
+
+	###########################################################################
+
+	def onCloseParagraph(self, parser):
+
+		self.__append(EventType.PARAGRAPH_END)
+
+	###########################################################################
+
+	def onAppendParagraph(self, parser, text):
+
+		self.__text.append(text)
+		self.__textLength += len(text)
+
+		if self.__textLength >= MAX_TEXT_RUN:
+			self.flushText()
+
+	###########################################################################
+
+	def onStateChange(self, parser, oldState, newState):
+
+		changes = {}
+
+		for namespace in ('paragraph', 'character'):
+			changes[namespace] = {}
+			for attribute in newState[namespace]:
+				if attribute not in oldState[namespace] or (
+					newState[namespace][attribute] != oldState[namespace][attribute]
+				):
+					changes[namespace][attribute] = newState[namespace][attribute]
+
+		if changes['paragraph'] or changes['character']:
+			self.__append(EventType.FORMAT_CHANGE, None, changes)
+
+	###########################################################################
+
+	def onField(self, parser, fldinst, fldrslt):
+
+		self.__append(EventType.FIELD, fldrslt, {'instruction': fldinst})
+
+	###########################################################################
+
+	def onImage(self, parser, attributes, image):
+
+		self.__append(EventType.IMAGE, image, dict(attributes))
+
+	###########################################################################
+
+	def onPageBreak(self, parser):
+
+		self.__append(EventType.PAGE_BREAK)
+
+###############################################################################
+
+# Parses a string containing an RTF document, yielding a list of the Events
+# produced by each top-level token (often empty) as soon as the token has
+# been parsed (see RTFParser.iterParse()), followed by a list of any Events
+# still pending at the end of the document.
+def _iterEventSteps(rtfContent):
+
+	collector = _EventCollector()
+	parser = RTFParser({'callbacks': collector.callbacks})
+	parser.openString(rtfContent)
+
+	for step in parser.iterParse():
+		events = collector.events[:]
+		del collector.events[:]
+		yield events
+
+	collector.flushText()
+	yield collector.events
+
+###############################################################################
+
+# Parses a string containing an RTF document and yields Events lazily as the
+# parser advances.
+def iterparseString(rtfContent):
+
+	for events in _iterEventSteps(rtfContent):
+		yield from events
+
+###############################################################################
+
+# Parses an RTF document and yields Events lazily as the parser advances.
+# source is either a filename or a file object. The whole document is read
+# before parsing starts (see the comment at the top of this file), so only
+# the events are produced incrementally.
+def iterparse(source):
+
+	if isinstance(source, str):
+		with open(source, 'r') as rtfFile:
+			rtfContent = rtfFile.read()
+	else:
+		rtfContent = source.read()
+
+	if isinstance(rtfContent, (bytes, bytearray)):
+		rtfContent = rtfContent.decode('utf-8')
+
+	return iterparseString(rtfContent)
@@ -0,0 +1,382 @@
+# -*- coding: utf-8 -*-
+
+# Common machinery for exporters. An exporter is driven either by the events
+# that iterparse() yields (see events.py) or by walking a tree that's already
+# been built, and translates them into calls to a small set of hooks
+# (paragraphs, formatting, text, links, images and page breaks) that
+# subclasses implement to produce a particular output format. Formatting is
+# applied lazily, right before the content it affects, so that a run of
+# formatting changes with no text in between never produces any output.
+
+import base64, os
+
+from ..elements import FORMAT_TYPES
+from ..fields import hyperlinkTarget, splitInstruction
+from ..events import EventType, iterparseString, _EventCollector
+from .writer import Writer
+
+# MIME type and file extension for each image source format
+IMAGE_TYPES = {
+	'png':     ('image/png', 'png'),
+	'jpeg':    ('image/jpeg', 'jpg'),
+	'emf':     ('image/emf', 'emf'),
+	'winmeta': ('image/wmf', 'wmf'),
+	'wdibmp':  ('image/bmp', 'bmp'),
+	'wddbmp':  ('image/bmp', 'bmp'),
+	'os2meta': ('application/octet-stream', 'met')
+}
+
+# Images are base64 encoded this many bytes at a time (must be a multiple of 3
+# so that the chunks can simply be concatenated.)
+IMAGE_CHUNK_SIZE = 3 * 16384
+
+class Exporter(object):
+
+	# out is where output should be written (see Writer.) If it's None, output
+	# is returned as a string when we're finished.
+	def __init__(self, out = None):
+
+		self._writer = Writer(out)
+
+		# Character formatting attributes currently in effect
+		self.__character = {}
+
+		# The list of formats most recently passed to self._setFormats()
+		self.__appliedFormats = []
+
+		# Paragraph attributes for a paragraph whose opening hasn't been
+		# written yet. This lets us pick up paragraph formatting that's set
+		# after the paragraph was opened but before it has any content.
+		self.__pendingParagraph = None
+		self.__inParagraph = False
+
+		# Number of images written to external files so far
+		self.__imageCount = 0
+
+	###########################################################################
+
+	# Hooks for subclasses. formats is a list of the FORMAT_TYPES that are in
+	# effect, in the order they appear in FORMAT_TYPES.
+
+	def _startDocument(self):
+		pass
+
+	def _endDocument(self):
+		pass
+
+	def _openParagraph(self, attributes):
+		pass
+
+	def _closeParagraph(self):
+		pass
+
+	def _setFormats(self, formats):
+		pass
+
+	def _text(self, text):
+		pass
+
+	def _openLink(self, href):
+		pass
+
+	def _closeLink(self):
+		pass
+
+	def _image(self, attributes, data):
+		pass
+
+	def _pageBreak(self):
+		pass
+
+	###########################################################################
+
+	# Brings the output's formatting up to date with the current state.
+	def __applyFormats(self, character):
+
+		formats = [attribute for attribute in FORMAT_TYPES if character.get(attribute)]
+
+		if formats != self.__appliedFormats:
+			self._setFormats(formats)
+			self.__appliedFormats = formats
+
+	###########################################################################
+
+	# Closes any formatting that's currently applied in the output.
+	def __clearFormats(self):
+
+		if self.__appliedFormats:
+			self._setFormats([])
+			self.__appliedFormats = []
+
+	###########################################################################
+
+	# Writes the opening of the current paragraph if we haven't already.
+	def __beginContent(self, character):
+
+		if self.__pendingParagraph is not None:
+			self._openParagraph(self.__pendingParagraph)
+			self.__pendingParagraph = None
+
+		self.__applyFormats(character)
+
+	###########################################################################
+
+	# Returns the href of a HYPERLINK field instruction, or None if the
+	# instruction is for some other kind of field or the link has no target
+	# (see fields.hyperlinkTarget().)
+	@staticmethod
+	def _getHyperlink(instruction):
+
+		fieldType, fldPara = splitInstruction(instruction)
+
+		if 'HYPERLINK' == fieldType:
+			return hyperlinkTarget(fldPara)
+		else:
+			return None
+
+	###########################################################################
+
+	# Writes image data base64 encoded, a chunk at a time.
+	def _writeBase64(self, data):
+
+		for offset in range(0, len(data), IMAGE_CHUNK_SIZE):
+			self._writer.write(base64.b64encode(data[offset:offset + IMAGE_CHUNK_SIZE]).decode('ascii'))
+
+	###########################################################################
+
+	# Writes an image as a data URI.
+	def _writeDataURI(self, attributes, data):
+
+		mimeType, extension = IMAGE_TYPES.get(attributes.get('source'), IMAGE_TYPES['os2meta'])
+
+		self._writer.write('data:' + mimeType + ';base64,')
+		self._writeBase64(data)
+
+	###########################################################################
+
+	# Saves an image to the next available file in directory and returns the
+	# file's name.
+	def _saveImage(self, directory, attributes, data):
+
+		mimeType, extension = IMAGE_TYPES.get(attributes.get('source'), IMAGE_TYPES['os2meta'])
+
+		self.__imageCount += 1
+		filename = 'image' + str(self.__imageCount) + '.' + extension
+
+		with open(os.path.join(directory, filename), 'wb') as imageFile:
+			imageFile.write(data)
+
+		return filename
+
+	###########################################################################
+
+	# Writes a field's result, which is raw RTF, as inline content. Formatting
+	# inside the result is applied on top of the formatting that was in effect
+	# around the field.
+	def __field(self, instruction, fldrslt):
+
+		href = self._getHyperlink(instruction)
+
+		if href is not None:
+			self.__beginContent({})
+			self.__clearFormats()
+			self._openLink(href)
+
+		outer = self.__character
+		inner = {}
+
+		for event in iterparseString('{' + fldrslt + '}'):
+
+			if EventType.PARAGRAPH_START == event.type:
+				inner = dict(event.attributes['character'])
+
+			elif EventType.FORMAT_CHANGE == event.type:
+				inner.update(event.attributes['character'])
+
+			else:
+				character = {attribute: outer.get(attribute) or inner.get(attribute) for attribute in FORMAT_TYPES}
+				self.__inline(event, character)
+
+		if href is not None:
+			self.__clearFormats()
+			self._closeLink()
+
+	###########################################################################
+
+	# Handles events that produce content inside a paragraph.
+	def __inline(self, event, character):
+
+		if EventType.TEXT == event.type:
+			self.__beginContent(character)
+			self._text(event.value)
+
+		elif EventType.IMAGE == event.type:
+			self.__beginContent(character)
+			self._image(event.attributes, event.value)
+
+		elif EventType.PAGE_BREAK == event.type:
+			self.__beginContent(character)
+			self._pageBreak()
+
+		elif EventType.FIELD == event.type:
+			self.__field(event.attributes['instruction'], event.value)
+
+	###########################################################################
+
+	# Begins a paragraph with the specified paragraph and character
+	# attributes. The paragraph's opening is deferred until it has content.
+	def __startParagraph(self, paragraph, character):
+
+		self.__character = character
+		self.__pendingParagraph = paragraph
+		self.__inParagraph = True
+
+	###########################################################################
+
+	# Ends the current paragraph.
+	def __endParagraph(self):
+
+		self.__beginContent({})
+		self.__clearFormats()
+
+		if self.__inParagraph:
+			self._closeParagraph()
+
+		self.__inParagraph = False
+
+	###########################################################################
+
+	# Processes a single event.
+	def feed(self, event):
+
+		if EventType.PARAGRAPH_START == event.type:
+			self.__startParagraph(
+				dict(event.attributes['paragraph']),
+				dict(event.attributes['character'])
+			)
+
+		elif EventType.PARAGRAPH_END == event.type:
+			self.__endParagraph()
+
+		elif EventType.FORMAT_CHANGE == event.type:
+			self.__character.update(event.attributes['character'])
+			if self.__pendingParagraph is not None:
+				self.__pendingParagraph.update(event.attributes['paragraph'])
+
+		else:
+			self.__inline(event, self.__character)
+
+	###########################################################################
+
+	# Must be called before feeding any events.
+	def start(self):
+
+		self._startDocument()
+
+	###########################################################################
+
+	# Must be called after the last event has been fed. Returns the output as
+	# a string if we weren't given a file object to write to.
+	def finish(self):
+
+		self._endDocument()
+		self._writer.flush()
+
+		return self._writer.getvalue()
+
+	###########################################################################
+
+	# Returns a dictionary of parser callbacks that feed this exporter, so
+	# that it can be plugged directly into an RTFParser. Call start() before
+	# parsing and finish() afterward.
+	def parserCallbacks(self):
+
+		return _EventCollector(self.feed).callbacks
+
+	###########################################################################
+
+	# Exports a stream of events (such as the ones yielded by iterparse().)
+	# Returns the output as a string if we weren't given a file object to
+	# write to.
+	def writeEvents(self, events):
+
+		self.start()
+
+		for event in events:
+			self.feed(event)
+
+		return self.finish()
+
+	###########################################################################
+
+	# Exports a tree that's already been built (the root node of an RTFDOM or
+	# any paragraph inside it) in a single iterative pass. Returns the output
+	# as a string if we weren't given a file object to write to.
+	def writeTree(self, node):
+
+		self.start()
+
+		# Formatting elements enclosing the current node
+		formats = []
+
+		# (node, leaving) tuples, where leaving is True once we've finished
+		# with the node's children.
+		stack = [(node, False)]
+
+		while stack:
+
+			node, leaving = stack.pop()
+			nodeType = node.nodeType
+
+			if leaving:
+
+				if 'para' == nodeType:
+					self.__endParagraph()
+
+				elif 'hyperlink' == nodeType:
+					self.__clearFormats()
+					self._closeLink()
+
+				else:
+					formats.pop()
+
+				continue
+
+			character = {attribute: True for attribute in formats}
+
+			if 'text' == nodeType:
+				if node.value:
+					self.__beginContent(character)
+					self._text(node.value)
+				continue
+
+			elif 'img' == nodeType:
+				self.__beginContent(character)
+				self._image(dict(node.attributes), node.value)
+				continue
+
+			elif 'pagebreak' == nodeType:
+				self.__beginContent(character)
+				self._pageBreak()
+				continue
+
+			elif 'para' == nodeType:
+				self.__startParagraph(dict(node.attributes), {})
+				stack.append((node, True))
+
+			elif 'hyperlink' == nodeType:
+				self.__beginContent({})
+				self.__clearFormats()
+				self._openLink(node.attributes.get('href', ''))
+				stack.append((node, True))
+
+			elif nodeType in FORMAT_TYPES:
+				formats.append(nodeType)
+				stack.append((node, True))
+
+			children = node.children
+			if children:
+				for child in reversed(children):
+					stack.append((child, False))
+
+		return self.finish()
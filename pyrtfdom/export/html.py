@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+
+# Converts RTF to HTML. The converter is driven directly by parser events, so
+# HTML is written incrementally as the document is parsed, output starts
+# immediately and memory use doesn't depend on the size of the document.
+
+import html
+
+from ..events import iterparse
+from .base import Exporter
+
+# HTML tags for each type of formatting
+FORMAT_TAGS = {
+	'bold':          'b',
+	'italic':        'i',
+	'underline':     'u',
+	'strikethrough': 's'
+}
+
+# CSS text-align values for each paragraph alignment
+ALIGNMENTS = {
+	'left':             'left',
+	'right':            'right',
+	'center':           'center',
+	'justified':        'justify',
+	'distributed':      'justify',
+	'thai-distributed': 'justify'
+}
+
+# Number of twips in a CSS pixel
+TWIPS_PER_PIXEL = 15
+
+class HTMLExporter(Exporter):
+
+	# images determines how images are written: 'inline' embeds them as data
+	# URIs and 'external' writes each one to a file in imageDir, referring to
+	# it as imagePrefix followed by the filename. If standalone is True, the
+	# output is a complete HTML document rather than a fragment.
+	def __init__(self, out = None, images = 'inline', imageDir = None, imagePrefix = '', standalone = True):
+
+		super().__init__(out)
+
+		if images not in ('inline', 'external'):
+			raise ValueError(str(images) + ' is not a supported image mode.')
+		elif 'external' == images and imageDir is None:
+			raise ValueError('imageDir is required when writing images to external files.')
+
+		self.__images = images
+		self.__imageDir = imageDir
+		self.__imagePrefix = imagePrefix
+		self.__standalone = standalone
+
+		# Formatting tags that are currently open, from outermost to innermost
+		self.__openTags = []
+
+		# The opening tag of the current paragraph, if nothing has been
+		# written in it yet, and empty paragraphs that haven't been written
+		# yet. An empty paragraph is only written once something follows it,
+		# so that the empty paragraph RTF leaves after its last \par doesn't
+		# show up at the end of every document.
+		self.__paragraphTag = None
+		self.__emptyParagraphs = []
+
+	###########################################################################
+
+	# Writes the opening of the current paragraph (and any empty paragraphs
+	# before it) if we haven't already. Called before writing any content.
+	def __beginParagraph(self):
+
+		if self.__paragraphTag is not None:
+
+			for tag in self.__emptyParagraphs:
+				self._writer.write(tag + '</p>\n')
+
+			self.__emptyParagraphs = []
+			self._writer.write(self.__paragraphTag)
+			self.__paragraphTag = None
+
+	###########################################################################
+
+	def _startDocument(self):
+
+		self.__paragraphTag = None
+		self.__emptyParagraphs = []
+
+		if self.__standalone:
+			self._writer.write('<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n</head>\n<body>\n')
+
+	###########################################################################
+
+	# Empty paragraphs that are still being held back are the ones at the
+	# very end of the document, so they're dropped.
+	def _endDocument(self):
+
+		if self.__standalone:
+			self._writer.write('</body>\n</html>\n')
+
+	###########################################################################
+
+	def _openParagraph(self, attributes):
+
+		styles = []
+
+		alignment = ALIGNMENTS.get(attributes.get('alignment'), 'left')
+		if 'left' != alignment:
+			styles.append('text-align: ' + alignment)
+
+		if attributes.get('pagebreakBefore'):
+			styles.append('page-break-before: always')
+
+		if styles:
+			self.__paragraphTag = '<p style="' + '; '.join(styles) + '">'
+		else:
+			self.__paragraphTag = '<p>'
+
+	###########################################################################
+
+	def _closeParagraph(self):
+
+		if self.__paragraphTag is not None:
+			self.__emptyParagraphs.append(self.__paragraphTag)
+			self.__paragraphTag = None
+		else:
+			self._writer.write('</p>\n')
+
+	###########################################################################
+
+	# Opens and closes as few tags as possible to get from the formatting
+	# that's currently open to the requested formatting.
+	def _setFormats(self, formats):
+
+		self.__beginParagraph()
+
+		# Tags that are still wanted can stay open, but only up to the first
+		# one that has to close (everything nested inside it closes too.)
+		keep = 0
+		while keep < len(self.__openTags) and self.__openTags[keep] in formats:
+			keep += 1
+
+		for attribute in reversed(self.__openTags[keep:]):
+			self._writer.write('</' + FORMAT_TAGS[attribute] + '>')
+
+		del self.__openTags[keep:]
+
+		for attribute in formats:
+			if attribute not in self.__openTags:
+				self._writer.write('<' + FORMAT_TAGS[attribute] + '>')
+				self.__openTags.append(attribute)
+
+	###########################################################################
+
+	def _text(self, text):
+
+		self.__beginParagraph()
+		self._writer.write(html.escape(text, False).replace('\n', '<br>\n'))
+
+	###########################################################################
+
+	def _openLink(self, href):
+
+		self.__beginParagraph()
+		self._writer.write('<a href="' + html.escape(href) + '">')
+
+	###########################################################################
+
+	def _closeLink(self):
+
+		self._writer.write('</a>')
+
+	###########################################################################
+
+	def _pageBreak(self):
+
+		self.__beginParagraph()
+		self._writer.write('<br style="page-break-before: always">')
+
+	###########################################################################
+
+	def _image(self, attributes, data):
+
+		self.__beginParagraph()
+		self._writer.write('<img')
+
+		for attribute, cssAttribute in (('\\picwgoal', 'width'), ('\\pichgoal', 'height')):
+			if attribute in attributes:
+				self._writer.write(' ' + cssAttribute + '="' + str(attributes[attribute] // TWIPS_PER_PIXEL) + '"')
+
+		self._writer.write(' src="')
+
+		if 'inline' == self.__images:
+			self._writeDataURI(attributes, data)
+		else:
+			filename = self._saveImage(self.__imageDir, attributes, data)
+			self._writer.write(html.escape(self.__imagePrefix + filename))
+
+		self._writer.write('">')
+
+###############################################################################
+
+# Converts an RTF document to HTML. source is a filename or file object (see
+# iterparse()) and out is where the HTML should be written. If out is None, the
+# HTML is returned as a string instead. Any other keyword arguments are passed
+# on to HTMLExporter.
+def toHTML(source, out = None, **options):
+
+	return HTMLExporter(out, **options).writeEvents(iterparse(source))
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+# Exports a DOM tree as JSON. Nodes are written depth-first straight to the
+# output as they're visited, so no intermediate dict is ever built and peak
+# memory doesn't grow with the size of the document. Every node is an object
+# of the form:
+#
+# {"nodeType": "para", "attributes": {...}, "value": "...", "children": [...]}
+#
+# where children is only present for node types that allow children. Each
+# image's value is either its data, base64 encoded, or the path of a file it
+# was written to.
+#
+# The NDJSON variant writes each paragraph as a separate JSON document on its
+# own line, so consumers can start processing paragraphs before the whole
+# document has been written (or even parsed; see RTFDOM.toNDJSON().)
+#
+# Since JSON mirrors the tree's structure rather than its formatting, this
+# exporter only writes trees. It shares Exporter's image handling, but not its
+# formatting hooks.
+
+import json
+
+from .base import Exporter
+
+# Separators passed to json.dumps() for compact output
+SEPARATORS = (',', ':')
+
+class JSONExporter(Exporter):
+
+	# images determines how images are written: 'inline' embeds their data
+	# base64 encoded and 'external' writes each one to a file in imageDir,
+	# using imagePrefix followed by the filename as the node's value.
+	def __init__(self, out = None, images = 'inline', imageDir = None, imagePrefix = ''):
+
+		if images not in ('inline', 'external'):
+			raise ValueError(str(images) + ' is not a supported image mode.')
+		elif 'external' == images and imageDir is None:
+			raise ValueError('imageDir is required when writing images to external files.')
+
+		super().__init__(out)
+
+		self.__images = images
+		self.__imageDir = imageDir
+		self.__imagePrefix = imagePrefix
+
+	###########################################################################
+
+	# Writes an image node's value.
+	def __writeImage(self, node):
+
+		if 'inline' == self.__images:
+			self._writer.write('"')
+			self._writeBase64(node.value)
+			self._writer.write('"')
+
+		else:
+			filename = self._saveImage(self.__imageDir, node.attributes, node.value)
+			self._writer.write(json.dumps(self.__imagePrefix + filename))
+
+	###########################################################################
+
+	# Writes the subtree rooted at node as a single JSON object.
+	def __writeNode(self, node):
+
+		# (node, position among its siblings) tuples, or (None, None) to close
+		# the children of the most recently opened node.
+		stack = [(node, 0)]
+
+		while stack:
+
+			node, position = stack.pop()
+
+			if node is None:
+				self._writer.write(']}')
+				continue
+
+			if position:
+				self._writer.write(',')
+
+			self._writer.write(
+				'{"nodeType":' + json.dumps(node.nodeType) +
+				',"attributes":' + json.dumps(dict(node.attributes), separators = SEPARATORS) +
+				',"value":'
+			)
+
+			if isinstance(node.value, (bytes, bytearray)):
+				self.__writeImage(node)
+			else:
+				self._writer.write(json.dumps(node.value))
+
+			children = node.children
+
+			if children is False:
+				self._writer.write('}')
+
+			else:
+				self._writer.write(',"children":[')
+				stack.append((None, None))
+				for position in range(len(children) - 1, -1, -1):
+					stack.append((children[position], position))
+
+	###########################################################################
+
+	# Exports the tree rooted at node as a single JSON document. Returns the
+	# output as a string if we weren't given a file object to write to.
+	def writeTree(self, node):
+
+		self.__writeNode(node)
+		self._writer.flush()
+
+		return self._writer.getvalue()
+
+	###########################################################################
+
+	# Exports each node in paragraphs (any iterable, such as the generator
+	# returned by RTFDOM.iterParseParagraphs()) as a separate JSON document on
+	# its own line. Output is flushed after every paragraph, so consumers
+	# reading the other end of a stream see each one as soon as it's ready.
+	# Returns the output as a string if we weren't given a file object to
+	# write to.
+	def writeNDJSON(self, paragraphs):
+
+		for para in paragraphs:
+			self.__writeNode(para)
+			self._writer.write('\n')
+			self._writer.flush()
+
+		return self._writer.getvalue()
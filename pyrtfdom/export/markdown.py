@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+
+# Converts RTF to Markdown. Bold, italic and strikethrough map to their
+# Markdown equivalents (underline has none and is dropped), hyperlinks become
+# inline links and page breaks become thematic breaks. Paragraph alignment
+# can't be expressed in Markdown and is ignored.
+
+from ..events import iterparse
+from .base import Exporter
+
+# Markdown delimiters for each type of formatting
+FORMAT_DELIMITERS = {
+	'bold':          '**',
+	'italic':        '*',
+	'strikethrough': '~~'
+}
+
+# Characters that have to be backslash escaped in text
+SPECIAL_CHARACTERS = '\\`*_[]<>~#'
+
+class MarkdownExporter(Exporter):
+
+	# images determines how images are written: 'inline' embeds them as data
+	# URIs, 'external' writes each one to a file in imageDir, referring to it
+	# as imagePrefix followed by the filename, and 'omit' leaves them out.
+	def __init__(self, out = None, images = 'omit', imageDir = None, imagePrefix = ''):
+
+		super().__init__(out)
+
+		if images not in ('inline', 'external', 'omit'):
+			raise ValueError(str(images) + ' is not a supported image mode.')
+		elif 'external' == images and imageDir is None:
+			raise ValueError('imageDir is required when writing images to external files.')
+
+		self.__images = images
+		self.__imageDir = imageDir
+		self.__imagePrefix = imagePrefix
+
+		self.__escapes = str.maketrans({c: '\\' + c for c in SPECIAL_CHARACTERS})
+
+		# Delimiters that have been written and not yet closed, from
+		# outermost to innermost
+		self.__open = []
+
+		# Formatting that's been requested but whose opening delimiters
+		# haven't been written yet. Markdown emphasis can't begin with
+		# whitespace or end with it, so delimiters are only written right
+		# before non-whitespace text, and whitespace at the end of a run is
+		# held back until we know whether a closing delimiter comes first.
+		self.__pendingOpen = []
+		self.__pendingSpace = ''
+
+		# Target of the hyperlink we're currently inside of
+		self.__href = None
+
+		# Whether anything has been written in the current paragraph
+		self.__emptyParagraph = True
+
+	###########################################################################
+
+	# Writes any whitespace that's being held back.
+	def __flushSpace(self):
+
+		if self.__pendingSpace:
+			self._writer.write(self.__pendingSpace)
+			self.__pendingSpace = ''
+
+	###########################################################################
+
+	# Writes the opening delimiters of any pending formatting.
+	def __flushOpen(self):
+
+		for attribute in self.__pendingOpen:
+			self._writer.write(FORMAT_DELIMITERS[attribute])
+
+		self.__open.extend(self.__pendingOpen)
+		self.__pendingOpen = []
+
+	###########################################################################
+
+	# Closes every open delimiter, leaving the formatting pending so that it
+	# reopens before the next text.
+	def __suspendFormats(self):
+
+		for attribute in reversed(self.__open):
+			self._writer.write(FORMAT_DELIMITERS[attribute])
+
+		self.__pendingOpen = self.__open + self.__pendingOpen
+		self.__open = []
+
+	###########################################################################
+
+	# Escapes a piece of text, turning line breaks into hard line breaks.
+	def __escape(self, text):
+
+		return '\\\n'.join(line.translate(self.__escapes) for line in text.split('\n'))
+
+	###########################################################################
+
+	# Escapes characters that would end a link destination early.
+	@staticmethod
+	def __escapeURL(url):
+
+		return url.replace(' ', '%20').replace('(', '%28').replace(')', '%29')
+
+	###########################################################################
+
+	def _openParagraph(self, attributes):
+
+		self.__pendingSpace = ''
+		self.__emptyParagraph = True
+
+	###########################################################################
+
+	def _closeParagraph(self):
+
+		# Trailing whitespace is insignificant in Markdown, and so are empty
+		# paragraphs.
+		self.__pendingSpace = ''
+		if not self.__emptyParagraph:
+			self._writer.write('\n\n')
+
+	###########################################################################
+
+	def _setFormats(self, formats):
+
+		formats = [attribute for attribute in formats if attribute in FORMAT_DELIMITERS]
+		current = self.__open + self.__pendingOpen
+
+		keep = 0
+		while keep < len(current) and current[keep] in formats:
+			keep += 1
+
+		while len(self.__open) > keep:
+			self._writer.write(FORMAT_DELIMITERS[self.__open.pop()])
+
+		# Delimiters that were never written can simply be forgotten
+		self.__pendingOpen = current[len(self.__open):keep] + [
+			attribute for attribute in formats if attribute not in current[:keep]
+		]
+
+	###########################################################################
+
+	def _text(self, text):
+
+		body = text.strip()
+
+		if not body:
+			self.__pendingSpace += text
+			return
+
+		leading = text[:len(text) - len(text.lstrip())]
+		trailing = text[len(text.rstrip()):]
+
+		self.__flushSpace()
+		self._writer.write(leading)
+		self.__flushOpen()
+		self._writer.write(self.__escape(body))
+		self.__pendingSpace = trailing
+		self.__emptyParagraph = False
+
+	###########################################################################
+
+	def _openLink(self, href):
+
+		self.__flushSpace()
+		self._writer.write('[')
+		self.__href = href
+		self.__emptyParagraph = False
+
+	###########################################################################
+
+	def _closeLink(self):
+
+		self._writer.write('](' + self.__escapeURL(self.__href) + ')')
+		self.__href = None
+
+	###########################################################################
+
+	def _pageBreak(self):
+
+		self.__suspendFormats()
+		self.__pendingSpace = ''
+		self._writer.write('\n\n---\n\n')
+		self.__emptyParagraph = False
+
+	###########################################################################
+
+	def _image(self, attributes, data):
+
+		if 'omit' == self.__images:
+			return
+
+		self.__flushSpace()
+		self.__flushOpen()
+		self._writer.write('![](')
+		self.__emptyParagraph = False
+
+		if 'inline' == self.__images:
+			self._writeDataURI(attributes, data)
+		else:
+			self._writer.write(self.__escapeURL(self.__imagePrefix + self._saveImage(self.__imageDir, attributes, data)))
+
+		self._writer.write(')')
+
+###############################################################################
+
+# Converts an RTF document to Markdown. source is a filename or file object
+# (see iterparse()) and out is where the Markdown should be written. If out is
+# None, the Markdown is returned as a string instead. Any other keyword
+# arguments are passed on to MarkdownExporter.
+def toMarkdown(source, out = None, **options):
+
+	return MarkdownExporter(out, **options).writeEvents(iterparse(source))
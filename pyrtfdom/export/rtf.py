@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+
+# Writes RTF, so that a document that's been parsed (and possibly modified)
+# can be turned back into RTF. The output has a minimal header containing only
+# a font table and a stylesheet with the paragraph styles that are actually
+# used, and a compact body that only emits control words when formatting
+# actually changes. Like the other exporters, output is written as we go, so
+# large trees never have to be turned into one giant string.
+
+import binascii, re
+
+from ..elements import FORMAT_TYPES
+from ..events import iterparse
+from .base import Exporter
+
+# Control words that turn each type of formatting on. Appending 0 turns the
+# formatting back off.
+FORMAT_WORDS = {
+	'bold':          '\\b',
+	'italic':        '\\i',
+	'underline':     '\\ul',
+	'strikethrough': '\\strike'
+}
+
+# Control words for each paragraph alignment
+ALIGNMENT_WORDS = {
+	'left':             '\\ql',
+	'right':            '\\qr',
+	'center':           '\\qc',
+	'distributed':      '\\qd',
+	'justified':        '\\qj',
+	'thai-distributed': '\\qt'
+}
+
+# Control words for each image source format, along with the image attribute
+# that holds the control word's parameter (if it takes one.)
+IMAGE_SOURCE_WORDS = {
+	'png':     ('\\pngblip', None),
+	'jpeg':    ('\\jpegblip', None),
+	'emf':     ('\\emfblip', None),
+	'winmeta': ('\\wmetafile', 'metafileMappingMode'),
+	'wdibmp':  ('\\dibitmap', 'bitmapType'),
+	'wddbmp':  ('\\wbitmap', 'bitmapType'),
+	'os2meta': ('\\pmmetafile', 'metafileType')
+}
+
+# Number of bytes of image data written per line (each byte is two hex digits)
+IMAGE_BYTES_PER_LINE = 64
+
+# The default paragraph style, which is always \s0
+DEFAULT_STYLE = 'Normal'
+
+# Characters in text that have to be escaped
+SPECIAL_CHARACTERS = re.compile('[\\\\{}\t\n\x00-\x08\x0b-\x1f\x7f-\U0010ffff]')
+
+# Escapes for special characters that have one. Control words include the
+# space that delimits them, which readers discard.
+ESCAPES = {
+	'\\':     '\\\\',
+	'{':      '\\{',
+	'}':      '\\}',
+	'\t':     '\\tab ',
+	'\n':     '\\line ',
+	'\u00a0': '\\~',
+	'\u2011': '\\_'
+}
+
+###############################################################################
+
+# Returns the escaped form of a single special character.
+def _escapeCharacter(match):
+
+	character = match.group()
+
+	if character in ESCAPES:
+		return ESCAPES[character]
+
+	codePoint = ord(character)
+
+	# Other ASCII control characters can't be represented
+	if codePoint < 0x80:
+		return ''
+
+	# \u takes a signed 16-bit parameter, so characters outside the Basic
+	# Multilingual Plane are written as UTF-16 surrogate pairs.
+	if codePoint > 0xffff:
+		codePoint -= 0x10000
+		units = [0xd800 + (codePoint >> 10), 0xdc00 + (codePoint & 0x3ff)]
+	else:
+		units = [codePoint]
+
+	return ''.join('\\u' + str(unit - 0x10000 if unit > 0x7fff else unit) + ' ' for unit in units)
+
+###############################################################################
+
+# Escapes text for inclusion in RTF.
+def escapeText(text):
+
+	return SPECIAL_CHARACTERS.sub(_escapeCharacter, text)
+
+###############################################################################
+###############################################################################
+
+class RTFExporter(Exporter):
+
+	# styles is a list of paragraph style names to include in the stylesheet.
+	# When writing a tree, styles are collected from the tree's paragraphs
+	# automatically. When writing events, styles have to be known up front,
+	# and paragraphs whose styles aren't in the stylesheet keep their
+	# alignment but lose their style name.
+	def __init__(self, out = None, styles = None):
+
+		super().__init__(out)
+
+		self.__styles = {DEFAULT_STYLE: 0}
+		for style in styles or []:
+			self.__addStyle(style)
+
+		# Formatting that's in effect in the RTF we've written so far, and
+		# formatting that should be in effect before the next piece of
+		# content. Control words are only written when content requires them,
+		# so formatting that's turned off and immediately back on (at the end
+		# of a paragraph, for example) costs nothing.
+		self.__writtenFormats = []
+		self.__formats = []
+
+		# Paragraph formatting of the last \pard we wrote
+		self.__writtenParagraph = None
+		self.__firstParagraph = True
+
+		# Formatting in effect outside the current paragraph's group (see
+		# _openParagraph()) and outside the current field result, which both
+		# restore it when they end.
+		self.__savedFormats = []
+		self.__linkSavedFormats = []
+
+		# True if the current paragraph is inside its own group
+		self.__paragraphGroup = False
+
+	###########################################################################
+
+	# Adds a paragraph style to the stylesheet if it isn't already there.
+	def __addStyle(self, style):
+
+		if style not in self.__styles:
+			self.__styles[style] = len(self.__styles)
+
+	###########################################################################
+
+	# Writes control words to bring the RTF's formatting up to date.
+	def __syncFormats(self):
+
+		if self.__formats == self.__writtenFormats:
+			return
+
+		words = []
+
+		for attribute in FORMAT_TYPES:
+			if attribute in self.__writtenFormats and attribute not in self.__formats:
+				words.append(FORMAT_WORDS[attribute] + '0')
+			elif attribute in self.__formats and attribute not in self.__writtenFormats:
+				words.append(FORMAT_WORDS[attribute])
+
+		self._writer.write(''.join(words) + ' ')
+		self.__writtenFormats = self.__formats
+
+	###########################################################################
+
+	def _startDocument(self):
+
+		self._writer.write('{\\rtf1\\ansi\\deff0\\uc0{\\fonttbl{\\f0 Times New Roman;}}\n{\\stylesheet')
+
+		for style, index in self.__styles.items():
+			self._writer.write('{\\s' + str(index) + ' ' + escapeText(style.replace(';', '')) + ';}')
+
+		self._writer.write('}\n')
+
+	###########################################################################
+
+	def _endDocument(self):
+
+		if self.__paragraphGroup:
+			self._writer.write('}')
+
+		self._writer.write('}\n')
+
+	###########################################################################
+
+	# Paragraphs are separated rather than terminated by \par, so that a
+	# document we write parses back into the same number of paragraphs.
+	def _openParagraph(self, attributes):
+
+		if not self.__firstParagraph:
+
+			self._writer.write('\\par\n')
+
+			# Closing the group restores the formatting in effect before it
+			if self.__paragraphGroup:
+				self._writer.write('}')
+				self.__writtenFormats = self.__savedFormats
+				self.__writtenParagraph = None
+				self.__paragraphGroup = False
+
+		self.__firstParagraph = False
+
+		style = attributes.get('style', DEFAULT_STYLE)
+		alignment = attributes.get('alignment', 'left')
+		pagebreakBefore = bool(attributes.get('pagebreakBefore'))
+
+		# A page break before the paragraph is written inside a group that
+		# ends with the paragraph, so that it doesn't carry over to the
+		# paragraphs that follow.
+		if pagebreakBefore:
+			self._writer.write('{')
+			self.__savedFormats = self.__writtenFormats
+			self.__paragraphGroup = True
+
+		paragraph = (style, alignment, pagebreakBefore)
+
+		if paragraph != self.__writtenParagraph:
+
+			words = ['\\pard']
+
+			if style in self.__styles:
+				words.append('\\s' + str(self.__styles[style]))
+
+			words.append(ALIGNMENT_WORDS.get(alignment, '\\ql'))
+
+			if pagebreakBefore:
+				words.append('\\pagebb')
+
+			self._writer.write(''.join(words) + ' ')
+			self.__writtenParagraph = paragraph
+
+	###########################################################################
+
+	def _setFormats(self, formats):
+
+		self.__formats = formats
+
+	###########################################################################
+
+	def _text(self, text):
+
+		self.__syncFormats()
+		self._writer.write(escapeText(text))
+
+	###########################################################################
+
+	# The field result is parsed on its own by pyrtfdom, but inherits the
+	# surrounding formatting in other readers, so we reset formatting inside
+	# it to keep the two consistent.
+	def _openLink(self, href):
+
+		self._writer.write(
+			'{\\field{\\*\\fldinst HYPERLINK "' +
+			escapeText(href.replace('"', '%22')) +
+			'"}{\\fldrslt '
+		)
+
+		self.__linkSavedFormats = self.__writtenFormats
+
+		if self.__writtenFormats:
+			self._writer.write('\\plain ')
+			self.__writtenFormats = []
+
+	###########################################################################
+
+	def _closeLink(self):
+
+		self._writer.write('}}')
+		self.__writtenFormats = self.__linkSavedFormats
+
+	###########################################################################
+
+	def _pageBreak(self):
+
+		self._writer.write('\\page ')
+
+	###########################################################################
+
+	def _image(self, attributes, data):
+
+		words = ['{\\pict']
+
+		if attributes.get('source') in IMAGE_SOURCE_WORDS:
+			word, parameter = IMAGE_SOURCE_WORDS[attributes['source']]
+			if parameter and attributes.get(parameter) is not None:
+				word += str(attributes[parameter])
+			words.append(word)
+
+		# The rest of the image's attributes are named after the control
+		# words they came from.
+		for attribute, value in attributes.items():
+			if attribute.startswith('\\'):
+				words.append(attribute + str(value))
+
+		self._writer.write(''.join(words) + '\n')
+
+		for offset in range(0, len(data), IMAGE_BYTES_PER_LINE):
+			self._writer.write(binascii.hexlify(data[offset:offset + IMAGE_BYTES_PER_LINE]).decode('ascii') + '\n')
+
+		self._writer.write('}')
+
+	###########################################################################
+
+	# Collects the paragraph styles used in the tree before writing it, so
+	# they can all go in the stylesheet.
+	def writeTree(self, node):
+
+		paragraphs = [node] if 'para' == node.nodeType else node.children or []
+
+		for para in paragraphs:
+			if 'para' == para.nodeType and 'style' in para.attributes:
+				self.__addStyle(para.attributes['style'])
+
+		return super().writeTree(node)
+
+###############################################################################
+
+# Rewrites an RTF document in the compact form RTFExporter produces. source is
+# a filename or file object (see iterparse()) and out is where the RTF should
+# be written. If out is None, the RTF is returned as a string instead. Any
+# other keyword arguments are passed on to RTFExporter.
+def toRTF(source, out = None, **options):
+
+	return RTFExporter(out, **options).writeEvents(iterparse(source))
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+# Converts RTF to plain text. Formatting is dropped, centered and
+# right-aligned paragraphs are padded to a fixed line width, page breaks
+# become form feeds and hyperlinks are followed by their targets in angle
+# brackets.
+
+from ..events import iterparse
+from .base import Exporter
+
+# Default line width used to align paragraphs
+DEFAULT_WIDTH = 80
+
+class TextExporter(Exporter):
+
+	# width is the line width centered and right-aligned paragraphs are
+	# padded to (None disables alignment.) Each paragraph is followed by
+	# paragraphSeparator.
+	def __init__(self, out = None, width = DEFAULT_WIDTH, paragraphSeparator = '\n'):
+
+		super().__init__(out)
+
+		self.__width = width
+		self.__paragraphSeparator = paragraphSeparator
+
+		# Text in the current paragraph. A paragraph has to be complete
+		# before it can be aligned, so it's collected here first (memory is
+		# still bounded by the size of a single paragraph.)
+		self.__paragraph = []
+		self.__alignment = 'left'
+
+		# Where in self.__paragraph the current hyperlink's text begins
+		self.__linkStart = None
+		self.__href = None
+
+	###########################################################################
+
+	# Pads a single line according to the current paragraph's alignment.
+	def __align(self, line):
+
+		if self.__width is None or not line:
+			return line
+
+		# A page break starts a new line with a form feed, which shouldn't
+		# count toward the line's width.
+		formFeeds = len(line) - len(line.lstrip('\f'))
+		prefix, line = line[:formFeeds], line[formFeeds:]
+
+		if 'center' == self.__alignment:
+			line = line.center(self.__width).rstrip()
+		elif 'right' == self.__alignment:
+			line = line.rjust(self.__width)
+
+		return prefix + line
+
+	###########################################################################
+
+	def _openParagraph(self, attributes):
+
+		self.__paragraph = []
+		self.__alignment = attributes.get('alignment', 'left')
+
+	###########################################################################
+
+	def _closeParagraph(self):
+
+		text = ''.join(self.__paragraph)
+		self.__paragraph = []
+
+		if 'left' != self.__alignment:
+			text = '\n'.join(self.__align(line) for line in text.split('\n'))
+
+		self._writer.write(text + self.__paragraphSeparator)
+
+	###########################################################################
+
+	def _text(self, text):
+
+		self.__paragraph.append(text)
+
+	###########################################################################
+
+	def _openLink(self, href):
+
+		self.__linkStart = len(self.__paragraph)
+		self.__href = href
+
+	###########################################################################
+
+	# If the link's text isn't just its target, the target is appended so
+	# that it isn't lost.
+	def _closeLink(self):
+
+		if self.__href and ''.join(self.__paragraph[self.__linkStart:]) != self.__href:
+			self.__paragraph.append(' <' + self.__href + '>')
+
+		self.__linkStart = None
+		self.__href = None
+
+	###########################################################################
+
+	def _pageBreak(self):
+
+		self.__paragraph.append('\n\f')
+
+###############################################################################
+
+# Converts an RTF document to plain text. source is a filename or file object
+# (see iterparse()) and out is where the text should be written. If out is
+# None, the text is returned as a string instead. Any other keyword arguments
+# are passed on to TextExporter.
+def toText(source, out = None, **options):
+
+	return TextExporter(out, **options).writeEvents(iterparse(source))
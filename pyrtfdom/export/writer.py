@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+# Exporters produce their output as lots of small strings. Writing each one to
+# a file object individually is slow, and concatenating them into one big
+# string doubles peak memory, so output goes through a Writer, which collects
+# strings and hands them to the underlying file object in large chunks.
+
+# Default number of characters to collect before flushing
+DEFAULT_BUFFER_SIZE = 65536
+
+class Writer(object):
+
+	# out is any object with a write() method that accepts strings. If out is
+	# None, everything written is kept in memory and can be retrieved with
+	# getvalue().
+	def __init__(self, out = None, bufferSize = DEFAULT_BUFFER_SIZE):
+
+		self.__out = out
+		self.__bufferSize = bufferSize
+
+		self.__buffer = []
+		self.__bufferLength = 0
+
+	###########################################################################
+
+	# Writes a string.
+	def write(self, string):
+
+		self.__buffer.append(string)
+		self.__bufferLength += len(string)
+
+		if self.__out is not None and self.__bufferLength >= self.__bufferSize:
+			self.flush()
+
+	###########################################################################
+
+	# Hands everything written so far to the underlying file object.
+	def flush(self):
+
+		if self.__out is not None and self.__buffer:
+			self.__out.write(''.join(self.__buffer))
+			self.__buffer = []
+			self.__bufferLength = 0
+
+	###########################################################################
+
+	# Returns everything written so far if we're writing to memory, or None
+	# if we're writing to a file object.
+	def getvalue(self):
+
+		if self.__out is not None:
+			return None
+
+		if len(self.__buffer) > 1:
+			self.__buffer = [''.join(self.__buffer)]
+
+		return self.__buffer[0] if self.__buffer else ''
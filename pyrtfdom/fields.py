@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+# Parsing of field instructions (the text of a field's \fldinst group.) An
+# instruction starts with the field's type, followed by its arguments and
+# switches, for example:
+#
+#   HYPERLINK "http://example.com/" \o "Tooltip" \l "section"
+#
+# Arguments are either quoted or delimited by spaces. Switches start with a
+# backslash, and a quoted string that directly follows a switch is that
+# switch's argument rather than one of the field's.
+
+import re
+
+# Matches a quoted string, a switch or a bare argument
+INSTRUCTION_TOKEN = re.compile(r'"([^"]*)"?|(\\\S+)|([^\s"]+)')
+
+###############################################################################
+
+# Splits an instruction into the field's type and the rest of the
+# instruction, which is '' if there isn't any.
+def splitInstruction(instruction):
+
+	fieldParts = instruction.strip().split(None, 1)
+
+	if not fieldParts:
+		return '', ''
+
+	return fieldParts[0], fieldParts[1] if len(fieldParts) > 1 else ''
+
+###############################################################################
+
+# Parses the part of an instruction that follows the field type. Returns a
+# tuple of the form (arguments, switches), where arguments is a list of the
+# field's arguments in order and switches is a dict mapping each switch
+# (without its backslash) to its argument, or to None if it doesn't have one.
+def parseArguments(text):
+
+	arguments = []
+	switches = {}
+
+	# The switch whose argument might come next
+	switch = None
+
+	for match in INSTRUCTION_TOKEN.finditer(text):
+
+		quoted, switchName, bare = match.groups()
+
+		if switchName is not None:
+			switch = switchName[1:]
+			switches[switch] = None
+
+		elif quoted is not None and switch is not None:
+			switches[switch] = quoted
+			switch = None
+
+		else:
+			arguments.append(quoted if quoted is not None else bare)
+			switch = None
+
+	return arguments, switches
+
+###############################################################################
+
+# Returns the target of a HYPERLINK field, given the part of its instruction
+# that follows the field type, or None if it doesn't have one. The target is
+# the first argument, with the bookmark named by the \l switch (if any)
+# appended as a fragment. Other switches (such as \o, the tooltip, or \t, the
+# target frame) don't affect where the link goes and are ignored.
+def hyperlinkTarget(text):
+
+	arguments, switches = parseArguments(text)
+
+	target = arguments[0] if arguments else ''
+
+	if switches.get('l'):
+		target += '#' + switches['l']
+
+	return target or None
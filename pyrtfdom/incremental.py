@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+
+# Bookkeeping for incremental re-parsing (see RTFDOM.update().) A document is
+# divided into segments at the same split points parallel.py uses: each one
+# runs from just after a top-level \par to the end of the next, and we record
+# where it starts in the source, the header and state needed to parse it on
+# its own, how many paragraphs it produced (one, plus one for every \par
+# inside a nested group) and how many nodes of each indexed type (see
+# index.py) those paragraphs hold. After an edit, only the segments the edit
+# touched need to be parsed again, along with any that follow them whose
+# state the edit changed.
+#
+# Segments are kept in blocks, each with the total of its counts and an offset
+# by which all of its starts have shifted, so that finding where a segment's
+# paragraphs are in the document and moving every segment after an edit only
+# take time proportional to the number of blocks, rather than the number of
+# segments.
+
+import array, bisect
+
+from .parallel import SplitScanner
+
+# Number of segments kept together in a block
+BLOCK_SIZE = 256
+
+# A run of consecutive segments
+class _Block(object):
+
+	# columns is the number of counts recorded for each segment (paragraphs,
+	# then nodes of each indexed type.)
+	def __init__(self, columns):
+
+		# Where each segment starts in the source, less shift. Moving every
+		# segment in the block only changes shift.
+		self.starts = array.array('q')
+		self.shift = 0
+
+		self.headers = []
+		self.states = []
+
+		# Each segment's counts (one array per column) and their totals
+		self.counts = [array.array('q') for column in range(columns)]
+		self.totals = [0] * columns
+
+	###########################################################################
+
+	def __len__(self):
+
+		return len(self.starts)
+
+	###########################################################################
+
+	# Adds a segment to the end of the block.
+	def append(self, start, header, state, counts):
+
+		self.starts.append(start - self.shift)
+		self.headers.append(header)
+		self.states.append(state)
+
+		for column, count in enumerate(counts):
+			self.counts[column].append(count)
+			self.totals[column] += count
+
+	###########################################################################
+
+	# Yields each segment as a (start, header, state, counts) tuple.
+	def rows(self):
+
+		for offset in range(len(self.starts)):
+			yield (
+				self.starts[offset] + self.shift,
+				self.headers[offset],
+				self.states[offset],
+				tuple(counts[offset] for counts in self.counts)
+			)
+
+###############################################################################
+###############################################################################
+
+class SegmentTable(object):
+
+	# types is the number of indexed node types counted for each segment.
+	def __init__(self, types = 0):
+
+		self.__columns = 1 + types
+		self.__blocks = []
+		self.__length = 0
+
+	###########################################################################
+
+	# Builds a table for content, given the offsets at which each of the
+	# document's paragraphs was opened (in order), the number of nodes of
+	# each indexed type that came before each paragraph (nodeCounts, one row
+	# of counts per paragraph, flattened) and the number of each in the whole
+	# document (endCounts.)
+	@staticmethod
+	def build(content, paraOffsets, nodeCounts, endCounts):
+
+		table = SegmentTable(len(endCounts))
+		table.__blocks = table.__makeBlocks(list(table.__rows(SplitScanner(content).iterChunks(0), paraOffsets, nodeCounts, endCounts)))
+		table.__length = sum(len(block) for block in table.__blocks)
+
+		return table
+
+	###########################################################################
+
+	# Yields chunks as (start, header, state, counts) rows, counting the
+	# paragraphs in each from the sorted offsets at which they were opened,
+	# and the nodes in each from the number that came before each paragraph
+	# (see build().) The last chunk takes whatever paragraphs are left.
+	def __rows(self, chunks, paraOffsets, nodeCounts, endCounts):
+
+		chunks = list(chunks)
+		types = self.__columns - 1
+		paragraph = 0
+
+		# The number of nodes of each type before a paragraph
+		def before(paragraph):
+			if len(paraOffsets) == paragraph:
+				return endCounts
+			return nodeCounts[paragraph * types:(paragraph + 1) * types]
+
+		for i, chunk in enumerate(chunks):
+
+			if len(chunks) - 1 == i:
+				end = len(paraOffsets)
+			else:
+				end = bisect.bisect_left(paraOffsets, chunk.end, paragraph)
+
+			first, last = before(paragraph), before(end)
+
+			yield chunk.start, chunk.header, chunk.state, (end - paragraph,) + tuple(last[t] - first[t] for t in range(types))
+
+			paragraph = end
+
+	###########################################################################
+
+	# Returns a list of blocks holding rows (see __rows()), split as evenly as
+	# possible.
+	def __makeBlocks(self, rows):
+
+		blocks = []
+		blockCount = -(-len(rows) // BLOCK_SIZE)
+
+		for number in range(blockCount):
+
+			block = _Block(self.__columns)
+
+			for row in rows[number * len(rows) // blockCount:(number + 1) * len(rows) // blockCount]:
+				block.append(*row)
+
+			blocks.append(block)
+
+		return blocks
+
+	###########################################################################
+
+	def __len__(self):
+
+		return self.__length
+
+	###########################################################################
+
+	# Returns the number of the block a segment is in and its position in
+	# that block. The segment just past the end is in an imaginary block after
+	# the last one.
+	def __locate(self, index):
+
+		for number, block in enumerate(self.__blocks):
+			if index < len(block.starts):
+				return number, index
+			index -= len(block.starts)
+
+		return len(self.__blocks), 0
+
+	###########################################################################
+
+	# Returns a list of the sums of each column of counts for the segments
+	# before index.
+	def __prefix(self, index):
+
+		totals = [0] * self.__columns
+
+		for block in self.__blocks:
+
+			if index < len(block.starts):
+				for column in range(self.__columns):
+					totals[column] += sum(block.counts[column][:index])
+				break
+
+			index -= len(block.starts)
+			for column in range(self.__columns):
+				totals[column] += block.totals[column]
+
+		return totals
+
+	###########################################################################
+
+	# Returns the start, header and state of a segment.
+	def segment(self, index):
+
+		number, offset = self.__locate(index)
+		block = self.__blocks[number]
+
+		return block.starts[offset] + block.shift, block.headers[offset], block.states[offset]
+
+	###########################################################################
+
+	# Returns the position of the first of a segment's paragraphs among the
+	# document's paragraphs.
+	def firstParagraph(self, index):
+
+		return self.__prefix(index)[0]
+
+	###########################################################################
+
+	# Returns a list of the number of nodes of each indexed type in the
+	# segments before index.
+	def nodesBefore(self, index):
+
+		return self.__prefix(index)[1:]
+
+	###########################################################################
+
+	# Returns the number of paragraphs in a range of segments.
+	def paragraphCount(self, start, end):
+
+		return self.__prefix(end)[0] - self.__prefix(start)[0]
+
+	###########################################################################
+
+	# Returns the index of the first segment an edit at position might
+	# affect. An edit right at the start of a segment can change the \par
+	# that ends the previous one (by turning it into \pard, for example), so
+	# that segment is included too.
+	def find(self, position):
+
+		blocks = self.__blocks
+		number = 0
+		index = 0
+
+		while number + 1 < len(blocks) and blocks[number + 1].starts[0] + blocks[number + 1].shift <= position:
+			index += len(blocks[number])
+			number += 1
+
+		block = blocks[number]
+		index += max(0, bisect.bisect_right(block.starts, position - block.shift) - 1)
+
+		if index and position == self.segment(index)[0]:
+			index -= 1
+
+		return index
+
+	###########################################################################
+
+	# Returns the first segment at or after index that starts at or after
+	# position once shifted by delta (or the number of segments if there
+	# isn't one.)
+	def seek(self, index, position, delta):
+
+		number, offset = self.__locate(index)
+
+		for block in self.__blocks[number:]:
+
+			while offset < len(block):
+				if block.starts[offset] + block.shift + delta >= position:
+					return index
+				offset += 1
+				index += 1
+
+			offset = 0
+
+		return index
+
+	###########################################################################
+
+	# Returns True if a segment starts exactly at position once shifted by
+	# delta and needs the specified header and state, which means that
+	# neither it nor anything after it is affected by an edit that ends
+	# before position.
+	def matches(self, index, position, delta, header, state):
+
+		if index >= self.__length:
+			return False
+
+		start, segmentHeader, segmentState = self.segment(index)
+
+		return start + delta == position and segmentHeader == header and segmentState == state
+
+	###########################################################################
+
+	# Replaces segments start through end - 1 with new chunks (see
+	# parallel.SplitScanner) whose paragraphs were opened at paraOffsets (with
+	# nodeCounts and endCounts as in build()), and shifts the segments that
+	# follow by delta. Only the blocks holding the replaced segments are
+	# rebuilt. The blocks after them are shifted as a whole.
+	def replace(self, start, end, chunks, paraOffsets, nodeCounts, endCounts, delta):
+
+		first, offset = self.__locate(start)
+		last = self.__locate(end - 1)[0] if end > start else first
+
+		# A block that would be left small is merged with the next one, so
+		# that edits don't leave behind lots of tiny blocks.
+		rows = [row for block in self.__blocks[first:last + 1] for row in block.rows()]
+		removed = end - start
+
+		while len(rows) - removed < BLOCK_SIZE // 2 and last + 1 < len(self.__blocks):
+			last += 1
+			rows.extend(self.__blocks[last].rows())
+
+		following = [
+			(rowStart + delta, header, state, counts)
+			for rowStart, header, state, counts in rows[offset + removed:]
+		]
+
+		rows = rows[:offset] + list(self.__rows(chunks, paraOffsets, nodeCounts, endCounts)) + following
+
+		for block in self.__blocks[last + 1:]:
+			block.shift += delta
+
+		self.__blocks[first:last + 1] = self.__makeBlocks(rows)
+		self.__length = sum(len(block) for block in self.__blocks)
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+
+# Keeps track of every node of certain types in a DOM tree so that finding,
+# say, all the hyperlinks in a document doesn't require walking the whole
+# tree. The DOM backends keep an index up to date from appendChild,
+# removeChild and replaceChildren whenever one is attached to a tree's root.
+#
+# Each type's nodes are kept in order in a list of blocks, so that nodes can
+# be added, removed and moved into the middle of the order (see move())
+# without copying all of them.
+
+import itertools
+
+# Node types that are indexed by default. Text and formatting nodes make up
+# the overwhelming majority of a typical tree and are rarely looked up
+# directly, so indexing them would cost a lot of memory for little benefit.
+INDEXED_TYPES = ['para', 'hyperlink', 'img', 'pagebreak', 'footnote']
+
+# Number of nodes per block. A block that grows to twice this size is split.
+BLOCK_SIZE = 512
+
+class NodeIndex(object):
+
+	# nodeTypes is the list of node types to index. Nodes are stored under a
+	# key that the backend chooses (DOMElement uses the node itself, while
+	# ColumnarTree uses the node's integer index), and resolve, if provided,
+	# turns a key back into a node.
+	def __init__(self, nodeTypes = INDEXED_TYPES, resolve = None):
+
+		# Maps each indexed node type to a dict mapping each node of that
+		# type to the block (a list) it's in, and to the list of blocks, in
+		# order.
+		self.__nodes = {nodeType: {} for nodeType in nodeTypes}
+		self.__blocks = {nodeType: [] for nodeType in nodeTypes}
+
+		# Lists of nodes returned by getElementsByType(), rebuilt only after
+		# the index changes.
+		self.__cache = {}
+
+		self.__resolve = resolve
+
+	###########################################################################
+
+	# The node types that are indexed, in a fixed order
+	@property
+	def nodeTypes(self):
+
+		return list(self.__nodes)
+
+	###########################################################################
+
+	# Returns True if nodes of the specified type are indexed.
+	def indexes(self, nodeType):
+
+		return nodeType in self.__nodes
+
+	###########################################################################
+
+	# Adds a node to the end of the index.
+	def add(self, nodeType, key):
+
+		if nodeType in self.__nodes and key not in self.__nodes[nodeType]:
+
+			blocks = self.__blocks[nodeType]
+			if not blocks or len(blocks[-1]) >= BLOCK_SIZE:
+				blocks.append([])
+
+			blocks[-1].append(key)
+			self.__nodes[nodeType][key] = blocks[-1]
+			self.__cache.pop(nodeType, None)
+
+	###########################################################################
+
+	# Removes a node from the index.
+	def remove(self, nodeType, key):
+
+		if nodeType in self.__nodes and key in self.__nodes[nodeType]:
+			self.__discard(nodeType, key)
+			self.__cache.pop(nodeType, None)
+
+	###########################################################################
+
+	# Removes a node that's in the index from its block, along with the block
+	# if that leaves it empty.
+	def __discard(self, nodeType, key):
+
+		block = self.__nodes[nodeType].pop(key)
+		block.remove(key)
+
+		if not block:
+			blocks = self.__blocks[nodeType]
+			del blocks[next(number for number, other in enumerate(blocks) if other is block)]
+
+	###########################################################################
+
+	# Returns the number of indexed nodes of the specified type.
+	def count(self, nodeType):
+
+		return len(self.__nodes[nodeType])
+
+	###########################################################################
+
+	# Returns a list of all indexed nodes of the specified type in the order
+	# they were added to the tree. The list is cached, so repeated lookups
+	# (such as fetching paragraphs by ordinal) are O(1) until the tree
+	# changes.
+	def getElementsByType(self, nodeType):
+
+		if nodeType not in self.__cache:
+
+			keys = itertools.chain.from_iterable(self.__blocks[nodeType])
+
+			if self.__resolve:
+				self.__cache[nodeType] = [self.__resolve(key) for key in keys]
+			else:
+				self.__cache[nodeType] = list(keys)
+
+		return self.__cache[nodeType]
+
+	###########################################################################
+
+	# Moves indexed nodes of the specified type so that they're in the order
+	# given by keys, starting at position among the nodes of that type. This
+	# puts nodes inserted somewhere other than the end of the tree in
+	# document order without having to look at the rest of the tree.
+	def move(self, nodeType, keys, position):
+
+		nodes = self.__nodes[nodeType]
+		blocks = self.__blocks[nodeType]
+
+		for key in keys:
+			self.__discard(nodeType, key)
+
+		# Find the block the position is in
+		number = 0
+		while number < len(blocks) and position > len(blocks[number]):
+			position -= len(blocks[number])
+			number += 1
+
+		if number == len(blocks):
+			blocks.append([])
+			position = 0
+
+		block = blocks[number]
+		block[position:position] = keys
+
+		if len(block) > 2 * BLOCK_SIZE:
+
+			pieces = [block[start:start + BLOCK_SIZE] for start in range(0, len(block), BLOCK_SIZE)]
+			blocks[number:number + 1] = pieces
+
+			for piece in pieces:
+				for key in piece:
+					nodes[key] = piece
+
+		else:
+			for key in keys:
+				nodes[key] = block
+
+		self.__cache.pop(nodeType, None)
+
+	###########################################################################
+
+	# Empties the index.
+	def clear(self):
+
+		for nodeType in self.__nodes:
+			self.__nodes[nodeType] = {}
+			self.__blocks[nodeType] = []
+
+		self.__cache = {}
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+
+# Estimates how much memory a parsed document takes up, broken down by where
+# it goes: the nodes themselves (by type), their text, image data and
+# attribute dicts, and the RTF source the parser holds on to. Figures come
+# from sys.getsizeof(), so they're estimates of what the tree itself costs
+# rather than exact accounting (objects shared between nodes, such as
+# interned strings, are counted once per reference.) See
+# RTFDOM.memoryReport().
+#
+# Peak memory while parsing can also be measured with tracemalloc (see
+# tracePeak() and RTFDOM's trackMemory option.) This is much slower than
+# parsing normally, so it's only worth turning on when sizing things.
+
+import sys, tracemalloc
+
+from .columnar import ColumnarNode
+from .elements import DOMElement
+
+###############################################################################
+
+# Returns the number of bytes used by a dict of attributes, including its keys
+# and values.
+def _attributeBytes(attributes):
+
+	total = sys.getsizeof(attributes)
+
+	for key, value in attributes.items():
+		total += sys.getsizeof(key) + sys.getsizeof(value)
+
+	return total
+
+###############################################################################
+
+# Returns the number of bytes used by a DOMElement, not counting its value or
+# attributes. Along with the object itself, this includes its instance dict
+# and any lists it holds (its children, or the pieces of text a TextElement
+# hasn't joined yet.)
+def _elementBytes(node):
+
+	fields = vars(node)
+	total = sys.getsizeof(node) + sys.getsizeof(fields)
+
+	for value in fields.values():
+		if isinstance(value, list):
+			total += sys.getsizeof(value)
+
+	return total
+
+###############################################################################
+
+# Returns an estimate of the memory used by the tree rooted at root, as a dict
+# of the form:
+#
+# {
+#   'storage':        'object', 'columnar', 'lazy' or None (no tree),
+#   'nodes':          <number of nodes>,
+#   'byType':         {<nodeType>: {'count': <nodes>, 'bytes': <bytes>}, ...},
+#   'textCharacters': <characters of text>,
+#   'textBytes':      <bytes used by text>,
+#   'imageBytes':     <bytes of image data>,
+#   'attributeBytes': <bytes used by attribute dicts>,
+#   'totalBytes':     <sum of the byType bytes and the three above>
+# }
+#
+# Node bytes cover what it takes to store the node itself: for the object
+# backend, that's the DOMElement and its instance dict and lists, while for
+# the columnar backend it's the node's share of the tree's arrays. Trees
+# loaded lazily (see RTFDOM.load()) are decoded from a memory-mapped file as
+# they're read, so their nodes don't take up any memory of their own.
+def measureTree(root):
+
+	report = {
+		'storage':        None,
+		'nodes':          0,
+		'byType':         {},
+		'textCharacters': 0,
+		'textBytes':      0,
+		'imageBytes':     0,
+		'attributeBytes': 0,
+		'totalBytes':     0
+	}
+
+	if root is None:
+		return report
+
+	rowBytes = 0
+	report['storage'] = 'lazy'
+
+	if isinstance(root, DOMElement):
+		report['storage'] = 'object'
+
+	elif isinstance(root, ColumnarNode):
+
+		tree = root.tree
+		report['storage'] = 'columnar'
+
+		# Every node has one row in each of the tree's arrays, and all text
+		# lives in a single shared buffer. Attributes are stored sparsely,
+		# only for nodes that have some.
+		rowBytes = tree.columnBytes() / len(tree) if len(tree) else 0
+		report['textBytes'] = sys.getsizeof(tree.text)
+		report['attributeBytes'] = sys.getsizeof(tree._attributes) + sum(
+			_attributeBytes(attributes) for attributes in tree._attributes.values()
+		)
+
+	stack = [root]
+
+	while stack:
+
+		node = stack.pop()
+		value = node.value
+
+		if node.nodeType not in report['byType']:
+			report['byType'][node.nodeType] = {'count': 0, 'bytes': 0}
+
+		counts = report['byType'][node.nodeType]
+		counts['count'] += 1
+		report['nodes'] += 1
+
+		if isinstance(value, bytes):
+			report['imageBytes'] += len(value)
+
+		elif value:
+			report['textCharacters'] += len(value)
+
+		if 'object' == report['storage']:
+
+			counts['bytes'] += _elementBytes(node)
+			report['attributeBytes'] += _attributeBytes(node.attributes)
+
+			# The empty string every node starts with is shared
+			if value and not isinstance(value, bytes):
+				report['textBytes'] += sys.getsizeof(value)
+
+		else:
+			counts['bytes'] += rowBytes
+
+		children = node.children
+		if children:
+			stack.extend(children)
+
+	for counts in report['byType'].values():
+		counts['bytes'] = int(counts['bytes'])
+
+	report['totalBytes'] = (
+		sum(counts['bytes'] for counts in report['byType'].values()) +
+		report['textBytes'] +
+		report['imageBytes'] +
+		report['attributeBytes']
+	)
+
+	return report
+
+###############################################################################
+
+# Calls function with no arguments while tracing memory allocations, and
+# returns (result, peak), where peak is the largest number of bytes that were
+# allocated at any one time during the call, over and above what was
+# allocated beforehand. tracemalloc only keeps one peak, and measuring ours
+# would mean resetting the peak of whoever is already tracing (because they're
+# measuring something larger), so that raises ValueError instead.
+def tracePeak(function):
+
+	if tracemalloc.is_tracing():
+		raise ValueError("tracemalloc is already tracing, so peak memory can't be measured without disturbing it.")
+
+	tracemalloc.start()
+
+	try:
+		baseline = tracemalloc.get_traced_memory()[0]
+
+		result = function()
+		return result, max(0, tracemalloc.get_traced_memory()[1] - baseline)
+
+	finally:
+		tracemalloc.stop()
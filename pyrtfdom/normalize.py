@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+# Reduces a DOM tree to its canonical minimal form. The DOM builder creates a
+# new text node every time it has to open or close something, so a typical
+# tree is littered with empty text nodes, runs of sibling text nodes that
+# could just as well be one, back-to-back formatting elements of the same type
+# and formatting elements nested inside another of the same type. This
+# collapses all of them in a single linear pass without changing how the
+# document would be rendered. Works with either DOM backend.
+
+from pyrtfdom.elements import FORMAT_TYPES
+
+###############################################################################
+
+# Widens target's source span (if it has one) to cover node's, for when node
+# is merged into target.
+def _mergeSpan(target, node):
+
+	targetSpan = target.sourceSpan
+	span = node.sourceSpan
+
+	if targetSpan is not None and span is not None:
+		target.sourceSpan = (min(targetSpan[0], span[0]), max(targetSpan[1], span[1]))
+
+###############################################################################
+
+# Appends node to a list of already normalized siblings, merging it into the
+# previous sibling where possible. children and text hold the pending
+# children lists and text pieces of nodes we've already visited so that
+# merging never has to copy anything more than once.
+def _appendNormalized(siblings, node, children, text):
+
+	nodeType = node.nodeType
+
+	if 'text' == nodeType:
+
+		if node in text:
+			pieces = text.pop(node)
+		elif node.value:
+			pieces = [node.value]
+		else:
+			return
+
+		if siblings and 'text' == siblings[-1].nodeType:
+			if siblings[-1] not in text:
+				text[siblings[-1]] = [siblings[-1].value]
+			text[siblings[-1]].extend(pieces)
+			_mergeSpan(siblings[-1], node)
+			return
+
+		text[node] = pieces
+		siblings.append(node)
+
+	# Adjacent formatting elements of the same type become one element, which
+	# means that the boundary between their children might now be mergeable too.
+	elif nodeType in FORMAT_TYPES and siblings and nodeType == siblings[-1].nodeType:
+
+		target = siblings[-1]
+		if target not in children:
+			children[target] = list(target.children)
+
+		_mergeSpan(target, node)
+
+		merged = children.pop(node, None)
+		if merged is None:
+			merged = node.children
+
+		for child in merged:
+			_appendNormalized(children[target], child, children, text)
+
+	else:
+		siblings.append(node)
+
+###############################################################################
+
+# Normalizes the subtree rooted at node in place:
+#
+# * Empty text nodes are dropped
+# * Adjacent text nodes are merged
+# * Formatting elements with no content are dropped
+# * Adjacent formatting elements of the same type are merged
+# * Formatting elements nested inside another of the same type are unwrapped
+#
+# Returns the node for convenience.
+def normalizeTree(node):
+
+	# Children lists and text values that will replace the originals once
+	# we're done. Each node's children are only ever copied once.
+	children = {}
+	text = {}
+
+	if not node.children:
+		return node
+
+	# Each frame is [node, formats open at node, iterator over the node's
+	# original children]. Doing this iteratively (rather than recursively)
+	# means deeply nested documents can't exhaust the stack.
+	children[node] = []
+	openFormats = frozenset([node.nodeType]) & frozenset(FORMAT_TYPES)
+	stack = [[node, openFormats, iter(list(node.children))]]
+
+	while stack:
+
+		frame = stack[-1]
+		child = next(frame[2], None)
+
+		# Visit the next child. Leaves go straight into the parent's list of
+		# normalized children, but containers are descended into first.
+		if child is not None:
+
+			if child.children:
+				children[child] = []
+				childFormats = frame[1]
+				if child.nodeType in FORMAT_TYPES:
+					childFormats = childFormats | frozenset([child.nodeType])
+				stack.append([child, childFormats, iter(list(child.children))])
+
+			elif child.nodeType not in FORMAT_TYPES:
+				_appendNormalized(children[frame[0]], child, children, text)
+
+			continue
+
+		# We're finished with this node, so hand it (or its contents) to its
+		# parent.
+		stack.pop()
+		if not stack:
+			break
+
+		finished = frame[0]
+		parentFrame = stack[-1]
+		siblings = children[parentFrame[0]]
+
+		if finished.nodeType in FORMAT_TYPES:
+
+			# Formatting that's already in effect is redundant, so its
+			# children are adopted by the parent.
+			if finished.nodeType in parentFrame[1]:
+				for grandchild in children.pop(finished):
+					_appendNormalized(siblings, grandchild, children, text)
+
+			# There's nothing left to format
+			elif not children[finished]:
+				del children[finished]
+
+			else:
+				_appendNormalized(siblings, finished, children, text)
+
+		else:
+			_appendNormalized(siblings, finished, children, text)
+
+	for textNode, pieces in text.items():
+		if len(pieces) > 1:
+			textNode.value = ''.join(pieces)
+
+	# Deepest nodes go first so that nodes which moved up the tree have
+	# already been adopted by the time their old parent lets go of them.
+	for parent in reversed(list(children)):
+		parent.replaceChildren(children[parent])
+
+	return node
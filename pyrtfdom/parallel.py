@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+
+# Parses a single large document across several processes. A fast scanner
+# first finds safe places to split the document: \par control words at the
+# top level of the document body, outside of any nested group. Every state
+# change that can be in effect at such a point was made at the top level
+# too, so the scanner also records the control words needed to recreate that
+# state. Each chunk is then parsed on its own in a worker process as:
+#
+#   {\rtf1 <color table and stylesheet> <state> \par <chunk> }
+#
+# The paragraph opened before \par (which only exists to receive the
+# recreated state) and the empty paragraph opened by the chunk's final \par
+# are dropped, and what's left is exactly what a sequential parse would have
+# produced for those paragraphs. Chunks come back as serialized trees (see
+# serialize.py) and are stitched together in order.
+
+import concurrent.futures, os, re
+
+from collections import namedtuple
+
+from . import serialize
+
+# Chunks smaller than this (in characters) aren't worth sending to another
+# process
+MIN_CHUNK_SIZE = 256 * 1024
+
+# Number of chunks each worker gets, on average. More chunks than workers
+# evens out the load when some parts of a document are slower to parse.
+CHUNKS_PER_WORKER = 4
+
+# Matches the tokens the scanner cares about: braces, control words (letters,
+# an optional numeric parameter and an optional delimiting space, just like
+# the tokenizer in parsestate/state.py) and control symbols, which have to be
+# matched so that escaped braces and backslashes aren't mistaken for the real
+# thing.
+TOKENS = re.compile(r"[{}]|\\(?:([^\W\d_]+)(-?\d*)\s?|'[0-9a-fA-F]{0,2}|.)", re.DOTALL)
+
+# Top-level control words that change the parser's state and therefore have
+# to be replayed at the start of a chunk, mapped to the part of the state
+# they set. A word replaces the last word that set the same thing. Styles can
+# set any number of other attributes, so a style only replaces an earlier use
+# of the same style (see STYLE_WORDS.)
+STATE_WORDS = {
+	'ql':     'alignment',
+	'qr':     'alignment',
+	'qc':     'alignment',
+	'qd':     'alignment',
+	'qj':     'alignment',
+	'qt':     'alignment',
+	'pagebb': 'pagebreakBefore',
+	'i':      'italic',
+	'b':      'bold',
+	'ul':     'underline',
+	'strike': 'strikethrough',
+	'cf':     'fColor',
+	'cb':     'bColor'
+}
+
+# Control words that apply a style from the stylesheet
+STYLE_WORDS = ['s', 'ds', 'ts', 'cs']
+
+# Groups that define tables the rest of the document refers to, which every
+# chunk needs to see before its content
+HEADER_GROUPS = ['colortbl', 'stylesheet']
+
+# A piece of the document to be parsed by a worker. start and end are offsets
+# into the document, header is the color table and stylesheet groups seen
+# before start and state is the control words that recreate the state in
+# effect at start.
+Chunk = namedtuple('Chunk', ['start', 'end', 'header', 'state'])
+
+# Each worker process's DOM
+_workerDOM = None
+
+###############################################################################
+
+# Returns a good chunk size for splitting a document of the specified length
+# between the specified number of workers.
+def chunkSizeFor(length, workers):
+
+	return max(MIN_CHUNK_SIZE, length // (workers * CHUNKS_PER_WORKER))
+
+###############################################################################
+
+# Scans content and splits it into chunks of at least chunkSize characters
+# (except for the last), returning a list of Chunk tuples. A document with no
+# safe split points comes back as a single chunk.
+def splitDocument(content, chunkSize = MIN_CHUNK_SIZE):
+
+	return list(SplitScanner(content).iterChunks(chunkSize))
+
+###############################################################################
+###############################################################################
+
+# Finds split points in a document (see the comment at the top of this file.)
+# Scanning can start at any split point found earlier, as long as we're given
+# the header and state that were recorded for it.
+class SplitScanner(object):
+
+	def __init__(self, content, start = 0, header = '', state = ''):
+
+		self.__content = content
+		self.__start = start
+
+		# Split points are always inside the document's outermost group
+		self.__depth = 1 if start else 0
+
+		# Header groups seen so far
+		self.__header = [header] if header else []
+
+		# The control words that recreate the current top-level state, keyed
+		# by what they set, in the order they have to be replayed
+		self.__state = {}
+		for match in TOKENS.finditer(state):
+			self.__setState(match.group(1), match.group().rstrip())
+
+	###########################################################################
+
+	# The header groups seen so far
+	@property
+	def header(self):
+
+		return ''.join(self.__header)
+
+	###########################################################################
+
+	# The control words that recreate the top-level state at the current
+	# position
+	@property
+	def state(self):
+
+		return ''.join(self.__state.values())
+
+	###########################################################################
+
+	# Records a top-level control word that might change the state.
+	def __setState(self, word, token):
+
+		if 'plain' == word:
+			self.__state = {'plain': token}
+
+		elif word in STATE_WORDS or word in STYLE_WORDS:
+			key = STATE_WORDS.get(word, token)
+			self.__state.pop(key, None)
+			self.__state[key] = token
+
+	###########################################################################
+
+	# Scans the rest of the document, yielding each chunk of at least
+	# chunkSize characters as soon as its end is found. Whenever a chunk is
+	# yielded, header and state describe the start of the next one. The last
+	# chunk runs to the end of the document.
+	def iterChunks(self, chunkSize = MIN_CHUNK_SIZE):
+
+		content = self.__content
+		depth = self.__depth
+		start = self.__start
+		nextSplit = start + chunkSize
+
+		chunkHeader = self.header
+		chunkState = self.state
+
+		# Where the current top-level group started, and where it started if
+		# it's a header group
+		groupStart = None
+		headerStart = None
+
+		for match in TOKENS.finditer(content, start):
+
+			token = match.group()
+
+			if '{' == token:
+				depth += 1
+				if 2 == depth:
+					groupStart = match.start()
+
+			elif '}' == token:
+
+				if 2 == depth and headerStart is not None:
+					self.__header.append(content[headerStart:match.end()])
+					headerStart = None
+
+				depth -= 1
+
+				# Once the document's outermost group has been closed,
+				# anything that follows (which there shouldn't be) is parsed
+				# with no formatting state of its own to fall back on, so
+				# there aren't any more safe split points.
+				if depth < 1:
+					break
+
+			# Only control words at the top level can affect what follows them
+			elif 1 == depth and match.group(1):
+
+				if 'par' == match.group(1) and match.end() >= nextSplit:
+
+					self.__depth = depth
+					self.__start = match.end()
+
+					chunk = Chunk(start, match.end(), chunkHeader, chunkState)
+					start = match.end()
+					nextSplit = start + chunkSize
+					chunkHeader = self.header
+					chunkState = self.state
+
+					yield chunk
+
+				else:
+					self.__setState(match.group(1), token.rstrip())
+
+			# A header group is recognized by the control word that opens it
+			elif 2 == depth and match.start() == groupStart + 1 and match.group(1) in HEADER_GROUPS:
+				headerStart = groupStart
+
+		self.__start = len(content)
+		yield Chunk(start, len(content), chunkHeader, chunkState)
+
+###############################################################################
+
+# Returns the RTF a worker should parse for chunk, along with whether the
+# first and last paragraphs of the result should be dropped.
+def chunkSource(content, chunk, first, last):
+
+	if first:
+		source = content[chunk.start:chunk.end]
+	else:
+		source = '{\\rtf1' + chunk.header + chunk.state + '\\par ' + content[chunk.start:chunk.end]
+
+	if not last:
+		source += '}'
+
+	return source, not first, not last
+
+###############################################################################
+
+# Sets up a worker process.
+def _initWorker(domClass, domOptions):
+
+	global _workerDOM
+
+	_workerDOM = domClass(**domOptions)
+
+###############################################################################
+
+# Parses a chunk in a worker process and returns its paragraphs as a
+# serialized tree.
+def _parseChunk(source, dropFirst, dropLast):
+
+	try:
+		_workerDOM.openString(source)
+		_workerDOM.parse()
+
+		root = _workerDOM.rootNode
+		paragraphs = root.children
+
+		if dropLast and paragraphs:
+			root.removeChild(paragraphs[-1])
+		if dropFirst and root.children:
+			root.removeChild(root.children[0])
+
+		return serialize.dumps(root)
+
+	finally:
+		_workerDOM.reset()
+
+###############################################################################
+
+# Parses chunks (see splitDocument()) of content in a pool of worker
+# processes, each of which has its own instance of domClass created with
+# domOptions, and yields the serialized paragraphs of each chunk in document
+# order. workers defaults to the number of CPUs.
+def parseChunks(content, chunks, domClass, domOptions = None, workers = None):
+
+	if workers is None:
+		workers = os.cpu_count() or 1
+
+	executor = concurrent.futures.ProcessPoolExecutor(
+		max_workers = workers,
+		initializer = _initWorker,
+		initargs = (domClass, domOptions or {})
+	)
+
+	try:
+		futures = [
+			executor.submit(_parseChunk, *chunkSource(content, chunk, 0 == i, len(chunks) - 1 == i))
+			for i, chunk in enumerate(chunks)
+		]
+
+		for future in futures:
+			yield future.result()
+
+	finally:
+		executor.shutdown(wait = True, cancel_futures = True)
@@ -13,11 +13,18 @@ from .tokentype import TokenType
 
 class RTFParser(object):
 
+	# The ParseProfiler (see profile.py) collecting statistics about this
+	# parser and the ParseTracer (see trace.py) recording its events, if any
+	_profiler = None
+	_tracer = None
+
 	# Formatting attributes and their default values. Values with booleans
 	# should be set to either True (for on) or False (for off.) If an attribute
 	# doesn't exist in the current state, it means we must retrieve its value
-	# from the first state up the stack where it's defined.
-	__formattingAttributes = {
+	# from the first state up the stack where it's defined. A document can
+	# change its own defaults (see _updateDefaultAttributes()), so each parser
+	# works on a copy that reset() restores.
+	__defaultFormattingAttributes = {
 
 		# TODO
 		'document': {},
@@ -58,6 +65,15 @@ class RTFParser(object):
 
 	###########################################################################
 
+	# Read-only access to the content of the RTF that's been opened, or False
+	# if nothing has been opened yet.
+	@property
+	def content(self):
+
+		return self._content
+
+	###########################################################################
+
 	# Read-only public access to the full state's public attributes. Deep copy
 	# is slow, so if you need to hit this a lot, be a little bad and access
 	# self._fullStateCache directly. Just promise not to change anything O:-)
@@ -74,6 +90,64 @@ class RTFParser(object):
 
 	###########################################################################
 
+	# The ParseProfiler (see profile.py) that's collecting statistics about
+	# parsing, or None if profiling is off (the default.) Rather than checking
+	# whether it's there as we go, we let the profiler wrap our callbacks
+	# when it's attached, so that parsing without one costs nothing extra.
+	@property
+	def profiler(self):
+
+		return self._profiler
+
+	@profiler.setter
+	def profiler(self, profiler):
+
+		self._profiler = profiler
+		self.__instrumentCallbacks()
+
+	###########################################################################
+
+	# The ParseTracer (see trace.py) that's recording parser events, or None
+	# if tracing is off (the default.) Like the profiler, it wraps our
+	# callbacks when it's attached, and the two can be used together.
+	@property
+	def tracer(self):
+
+		return self._tracer
+
+	@tracer.setter
+	def tracer(self, tracer):
+
+		self._tracer = tracer
+		self.__instrumentCallbacks()
+
+	###########################################################################
+
+	# Read-only "protected" access to the depth of the group we're currently
+	# in (the number of states on the state stack.)
+	@property
+	def _depth(self):
+
+		return len(self.__stateStack)
+
+	###########################################################################
+
+	# Sets up the callbacks we actually call: the ones we were given, wrapped
+	# by the profiler and tracer if they're attached.
+	def __instrumentCallbacks(self):
+
+		callbacks = self.__options['callbacks']
+
+		if self._profiler is not None:
+			callbacks = self._profiler._wrapCallbacks(callbacks)
+
+		if self._tracer is not None:
+			callbacks = self._tracer._wrapCallbacks(callbacks)
+
+		self.__callbacks = callbacks
+
+	###########################################################################
+
 	# Creates a new state.
 	def __createState(self):
 
@@ -88,7 +162,8 @@ class RTFParser(object):
 
 	###########################################################################
 
-	# Content
+	# Content. Along with the required callbacks, options can include a
+	# 'profiler' and a 'tracer' (see the profiler and tracer properties.)
 	def __init__(self, options):
 
 		self.reset()
@@ -96,7 +171,12 @@ class RTFParser(object):
 		# This class only parses the RTF. How that data is encoded and
 		# represented after parsing is up to the client, and the client should
 		# provide at least a minimum number of callbacks to process that data as
-		# it's extracted from the RTF.
+		# it's extracted from the RTF. Note that onField(parser, fldinst,
+		# fldrslt) receives the field's result as raw RTF: control words and
+		# groups inside \fldrslt are passed through untouched rather than
+		# executed, so it's up to the callback to parse them (see
+		# RTFDOM.parseSubRTF().) onStateChange can be None for clients that
+		# don't need it, which saves copying the state on every change.
 		if not options or 'callbacks' not in options:
 			raise Exception('Did not pass required callbacks.')
 		elif (
@@ -108,30 +188,49 @@ class RTFParser(object):
 			raise Exception('Did not pass required callbacks.')
 
 		self.__options = options
+		self._profiler = options.get('profiler')
+		self._tracer = options.get('tracer')
+		self.__instrumentCallbacks()
 
 	###########################################################################
 
-	# Crawls up the state stack to fill in any attributes in the current state
-	# that are inherited from a previous state, then caches the result in
-	# self._fullStateCache.
+	# Fills in any attributes in the current state that are inherited from a
+	# previous state, then caches the result in self._fullStateCache. The full
+	# state of the enclosing group was cached when we entered the current one
+	# (see _pushStateStack()), so that's all we have to look at, no matter how
+	# deeply nested the current group is.
 	def __cacheFullState(self):
 
 		state = self._curState.copy()
 
-		if len(self.__stateStack):
-			for i in reversed(range(len(self.__stateStack))):
-				for namespace in self.__stateStack[i].keys():
-					if (namespace not in state):
-						state[namespace] = {}
-					for attribute in self.__stateStack[i][namespace].keys():
-						if attribute not in state[namespace]:
-							state[namespace][attribute] = self.__stateStack[i][namespace][attribute]
+		if self.__fullStateStack:
+			inherited = self.__fullStateStack[-1]
+			for namespace in inherited.keys():
+				if (namespace not in state):
+					state[namespace] = {}
+				for attribute in inherited[namespace].keys():
+					if attribute not in state[namespace]:
+						state[namespace][attribute] = inherited[namespace][attribute]
 
 		self._fullStateCache = state
 		return state
 
 	###########################################################################
 
+	# Returns True if the current state's value for an attribute was inherited
+	# from an enclosing group rather than set in the current one. States that
+	# build up a value in place (rather than replacing it) need to know this,
+	# so that they don't modify the enclosing group's value by mistake.
+	def _isInherited(self, namespace, attribute):
+
+		if not self.__fullStateStack or namespace not in self.__fullStateStack[-1]:
+			return False
+
+		inherited = self.__fullStateStack[-1][namespace]
+		return attribute in inherited and inherited[attribute] is self._curState[namespace].get(attribute)
+
+	###########################################################################
+
 	# Updates the default formatting attributes. Useful when, for example, we're
 	# parsing \s0 (default paragraph style) in an RTF stylesheet. See comment
 	# inside function for explanation of uglyStateFix parameter.
@@ -156,8 +255,8 @@ class RTFParser(object):
 	# doesn't.
 	def _getCallback(self, callbackName):
 
-		if callbackName in self.__options['callbacks']:
-			return self.__options['callbacks'][callbackName]
+		if callbackName in self.__callbacks:
+			return self.__callbacks[callbackName]
 		else:
 			return None
 
@@ -168,6 +267,7 @@ class RTFParser(object):
 	def _pushStateStack(self):
 
 		self.__stateStack.append(self._curState)
+		self.__fullStateStack.append(self._fullStateCache)
 		self._curState = self.__createState()
 
 	###########################################################################
@@ -176,6 +276,7 @@ class RTFParser(object):
 	def _popStateStack(self):
 
 		self._curState = self.__stateStack.pop()
+		self.__fullStateStack.pop()
 		self.__cacheFullState() # Update the full state cache
 		return self._curState
 
@@ -220,8 +321,13 @@ class RTFParser(object):
 	# Reset the current state's formatting attributes to their default values.
 	def _resetStateFormattingAttributes(self, doCallback = True):
 
-		formerStateAttributes = self._fullState
-		formerStateAttributes.pop('private', None) # Only return publicly accessible attributes
+		# Copying the full state is expensive, so we only do it if there's
+		# somebody to hand the copies to.
+		callback = self._getCallback('onStateChange') if doCallback else None
+
+		if callback:
+			formerStateAttributes = self._fullState
+			formerStateAttributes.pop('private', None) # Only return publicly accessible attributes
 
 		for attributeType in self.__formattingAttributes.keys():
 			for attribute in self.__formattingAttributes[attributeType].keys():
@@ -231,13 +337,10 @@ class RTFParser(object):
 		self.__cacheFullState()
 
 		# Pass in both the previous and current state attributes
-		newStateAttributes = self._fullState
-		newStateAttributes.pop('private', None)
-
-		if doCallback:
-			callback = self._getCallback('onStateChange')
-			if callback:
-				callback(self, formerStateAttributes, newStateAttributes)
+		if callback:
+			newStateAttributes = self._fullState
+			newStateAttributes.pop('private', None)
+			callback(self, formerStateAttributes, newStateAttributes)
 
 	###########################################################################
 
@@ -247,23 +350,26 @@ class RTFParser(object):
 	# Not doing so will result in wonky behavior.
 	def _setStateValue(self, namespace, attribute, value):
 
-		oldStateAttributes = self._fullState
-		oldStateAttributes.pop('private', None)
+		# If we're not setting a private state variable, we'll call the
+		# onStateChange callback with copies of the state before and after.
+		# Copying the full state is expensive, so we don't otherwise.
+		callback = None
+		if namespace in self.__formattingAttributes:
+			callback = self._getCallback('onStateChange')
+
+		if callback:
+			oldStateAttributes = self._fullState
+			oldStateAttributes.pop('private', None)
 
 		self._curState[namespace][attribute] = value
 
 		# Update the full state cache now that the attribute has changed
 		self.__cacheFullState()
 
-		newStateAttributes = self._fullState
-		newStateAttributes.pop('private', None)
-
-		# If we're not setting a private state variable, call the onStateChange
-		# callback
-		if namespace in self.__formattingAttributes.keys():
-			callback = self._getCallback('onStateChange')
-			if callback:
-				callback(self, oldStateAttributes, newStateAttributes)
+		if callback:
+			newStateAttributes = self._fullState
+			newStateAttributes.pop('private', None)
+			callback(self, oldStateAttributes, newStateAttributes)
 
 	###########################################################################
 
@@ -318,18 +424,35 @@ class RTFParser(object):
 
 	###########################################################################
 
-	# Resets the parser to an initialized state so we can parse another document.
+	# Resets the parser to an initialized state so we can parse another
+	# document. Only per-document state is cleared, so a parser (and its
+	# callbacks) can be reused for any number of documents.
 	def reset(self):
 
 		# A string containing the content of an RTF file
 		self._content = False
 
+		# This document's default formatting attributes
+		self.__formattingAttributes = {
+			attributeType: dict(attributes)
+			for attributeType, attributes in RTFParser.__defaultFormattingAttributes.items()
+		}
+
 		# Our current index into self._content
 		self._curPos = 0
 
+		# Where the current token starts in self._content, and where the
+		# field or image group we're parsing (if any) starts
+		self._tokenStart = 0
+		self._groupStart = 0
+
 		# Formatting states at various levels of curly braces
 		self.__stateStack = []
 
+		# The full state (see below) at each level of the state stack, as it
+		# was when the next level was pushed
+		self.__fullStateStack = []
+
 		# Values that were set in the current formatting state. To see the full
 		# state, view the contents of self._fullStateCache (make sure to call 
 		# self.__cacheFullState() whenever the state changes.)
@@ -382,20 +505,70 @@ class RTFParser(object):
 	# Enter the default parser state and begin parsing the document.
 	def parse(self):
 
-		# Initialize markers representing our current place in the document
-		self._curToken = False
-		self._prevToken = False
+		if self._profiler is not None:
+			self._profiler._beginParse()
+
+		if self._tracer is not None:
+			self._tracer._beginParse()
+
+		try:
+
+			# Initialize markers representing our current place in the document
+			self._curToken = False
+			self._prevToken = False
+
+			# Start with a default state where all the formatting attributes are
+			# turned off.
+			self._initState()
+
+			# Open our initial paragraph
+			self._openParagraph()
+
+			# Begin parsing
+			mainState = MainState(self)
+			mainState.parse()
+
+			# Close whatever paragraph was open when we reached the end
+			self._closeParagraph()
+
+		finally:
+			if self._tracer is not None:
+				self._tracer._endParse()
+
+			if self._profiler is not None:
+				self._profiler._endParse()
+
+	###########################################################################
+
+	# Same as parse(), except that this is a generator which yields after each
+	# top-level token. This lets a client consume the results of its callbacks
+	# as parsing progresses and stop at any time.
+	def iterParse(self):
+
+		if self._profiler is not None:
+			self._profiler._beginParse()
+
+		if self._tracer is not None:
+			self._tracer._beginParse()
+
+		try:
+
+			self._curToken = False
+			self._prevToken = False
+			self._initState()
+			self._openParagraph()
+
+			mainState = MainState(self)
+			yield from mainState.iterParse()
 
-		# Start with a default state where all the formatting attributes are
-		# turned off.
-		self._initState()
+			self._closeParagraph()
 
-		# Open our initial paragraph
-		self._openParagraph()
+		finally:
+			if self._tracer is not None:
+				self._tracer._endParse()
 
-		# Begin parsing
-		mainState = MainState(self)
-		mainState.parse()
+			if self._profiler is not None:
+				self._profiler._endParse()
 
 	###########################################################################
 
@@ -37,7 +37,7 @@ class ColorTableState(ParseState):
 		# We shouldn't have nested braces inside the color table, but making it
 		# possible to skip over them if they're encountered will make the parser
 		# more robust in the case of a malformatted document.
-		if 'colorTable' not in self._parser._fullState['private']:
+		if 'colorTable' not in self._parser._fullStateCache['private']:
 			return False
 		else:
 			return True
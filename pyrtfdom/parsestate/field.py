@@ -3,6 +3,14 @@
 from ..tokentype import TokenType
 from .state import ParseState
 
+# Control symbols inside \fldinst that stand for a character of the
+# instruction
+INSTRUCTION_ESCAPES = {
+	'\\\\': '\\',
+	'\\{':  '{',
+	'\\}':  '}'
+}
+
 class FieldState(ParseState):
 
 	def __init__(self, parser):
@@ -10,24 +18,55 @@ class FieldState(ParseState):
 		super().__init__(parser)
 		self._parser._setStateValue('private', 'inField', True)
 
-		# Initialize the two components of a field
-		self.__fldRslt = ''
-		self.__fldInst = ''
+		# Initialize the two components of a field. Each is collected as a
+		# list of pieces and only joined once the field is complete.
+		self.__fldRslt = []
+		self.__fldInst = []
 
 	###########################################################################
 
-	# Append the contents of a \field group to the current paragraph.
+	# Append the contents of a \field group to the current paragraph. The
+	# instruction is passed to onField as plain text and the result as raw
+	# RTF (see _parseControl().)
 	def __append(self):
 
+		fldInst = ''.join(self.__fldInst)
+		fldRslt = ''.join(self.__fldRslt)
+
 		# We let the callback handle it
 		callback = self._parser._getCallback('onField')
 		if callback:
-			callback(self._parser, self.__fldInst, self.__fldRslt)
+			callback(self._parser, fldInst, fldRslt)
 
 		# There's no callback that knows how to handle it, so we'll just do things
 		# the dumb way by appending the \fldrslt value to the current paragraph.
 		else:
-			self._parser._appendToCurrentParagraph(self.__fldRslt)
+			self._parser._appendToCurrentParagraph(fldRslt)
+
+	###########################################################################
+
+	# Returns True if we're somewhere inside the field's \fldinst group.
+	def __inFieldinst(self):
+
+		private = self._parser._fullStateCache['private']
+		return 'inFieldinst' in private and private['inFieldinst']
+
+	###########################################################################
+
+	# Returns True if we're somewhere inside the field's \fldrslt group.
+	def __inFieldrslt(self):
+
+		return 'inFieldrslt' in self._parser._fullStateCache['private'] and self._parser._fullStateCache['private']['inFieldrslt']
+
+	###########################################################################
+
+	# Groups nested inside \fldrslt are part of its raw RTF.
+	def _parseOpenBrace(self):
+
+		if self.__inFieldrslt():
+			self.__fldRslt.append('{')
+
+		return super()._parseOpenBrace()
 
 	###########################################################################
 
@@ -38,20 +77,31 @@ class FieldState(ParseState):
 
 		# Once we've finished with the field group, we can stop parsing in this
 		# state.
-		if 'inField' not in self._parser._fullState['private']:
+		if 'inField' not in self._parser._fullStateCache['private']:
 			self.__append()
 			return False
-		else:
-			return True
+
+		# We just closed a group nested inside \fldrslt
+		elif self.__inFieldrslt():
+			self.__fldRslt.append('}')
+
+		return True
 
 	###########################################################################
 
 	def _parseControl(self, word, param):
 
+		# \fldrslt is handed to the onField callback as raw RTF, so control
+		# words inside it are passed through rather than executed (otherwise,
+		# formatting inside the field would leak into the surrounding state.)
+		if self.__inFieldrslt():
+			self.__fldRslt.append(self._parser._curToken[1])
+			return True
+
 		# If we're parsing a \fldinst value and encounter another control word
 		# with the \* prefix, we know we're done parsing the parts of \fldinst
 		# we care about (this will change as I handle more of the RTF spec.)
-		if '\\*' == word and 'inFieldinst' in self._parser._curState['private'] and self._parser._curState['private']['inFieldinst']:
+		elif '\\*' == word and 'inFieldinst' in self._parser._curState['private'] and self._parser._curState['private']['inFieldinst']:
 			self._parser._setStateValue('private', 'inFieldinst', False)
 			return True
 
@@ -67,6 +117,13 @@ class FieldState(ParseState):
 			self._parser._setStateValue('private', 'inFieldinst', True)
 			return True
 
+		# Escaped characters are part of the instruction. Switches are
+		# written with an escaped backslash (as in HYPERLINK "..." \\l "x"),
+		# which would otherwise end up in the paragraph's text.
+		elif word in INSTRUCTION_ESCAPES and self.__inFieldinst():
+			self.__fldInst.append(INSTRUCTION_ESCAPES[word])
+			return True
+
 		else:
 			return super()._parseControl(word, param)
 
@@ -74,11 +131,13 @@ class FieldState(ParseState):
 
 	def _parseCharacter(self, token):
 
-		if 'inFieldrslt' in self._parser._fullState['private'] and self._parser._fullState['private']['inFieldrslt']:
-			self.__fldRslt += token
+		private = self._parser._fullStateCache['private']
+
+		if 'inFieldrslt' in private and private['inFieldrslt']:
+			self.__fldRslt.append(token)
 
-		elif 'inFieldinst' in self._parser._fullState['private'] and self._parser._fullState['private']['inFieldinst']:
-			self.__fldInst += token
+		elif 'inFieldinst' in private and private['inFieldinst']:
+			self.__fldInst.append(token)
 
 		return True
 
@@ -19,7 +19,7 @@ class GroupSkipState(ParseState):
 
 		# Once we've finished skipping over the group, we can stop parsing in
 		# this state.
-		if 'groupSkip' not in self._parser._fullState['private']:
+		if 'groupSkip' not in self._parser._fullStateCache['private']:
 			return False
 		else:
 			return True
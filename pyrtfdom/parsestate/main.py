@@ -69,12 +69,14 @@ class MainState(ParseState):
 
 		# Beginning of a field
 		elif TokenType.OPEN_BRACE == self._parser._prevToken[0] and '\\field' == word:
+			self._parser._groupStart = self._parser._tokenStart - 1
 			state = FieldState(self._parser)
 			state.parse()
 			return True
 
 		# We've entered an embedded image.
 		elif TokenType.OPEN_BRACE == self._parser._prevToken[0] and '\\pict' == word:
+			self._parser._groupStart = self._parser._tokenStart - 1
 			state = PictState(self._parser)
 			state.parse()
 			return True
@@ -2,7 +2,7 @@
 
 import binascii
 
-from ..tokentype import TokenType
+from .groupskip import GroupSkipState
 from .state import ParseState
 
 class PictState(ParseState):
@@ -15,8 +15,8 @@ class PictState(ParseState):
 		self._parser._setStateValue('private', 'pictAttributes', {})
 
 		# Initialize image data and ID
-		self.__data = ''
-		self.__blipUIDBuffer = '' # used for parsing integer ID
+		self.__data = []
+		self.__blipUIDBuffer = [] # used for parsing integer ID
 		self.__blipUID = False # contains the actual integer ID
 
 	###########################################################################
@@ -27,7 +27,15 @@ class PictState(ParseState):
 
 		callback = self._parser._getCallback('onImage')
 		if callback:
-			callback(self._parser, pictAttributes, binascii.unhexlify(self.__data))
+
+			# A damaged image isn't worth giving up on the rest of the
+			# document for
+			try:
+				image = binascii.unhexlify(''.join(self.__data))
+			except binascii.Error:
+				image = b''
+
+			callback(self._parser, pictAttributes, image)
 
 	###########################################################################
 
@@ -40,11 +48,12 @@ class PictState(ParseState):
 		# We're finished parsing an image ID (other possible source of ID is
 		# the bliptag control word.)
 		if 'inBlipUID' in oldFullStatePrivate and oldFullStatePrivate['inBlipUID']:
-			self.__blipUID = int(self.__blipUIDBuffer.lstrip('0'), 16)
+			self.__blipUID = int(''.join(self.__blipUIDBuffer).lstrip('0') or '0', 16)
+			return True
 
 		# Once we've finished with the pict group, we can stop parsing in this
 		# state.
-		elif 'inPict' not in self._parser._fullState['private']:
+		elif 'inPict' not in self._parser._fullStateCache['private']:
 			self.__append(oldFullStatePrivate['pictAttributes'])
 			return False
 		else:
@@ -61,7 +70,7 @@ class PictState(ParseState):
 
 			# We already got the ID in a simpler way, so we can skip over this destination
 			if self.__blipUID:
-				state = SkipGroupState()
+				state = GroupSkipState(self._parser)
 				state.parse()
 
 			# We haven't gotten the ID yet, so go ahead and parse this destination
@@ -170,55 +179,14 @@ class PictState(ParseState):
 
 	###########################################################################
 
-	# This is ordinarily an abstract function and I'm required to implement it,
-	# but it's not actually used because I've overriden self._parse to solve a
-	# significant performance issue.
+	# Collects the image's hex data (or the ID, if we're inside \blipuid) as a
+	# list of pieces, which are only joined once the group is complete.
 	def _parseCharacter(self, token):
 
-		return True
-
-	###########################################################################
-
-	# I had to override this because repeated calls to self._parseCharacter
-	# result in terrible performance for even small images. This isn't a
-	# beautiful solution, but it works *really* well. Prepare your nose for a
-	# code smell (this is mostly a cut-and-paste from the ParseState class's
-	# method with the call to self._parseCharacter removed.)
-	def _parse(self):
-
-		if self._parser._content:
-
-			self._parser._curToken = self._getNextToken()
+		if 'inBlipUID' in self._parser._curState['private'] and self._parser._curState['private']['inBlipUID']:
+			self.__blipUIDBuffer.append(token)
 
-			while TokenType.EOF != self._parser._curToken[0]:
-
-				if TokenType.OPEN_BRACE == self._parser._curToken[0]:
-					if not self._parseOpenBrace():
-						return
-
-				# Restore the previous state.
-				elif TokenType.CLOSE_BRACE == self._parser._curToken[0]:
-					if not self._parseCloseBrace():
-						return
-
-				# We're executing a control word. Execute this before
-				# appending tokens to any special destination or group that
-				# might contain control words.
-				elif TokenType.CONTROL_WORDORSYM == self._parser._curToken[0]:
-					tokenParts = self.__splitControlWord(self._parser._curToken)
-					if not self._parseControl(tokenParts[0], tokenParts[1]):
-						return
-
-				### Begin code that diverges from ParseState.parse() ###
-
-				elif 'inBlipUID' in self._parser._curState['private'] and self._parser._curState['private']['inBlipUID']:
-					self.__blipUIDBuffer += token
-
-				elif not token.isspace():
-					self.__data += token
-
-				###  End code that diverges from ParseState.parse()  ###
-
-				self._parser._prevToken = self._parser._curToken
-				self._parser._curToken = self._getNextToken()
+		elif not token.isspace():
+			self.__data.append(token)
 
+		return True
@@ -5,6 +5,9 @@ from abc import ABCMeta, abstractmethod
 
 from ..tokentype import TokenType
 
+# Matches the numeric parameter of a control word
+CONTROL_PARAMETER = re.compile(r'-?\d+')
+
 # The parser is modeled loosely on a state machine. When we parse different
 # kinds of groups, we're going to enter different states. The main body of the
 # document is considered one state, and is the default state we enter when we
@@ -15,6 +18,14 @@ class ParseState(object):
 
 		self._parser = parser
 
+		# If the parser is being profiled or traced, let the profiler and
+		# tracer instrument us
+		if parser._profiler is not None:
+			parser._profiler._instrumentState(self)
+
+		if parser._tracer is not None:
+			parser._tracer._instrumentState(self)
+
 	###########################################################################
 
 	# Splits a control word token into its word and parameter parts. Returns an
@@ -24,7 +35,7 @@ class ParseState(object):
 
 		control = token[1].strip()
 
-		paramSearch = re.search('-?\d+', control)
+		paramSearch = CONTROL_PARAMETER.search(control)
 		if paramSearch:
 			paramStartIndex = paramSearch.start()
 			word = control[0:paramStartIndex]
@@ -98,8 +109,12 @@ class ParseState(object):
 		if not self._parser._content:
 			return False
 
+		# Remember where the token starts, so that nodes can be mapped back to
+		# the RTF they came from
+		self._parser._tokenStart = self._parser._curPos
+
 		# We've reached the end of the file
-		elif self._parser._curPos >= len(self._parser._content):
+		if self._parser._curPos >= len(self._parser._content):
 			return [TokenType.EOF, '']
 
 		# Control words and their parameters count as single tokens
@@ -144,18 +159,20 @@ class ParseState(object):
 	# should return from the current call to self.parse().
 	def _parseCloseBrace(self, callOnStateChange = True):
 
-		oldStateFullAttributes = self._parser._fullState
-		oldStateFullAttributes.pop('private', None)
+		# Copying the full state is expensive, so we only do it if there's
+		# somebody to hand the copies to.
+		callback = self._parser._getCallback('onStateChange') if callOnStateChange else None
 
-		self._parser._popStateStack()
+		if callback:
+			oldStateFullAttributes = self._parser._fullState
+			oldStateFullAttributes.pop('private', None)
 
-		newStateFullAttributes = self._parser._fullState
-		newStateFullAttributes.pop('private', None)
+		self._parser._popStateStack()
 
-		if callOnStateChange:
-			callback = self._parser._getCallback('onStateChange')
-			if callback:
-				callback(self._parser, oldStateFullAttributes, newStateFullAttributes)
+		if callback:
+			newStateFullAttributes = self._parser._fullState
+			newStateFullAttributes.pop('private', None)
+			callback(self._parser, oldStateFullAttributes, newStateFullAttributes)
 
 		return True
 
@@ -257,10 +274,15 @@ class ParseState(object):
 			self._parser._appendToCurrentParagraph(time.strftime("%I:%M:%S %p"))
 
 		# A character of the form \uXXX to be added to the current paragraph.
-		# Unlike \'XX, \u takes a decimal number instead of hex.
+		# Unlike \'XX, \u takes a decimal number instead of hex. Since the
+		# parameter is a signed 16-bit integer, characters above 32767 are
+		# written as negative numbers.
 		elif '\\u' == word and param:
 			try:
-				self._parser._appendToCurrentParagraph(chr(int(param, 10)))
+				charCode = int(param, 10)
+				if charCode < 0:
+					charCode += 65536
+				self._parser._appendToCurrentParagraph(chr(charCode))
 			except ValueError:
 				return
 
@@ -392,6 +414,31 @@ class ParseState(object):
 
 	###########################################################################
 
+	# Handles the current token. If this returns false instead of true, it
+	# means we should return from the current call to self.parse().
+	def _parseToken(self):
+
+		if TokenType.OPEN_BRACE == self._parser._curToken[0]:
+			return self._parseOpenBrace()
+
+		# Restore the previous state.
+		elif TokenType.CLOSE_BRACE == self._parser._curToken[0]:
+			return self._parseCloseBrace()
+
+		# We're executing a control word. Execute this before appending tokens
+		# to any special destination or group that might contain control
+		# words.
+		elif TokenType.CONTROL_WORDORSYM == self._parser._curToken[0]:
+			tokenParts = self._splitControlWord(self._parser._curToken)
+			return self._parseControl(tokenParts[0], tokenParts[1])
+
+		# Just an ordinary printable character (note that literal newlines are
+		# ignored. Only \line will result in an inserted \n.
+		else:
+			return self._parseCharacter(self._parser._curToken[1])
+
+	###########################################################################
+
 	# Parse the RTF and return an array of formatted paragraphs.
 	# IMPORTANT: You might find that certain types of large data (such as
 	# embedded images) will perform horribly due to Python's high function call
@@ -407,28 +454,30 @@ class ParseState(object):
 
 			while TokenType.EOF != self._parser._curToken[0]:
 
-				if TokenType.OPEN_BRACE == self._parser._curToken[0]:
-					if not self._parseOpenBrace():
-						return
+				if not self._parseToken():
+					return
 
-				# Restore the previous state.
-				elif TokenType.CLOSE_BRACE == self._parser._curToken[0]:
-					if not self._parseCloseBrace():
-						return
+				self._parser._prevToken = self._parser._curToken
+				self._parser._curToken = self._getNextToken()
 
-				# We're executing a control word. Execute this before
-				# appending tokens to any special destination or group that
-				# might contain control words.
-				elif TokenType.CONTROL_WORDORSYM == self._parser._curToken[0]:
-					tokenParts = self._splitControlWord(self._parser._curToken)
-					if not self._parseControl(tokenParts[0], tokenParts[1]):
-						return
+	###########################################################################
 
-				# Just an ordinary printable character (note that literal
-				# newlines are ignored. Only \line will result in an inserted \n.
-				elif not self._parseCharacter(self._parser._curToken[1]):
-						return
+	# Same as parse(), except that this is a generator which yields after each
+	# token so that parsing can be paused and resumed (or abandoned) by the
+	# caller. Groups handled by nested states (fields, images, etc.) are still
+	# parsed in a single step.
+	def iterParse(self):
+
+		if self._parser._content:
+
+			self._parser._curToken = self._getNextToken()
+
+			while TokenType.EOF != self._parser._curToken[0]:
+
+				if not self._parseToken():
+					return
+
+				yield
 
 				self._parser._prevToken = self._parser._curToken
 				self._parser._curToken = self._getNextToken()
-
@@ -15,8 +15,10 @@ class StylesheetState(ParseState):
 	# Inserts the currently parsed style into the stylesheet.
 	def __insertStyle(self):
 
-		if 'groupSkip' not in self._parser._fullState['private'] and 'styleName' in self._parser._curState['private'] and 'styleType' in self._parser._curState['private'] and 'styleIndex' in self._parser._curState['private'] and 'styleProperties' in self._parser._curState['private']:
-			self._parser._insertStyle(self._parser._curState['private']['styleType'], self._parser._curState['private']['styleIndex'], {'name': self._parser._curState['private']['styleName'], 'attributes': self._parser._curState['private']['styleProperties']})
+		# A style doesn't have to define any properties (the default
+		# paragraph style usually doesn't.)
+		if 'groupSkip' not in self._parser._fullStateCache['private'] and 'styleName' in self._parser._curState['private'] and 'styleType' in self._parser._curState['private'] and 'styleIndex' in self._parser._curState['private']:
+			self._parser._insertStyle(self._parser._curState['private']['styleType'], self._parser._curState['private']['styleIndex'], {'name': ''.join(self._parser._curState['private']['styleName']), 'attributes': self._parser._curState['private'].get('styleProperties', {})})
 
 	###########################################################################
 
@@ -30,23 +32,22 @@ class StylesheetState(ParseState):
 
 	###########################################################################
 
-	# Look out for when we've finished with the skipped group.
+	# Look out for when we've finished with the stylesheet group.
 	def _parseCloseBrace(self):
 
-		retVal = True
+		# If we just finished a style definition, insert it into the
+		# stylesheet (this has to happen before its state is popped.)
+		self.__insertStyle()
 
-		# Once we've finished skipping over the group, we can stop parsing in
-		# this state.
-		if 'inStylesheet' not in self._parser._fullState['private']:
-			self.__updateDefaults()
-			retVal = False
+		super()._parseCloseBrace(False)
 
-		# We're inserting a newly parsed style into the stylesheet
-		else:
-			self.__insertStyle()
+		# Once we've closed the stylesheet group itself, we can stop parsing
+		# in this state.
+		if 'inStylesheet' not in self._parser._fullStateCache['private']:
+			self.__updateDefaults()
+			return False
 
-		super()._parseCloseBrace(False)
-		return retVal
+		return True
 
 	###########################################################################
 
@@ -55,7 +56,7 @@ class StylesheetState(ParseState):
 
 		# If we're in the middle of a style that's invalidly formatted, skip it
 		# in the hopes that the rest of the document is okay.
-		if 'groupSkip' not in self._parser._fullState['private']:
+		if 'groupSkip' not in self._parser._fullStateCache['private']:
 
 			# We're defining a new style definition
 			if TokenType.OPEN_BRACE == self._parser._prevToken[0]:
@@ -197,15 +198,16 @@ class StylesheetState(ParseState):
 
 	###########################################################################
 
-	# We're parsing the style definition's name
+	# We're parsing the style definition's name, which is collected as a list
+	# of pieces and joined once the style is complete (see __insertStyle().)
 	def _parseCharacter(self, token):
 
-		if 'groupSkip' not in self._parser._fullState['private'] and ';' != token and '\n' != token:
-			styleName = ''
-			if 'styleName' in self._parser._curState['private']:
-				styleName = self._parser._curState['private']['styleName']
-			styleName += token
-			self._parser._setStateValue('private', 'styleName', styleName)
+		if 'groupSkip' not in self._parser._fullStateCache['private'] and ';' != token and '\n' != token:
+			private = self._parser._curState['private']
+			if 'styleName' in private and not self._parser._isInherited('private', 'styleName'):
+				private['styleName'].append(token)
+			else:
+				self._parser._setStateValue('private', 'styleName', private.get('styleName', []) + [token])
 
 		return True
 
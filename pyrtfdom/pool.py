@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+# Keeps idle DOMs around for reuse. Constructing an RTFDOM sets up its parser
+# callbacks, its field drivers and a new RTFParser, which can take longer than
+# actually parsing a short snippet such as a clipboard fragment or a chat
+# message. Since reset() only clears per-document state, a DOM can parse one
+# document after another indefinitely, and a pool hands out DOMs that aren't
+# busy so that services parsing lots of small documents (from any number of
+# threads) don't have to construct a new one every time.
+#
+# DOMs go back to the pool as they are, so field drivers registered on a
+# borrowed DOM stay registered for whoever borrows it next. Give each
+# configuration of drivers its own pool.
+
+import contextlib, threading
+
+# Default number of idle DOMs a pool holds on to. A pool can hand out any
+# number of DOMs at once; this only limits how many are kept afterwards.
+DEFAULT_MAX_SIZE = 8
+
+class DOMPool(object):
+
+	# domClass is the class of DOM to create (usually RTFDOM) and domOptions
+	# are the keyword arguments it's created with. At most maxSize idle DOMs
+	# are kept.
+	def __init__(self, domClass, domOptions = None, maxSize = DEFAULT_MAX_SIZE):
+
+		self.__domClass = domClass
+		self.__domOptions = domOptions or {}
+		self.__maxSize = maxSize
+
+		# DOMs that are ready to be handed out
+		self.__idle = []
+		self.__lock = threading.Lock()
+
+	###########################################################################
+
+	# The number of idle DOMs in the pool.
+	def __len__(self):
+
+		return len(self.__idle)
+
+	###########################################################################
+
+	# Returns an idle DOM, or a new one if there aren't any. It should be
+	# handed back with release() once the caller is done with it.
+	def acquire(self):
+
+		with self.__lock:
+			if self.__idle:
+				return self.__idle.pop()
+
+		return self.__domClass(**self.__domOptions)
+
+	###########################################################################
+
+	# Returns a DOM to the pool. It's reset first, so that it doesn't hold on
+	# to the last document it parsed, and dropped if the pool is already full.
+	def release(self, dom):
+
+		dom.reset()
+
+		with self.__lock:
+			if len(self.__idle) < self.__maxSize:
+				self.__idle.append(dom)
+
+	###########################################################################
+
+	# Context manager that acquires a DOM and releases it afterwards.
+	@contextlib.contextmanager
+	def borrow(self):
+
+		dom = self.acquire()
+
+		try:
+			yield dom
+		finally:
+			self.release(dom)
+
+	###########################################################################
+
+	# Parses an RTF string with one of the pool's DOMs and returns the root of
+	# its tree. The tree stays valid after the DOM goes back to the pool.
+	def parseString(self, content):
+
+		with self.borrow() as dom:
+			dom.openString(content)
+			dom.parse()
+			return dom.rootNode
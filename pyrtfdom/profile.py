@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+
+# Opt-in instrumentation for RTFParser. A profiler attached to a parser counts
+# the tokens it reads (by type), the control words it executes (by name), how
+# many times each parse state is entered and how many times each callback is
+# called, and measures how much wall time goes into the tokenizer, each parse
+# state and each callback:
+#
+#   profiler = ParseProfiler()
+#   parser = RTFParser({'callbacks': callbacks, 'profiler': profiler})
+#   parser.openString(content)
+#   parser.parse()
+#   print(formatReport(profiler.report()))
+#
+# RTFDOM(profile = True) does the same for a DOM (see RTFDOM.profiler.)
+#
+# Instead of checking whether profiling is on as it goes, the parser lets the
+# profiler wrap its callbacks when it's attached and each parse state's
+# methods when the state is created. A parser without a profiler runs exactly
+# the same code it always has.
+#
+# Time is measured exclusively: the time reported for a state doesn't include
+# time spent in the tokenizer, in callbacks or in states nested inside it, so
+# the tokenizer, states, callbacks and 'other' (time spent by the parser
+# outside of any state) add up to the total.
+
+import time
+
+from .tokentype import TokenType
+
+class ParseProfiler(object):
+
+	def __init__(self):
+
+		self.reset()
+
+	###########################################################################
+
+	# Discards everything that's been collected so far.
+	def reset(self):
+
+		# Number of calls to RTFParser.parse() or iterParse(), and the total
+		# time they took
+		self.__parses = 0
+		self.__seconds = 0.0
+		self.__start = 0.0
+
+		self.__tokens = {}
+		self.__controlWords = {}
+
+		# Timed sections of the parser, each a dict with a 'seconds' key
+		# along with whatever it counts
+		self.__other = {'seconds': 0.0}
+		self.__tokenizer = {'seconds': 0.0}
+		self.__states = {}
+		self.__callbacks = {}
+
+		# The sections we're currently inside of, innermost last, and when
+		# time was last charged to the innermost one
+		self.__stack = []
+		self.__mark = 0.0
+
+	###########################################################################
+
+	# Charges the time since the last call to the innermost section.
+	def __charge(self):
+
+		now = time.perf_counter()
+
+		if self.__stack:
+			self.__stack[-1]['seconds'] += now - self.__mark
+
+		self.__mark = now
+
+	###########################################################################
+
+	# Enters a timed section.
+	def __enter(self, section):
+
+		self.__charge()
+		self.__stack.append(section)
+
+	###########################################################################
+
+	# Leaves the innermost timed section.
+	def __leave(self):
+
+		self.__charge()
+		self.__stack.pop()
+
+	###########################################################################
+
+	# Called by RTFParser when it starts parsing a document.
+	def _beginParse(self):
+
+		self.__parses += 1
+		self.__stack = []
+		self.__start = time.perf_counter()
+		self.__enter(self.__other)
+
+	###########################################################################
+
+	# Called by RTFParser when it's done parsing a document (or parsing was
+	# interrupted by an exception.)
+	def _endParse(self):
+
+		self.__charge()
+		self.__stack = []
+		self.__seconds += self.__mark - self.__start
+
+	###########################################################################
+
+	# Counts a token returned by the tokenizer.
+	def __countToken(self, state, token):
+
+		tokenType = token[0].name
+		self.__tokens[tokenType] = self.__tokens.get(tokenType, 0) + 1
+
+		if TokenType.CONTROL_WORDORSYM == token[0]:
+			word = state._splitControlWord(token)[0]
+			self.__controlWords[word] = self.__controlWords.get(word, 0) + 1
+
+	###########################################################################
+
+	# Called by ParseState when a new state is created. Counts the state's
+	# entry and replaces its tokenizer and parse methods with timed versions.
+	def _instrumentState(self, state):
+
+		name = type(state).__name__
+
+		if name not in self.__states:
+			self.__states[name] = {'entries': 0, 'seconds': 0.0}
+
+		section = self.__states[name]
+		section['entries'] += 1
+
+		getNextToken = state._getNextToken
+		parse = state.parse
+		iterParse = state.iterParse
+
+		def profiledGetNextToken():
+
+			self.__enter(self.__tokenizer)
+
+			try:
+				token = getNextToken()
+			finally:
+				self.__leave()
+
+			if token and TokenType.EOF != token[0]:
+				self.__countToken(state, token)
+
+			return token
+
+		def profiledParse():
+
+			self.__enter(section)
+
+			try:
+				return parse()
+			finally:
+				self.__leave()
+
+		# Time spent between steps belongs to whoever is driving the
+		# generator, not the state.
+		def profiledIterParse():
+
+			steps = iterParse()
+
+			while True:
+
+				self.__enter(section)
+
+				try:
+					next(steps)
+				except StopIteration:
+					return
+				finally:
+					self.__leave()
+
+				yield
+
+		state._getNextToken = profiledGetNextToken
+		state.parse = profiledParse
+		state.iterParse = profiledIterParse
+
+	###########################################################################
+
+	# Called by RTFParser when the profiler is attached. Returns a copy of
+	# callbacks (a dict mapping callback names to functions) in which every
+	# callback (other than those that are None) is counted and timed.
+	def _wrapCallbacks(self, callbacks):
+
+		return {
+			name: self.__wrapCallback(name, callback) if callback is not None else None
+			for name, callback in callbacks.items()
+		}
+
+	###########################################################################
+
+	# Returns a counted and timed version of a single callback.
+	def __wrapCallback(self, name, callback):
+
+		def profiledCallback(*args):
+
+			if name not in self.__callbacks:
+				self.__callbacks[name] = {'calls': 0, 'seconds': 0.0}
+
+			section = self.__callbacks[name]
+			section['calls'] += 1
+
+			self.__enter(section)
+
+			try:
+				return callback(*args)
+			finally:
+				self.__leave()
+
+		return profiledCallback
+
+	###########################################################################
+
+	# Returns everything that's been collected as a dict of the form:
+	#
+	# {
+	#   'parses':       <number of documents parsed>,
+	#   'seconds':      <total time spent parsing>,
+	#   'tokens':       {<token type>: <count>, ...},
+	#   'controlWords': {<control word or symbol>: <count>, ...},
+	#   'tokenizer':    {'seconds': <time spent reading tokens>},
+	#   'states':       {<state class>: {'entries': <count>, 'seconds': <time>}, ...},
+	#   'callbacks':    {<callback name>: {'calls': <count>, 'seconds': <time>}, ...},
+	#   'other':        {'seconds': <time spent outside of any state>}
+	# }
+	def report(self):
+
+		return {
+			'parses':       self.__parses,
+			'seconds':      self.__seconds,
+			'tokens':       dict(self.__tokens),
+			'controlWords': dict(self.__controlWords),
+			'tokenizer':    dict(self.__tokenizer),
+			'states':       {name: dict(section) for name, section in self.__states.items()},
+			'callbacks':    {name: dict(section) for name, section in self.__callbacks.items()},
+			'other':        dict(self.__other)
+		}
+
+###############################################################################
+
+# Returns a report (as returned by ParseProfiler.report()) as a human-readable
+# table, with the most expensive parts of the parser first. At most
+# controlWords of the most common control words are listed.
+def formatReport(report, controlWords = 20):
+
+	total = report['seconds']
+
+	def percent(seconds):
+		return 100 * seconds / total if total else 0.0
+
+	sections = [('tokenizer', '', report['tokenizer']['seconds'])]
+	sections += [('state ' + name, section['entries'], section['seconds']) for name, section in report['states'].items()]
+	sections += [('callback ' + name, section['calls'], section['seconds']) for name, section in report['callbacks'].items()]
+	sections.append(('other', '', report['other']['seconds']))
+
+	lines = ['%d parse(s) in %.4fs' % (report['parses'], total), '']
+	lines.append('%-32s %10s %10s %7s' % ('section', 'count', 'seconds', '%'))
+
+	for name, count, seconds in sorted(sections, key = lambda section: -section[2]):
+		lines.append('%-32s %10s %10.4f %6.1f%%' % (name, count, seconds, percent(seconds)))
+
+	lines += ['', '%-32s %10s' % ('token type', 'count')]
+	for tokenType, count in sorted(report['tokens'].items(), key = lambda item: -item[1]):
+		lines.append('%-32s %10d' % (tokenType, count))
+
+	lines += ['', '%-32s %10s' % ('control word', 'count')]
+	for word, count in sorted(report['controlWords'].items(), key = lambda item: -item[1])[:controlWords]:
+		lines.append('%-32s %10d' % (word, count))
+
+	return '\n'.join(lines) + '\n'
@@ -0,0 +1,465 @@
+# -*- coding: utf-8 -*-
+
+# A compact, versioned binary format for DOM trees, so that a document can be
+# parsed once and reloaded many times without paying for the parse again.
+#
+# A serialized tree consists of a header followed by three sections:
+#
+# Node table:   One fixed-size record per node in document (pre-)order,
+#               containing the node's type, its parent, first child and next
+#               sibling, and references to its value and attributes.
+# String table: Every distinct string, stored once. Text values are stored
+#               here, and so are attributes, which are stored as JSON.
+# Blob table:   The binary data of every image.
+#
+# The string and blob tables each begin with an array of offsets, so any
+# string or blob can be found without reading the ones before it. Because
+# everything is addressed by offset, a file can be memory-mapped and read
+# lazily: load() returns proxy nodes that only decode what's actually
+# accessed.
+
+import json, mmap, struct
+
+from .columnar import NODE_TYPES, NODE_TYPE_CODES, LEAF_TYPES, NONE
+from .elements import DOMElement
+
+# Identifies a serialized tree
+MAGIC = b'RTFD'
+
+# Incremented whenever the format changes in a way that older readers can't
+# handle.
+FORMAT_VERSION = 1
+
+# magic, version, reserved, node count, string count, blob count
+HEADER = struct.Struct('<4sHHIII')
+
+# type, flags, parent, first child, next sibling, value, attributes
+NODE = struct.Struct('<BBxxiiiii')
+
+# Set in a node's flags if its value is a blob rather than a string
+VALUE_IS_BLOB = 0x01
+
+# Offsets in the string and blob tables
+OFFSET = struct.Struct('<Q')
+
+###############################################################################
+
+# Returns a serialized tree as bytes. node is the root of the tree to
+# serialize (an RTFDOM's rootNode, or any node inside it), and can come from
+# any backend.
+def dumps(node):
+
+	nodeTable = bytearray()
+
+	# Interned strings and their ids (attributes are interned as JSON, so
+	# identical attribute dicts are only stored once.)
+	strings = {}
+	blobs = []
+
+	def intern(string):
+		if string not in strings:
+			strings[string] = len(strings)
+		return strings[string]
+
+	# Parents, first children and next siblings are only known once later
+	# nodes have been numbered, so they're filled in afterward.
+	parents = []
+	firstChildren = []
+	nextSiblings = []
+	lastChildren = []
+
+	# Numbers nodes in document order without recursing. Each entry on the
+	# stack is (node, parent id).
+	stack = [(node, NONE)]
+	records = []
+
+	while stack:
+
+		node, parent = stack.pop()
+		nodeId = len(records)
+
+		parents.append(parent)
+		firstChildren.append(NONE)
+		nextSiblings.append(NONE)
+		lastChildren.append(NONE)
+
+		if parent != NONE:
+			if lastChildren[parent] == NONE:
+				firstChildren[parent] = nodeId
+			else:
+				nextSiblings[lastChildren[parent]] = nodeId
+			lastChildren[parent] = nodeId
+
+		flags = 0
+		if isinstance(node.value, (bytes, bytearray, memoryview)):
+			flags |= VALUE_IS_BLOB
+			value = len(blobs)
+			blobs.append(node.value)
+		else:
+			value = intern(node.value)
+
+		attributes = node.attributes
+		if len(attributes):
+			attributes = intern(json.dumps(dict(attributes)))
+		else:
+			attributes = NONE
+
+		records.append((NODE_TYPE_CODES[node.nodeType], flags, value, attributes))
+
+		children = node.children
+		if children:
+			for child in reversed(children):
+				stack.append((child, nodeId))
+
+	for nodeId, (nodeType, flags, value, attributes) in enumerate(records):
+		nodeTable += NODE.pack(
+			nodeType, flags, parents[nodeId], firstChildren[nodeId],
+			nextSiblings[nodeId], value, attributes
+		)
+
+	output = [HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(records), len(strings), len(blobs)), nodeTable]
+
+	# Strings are already in id order, since dicts remember insertion order
+	encoded = [string.encode('utf-8') for string in strings]
+	output.append(_offsets(encoded))
+	output.extend(encoded)
+
+	output.append(_offsets(blobs))
+	output.extend(bytes(blob) for blob in blobs)
+
+	return b''.join(output)
+
+###############################################################################
+
+# Returns the offset table for a list of strings or blobs.
+def _offsets(items):
+
+	offsets = bytearray(OFFSET.pack(0))
+	offset = 0
+
+	for item in items:
+		offset += len(item)
+		offsets += OFFSET.pack(offset)
+
+	return offsets
+
+###############################################################################
+
+# Serializes a tree to out, which is either a filename or a binary file
+# object.
+def dump(node, out):
+
+	data = dumps(node)
+
+	if isinstance(out, str):
+		with open(out, 'wb') as outFile:
+			outFile.write(data)
+	else:
+		out.write(data)
+
+###############################################################################
+
+# Loads a serialized tree from a bytes-like object. If lazy is True, the
+# returned root node is a read-only SerializedNode that decodes nodes only as
+# they're accessed. Otherwise, the whole tree is materialized as DOMElements.
+def loads(data, lazy = True):
+
+	tree = SerializedTree(data)
+
+	return tree.root if lazy else tree.materialize()
+
+###############################################################################
+
+# Loads a serialized tree from source, which is either a filename or a binary
+# file object. Files are memory-mapped, so when lazy is True (see loads())
+# only the parts of the file that are actually accessed are ever read.
+def load(source, lazy = True):
+
+	if isinstance(source, str):
+		with open(source, 'rb') as sourceFile:
+			return loads(_map(sourceFile), lazy)
+
+	try:
+		data = _map(source)
+	except (AttributeError, OSError, ValueError):
+		data = source.read()
+
+	return loads(data, lazy)
+
+###############################################################################
+
+# Memory-maps a file for reading. The mapping stays valid after the file is
+# closed.
+def _map(sourceFile):
+
+	return mmap.mmap(sourceFile.fileno(), 0, access = mmap.ACCESS_READ)
+
+###############################################################################
+###############################################################################
+
+# Read-only access to a serialized tree.
+class SerializedTree(object):
+
+	def __init__(self, data):
+
+		self.__data = data
+
+		if len(data) < HEADER.size:
+			raise ValueError('Not a serialized DOM tree.')
+
+		magic, version, reserved, nodeCount, stringCount, blobCount = HEADER.unpack_from(data, 0)
+
+		if MAGIC != magic:
+			raise ValueError('Not a serialized DOM tree.')
+		elif FORMAT_VERSION != version:
+			raise ValueError('Unsupported serialized DOM version ' + str(version) + '.')
+
+		self.__nodeCount = nodeCount
+
+		# Where each section begins
+		self.__nodeTable = HEADER.size
+		self.__stringOffsets = self.__nodeTable + nodeCount * NODE.size
+		self.__strings = self.__stringOffsets + (stringCount + 1) * OFFSET.size
+		self.__blobOffsets = self.__strings + OFFSET.unpack_from(data, self.__strings - OFFSET.size)[0]
+		self.__blobs = self.__blobOffsets + (blobCount + 1) * OFFSET.size
+
+		# Decoded attribute dicts by string id. Attributes are interned, so
+		# there are usually only a handful of distinct ones.
+		self.__attributes = {}
+
+	###########################################################################
+
+	# Number of nodes in the tree
+	def __len__(self):
+
+		return self.__nodeCount
+
+	###########################################################################
+
+	# The root node
+	@property
+	def root(self):
+
+		return SerializedNode(self, 0)
+
+	###########################################################################
+
+	# Returns a proxy for the node with the specified id, or None if the id is
+	# NONE.
+	def node(self, nodeId):
+
+		return None if NONE == nodeId else SerializedNode(self, nodeId)
+
+	###########################################################################
+
+	# Returns a node's raw record.
+	def record(self, nodeId):
+
+		return NODE.unpack_from(self.__data, self.__nodeTable + nodeId * NODE.size)
+
+	###########################################################################
+
+	# Returns the string with the specified id.
+	def string(self, stringId):
+
+		start, = OFFSET.unpack_from(self.__data, self.__stringOffsets + stringId * OFFSET.size)
+		end, = OFFSET.unpack_from(self.__data, self.__stringOffsets + (stringId + 1) * OFFSET.size)
+
+		return str(self.__data[self.__strings + start:self.__strings + end], 'utf-8')
+
+	###########################################################################
+
+	# Returns the blob with the specified id.
+	def blob(self, blobId):
+
+		start, = OFFSET.unpack_from(self.__data, self.__blobOffsets + blobId * OFFSET.size)
+		end, = OFFSET.unpack_from(self.__data, self.__blobOffsets + (blobId + 1) * OFFSET.size)
+
+		return bytes(self.__data[self.__blobs + start:self.__blobs + end])
+
+	###########################################################################
+
+	# Returns the value of the node with the specified id.
+	def getValue(self, nodeId):
+
+		nodeType, flags, parent, firstChild, nextSibling, value, attributes = self.record(nodeId)
+
+		return self.blob(value) if flags & VALUE_IS_BLOB else self.string(value)
+
+	###########################################################################
+
+	# Returns the attributes of the node with the specified id. The returned
+	# dict is shared with other nodes and shouldn't be modified.
+	def getAttributes(self, nodeId):
+
+		attributes = self.record(nodeId)[6]
+
+		if NONE == attributes:
+			return {}
+
+		if attributes not in self.__attributes:
+			self.__attributes[attributes] = json.loads(self.string(attributes))
+
+		return self.__attributes[attributes]
+
+	###########################################################################
+
+	# Iterates through the ids of a node's children.
+	def iterChildren(self, nodeId):
+
+		child = self.record(nodeId)[3]
+
+		while NONE != child:
+			yield child
+			child = self.record(child)[4]
+
+	###########################################################################
+
+	# Builds the whole tree (or the subtree rooted at nodeId) in one linear
+	# pass. Nodes are created by createElement, which defaults to creating
+	# DOMElements. If root is provided, the subtree's children are appended to
+	# it instead of to a newly created root node. Returns the root.
+	def materialize(self, createElement = DOMElement.getElement, root = None, nodeId = 0):
+
+		# (node id, parent element) tuples. Children are pushed in reverse,
+		# so nodes are created in document order and each one is appended
+		# after its previous siblings.
+		stack = [(nodeId, None)]
+
+		while stack:
+
+			nodeId, parent = stack.pop()
+			nodeType, flags, parentId, firstChild, nextSibling, value, attributes = self.record(nodeId)
+
+			if parent is None and root is not None:
+				element = root
+
+			else:
+				element = createElement(NODE_TYPES[nodeType])
+				element.value = self.blob(value) if flags & VALUE_IS_BLOB else self.string(value)
+				for key, attribute in self.getAttributes(nodeId).items():
+					element.attributes[key] = attribute
+
+				if parent is None:
+					root = element
+				else:
+					parent.appendChild(element)
+
+			for child in reversed(list(self.iterChildren(nodeId))):
+				stack.append((child, element))
+
+		return root
+
+###############################################################################
+###############################################################################
+
+# A read-only proxy for a node in a SerializedTree, exposing the same
+# traversal API as DOMElement and ColumnarNode.
+class SerializedNode(object):
+
+	__slots__ = ('__tree', '__index')
+
+	def __init__(self, tree, index):
+
+		self.__tree = tree
+		self.__index = index
+
+	###########################################################################
+
+	def __eq__(self, other):
+
+		return (
+			isinstance(other, SerializedNode) and
+			self.__tree is other.tree and
+			self.__index == other.index
+		)
+
+	def __ne__(self, other):
+
+		return not self.__eq__(other)
+
+	def __hash__(self):
+
+		return hash((id(self.__tree), self.__index))
+
+	###########################################################################
+
+	# The tree the node is stored in
+	@property
+	def tree(self):
+
+		return self.__tree
+
+	###########################################################################
+
+	# The node's position in the tree's node table
+	@property
+	def index(self):
+
+		return self.__index
+
+	###########################################################################
+
+	# Read-only property that identifies the node's type
+	@property
+	def nodeType(self):
+
+		return NODE_TYPES[self.__tree.record(self.__index)[0]]
+
+	###########################################################################
+
+	# Identifies the parent node
+	@property
+	def parent(self):
+
+		return self.__tree.node(self.__tree.record(self.__index)[2])
+
+	###########################################################################
+
+	# Returns a list of the node's children, or False if children aren't
+	# allowed for the node type (same as DOMElement.)
+	@property
+	def children(self):
+
+		if self.nodeType in LEAF_TYPES:
+			return False
+
+		return [SerializedNode(self.__tree, child) for child in self.__tree.iterChildren(self.__index)]
+
+	###########################################################################
+
+	# The node's value
+	@property
+	def value(self):
+
+		return self.__tree.getValue(self.__index)
+
+	###########################################################################
+
+	# The node's attributes
+	@property
+	def attributes(self):
+
+		return self.__tree.getAttributes(self.__index)
+
+	###########################################################################
+
+	# Source spans aren't saved (see RTFDOM), so they're never known.
+	@property
+	def sourceSpan(self):
+
+		return None
+
+	###########################################################################
+
+	# Returns the number of child nodes.
+	def childCount(self):
+
+		return sum(1 for child in self.__tree.iterChildren(self.__index))
+
+	###########################################################################
+
+	# Returns a modifiable copy of the subtree rooted at this node.
+	def materialize(self, createElement = DOMElement.getElement):
+
+		return self.__tree.materialize(createElement, None, self.__index)
@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+
+# Records what the parser does, event by event, so that slow documents can be
+# diagnosed without adding print statements to the parser. A tracer attached
+# to a parser records:
+#
+#   token     every token read (its type, text, offset, group depth and the
+#             parse state that read it), timed from the moment it's read
+#             until the state reads its next one, so that a token's duration
+#             includes everything it set off (such as a nested state)
+#   state     every parse state's run, with the offsets it started and ended
+#             at and the depth of the group it was entered in
+#   callback  every callback call
+#   parse     every call to RTFParser.parse() or iterParse()
+#
+# Only the most recent events are kept (capacity of them), and to trace long
+# documents more cheaply, only every sampleEvery-th token and callback can be
+# recorded. States and parses are always recorded. Traces can be written as
+# JSON lines or in Chrome's trace event format, which can be loaded into
+# chrome://tracing, Perfetto or any other trace viewer:
+#
+#   tracer = ParseTracer()
+#   domTree = RTFDOM(tracer = tracer)
+#   domTree.openFile('slow.rtf')
+#   domTree.parse()
+#
+#   with open('slow.json', 'w') as traceFile:
+#       tracer.writeChromeTrace(traceFile)
+#
+# Like ParseProfiler (see profile.py), a tracer wraps the parser's callbacks
+# when it's attached and each parse state's methods when the state is
+# created, so a parser without one doesn't do any extra work. With iterParse(),
+# time spent by whoever is driving the generator is included in the events
+# that were in progress when it yielded.
+
+import collections, json, time
+
+from .tokentype import TokenType
+
+# Default number of events a tracer keeps
+DEFAULT_CAPACITY = 100000
+
+# Tokens longer than this are cut short in the trace
+TOKEN_TEXT_LENGTH = 32
+
+class ParseTracer(object):
+
+	# capacity is the number of events to keep (older events are discarded
+	# once it's reached), or None to keep all of them. If sampleEvery is
+	# greater than 1, only one of every sampleEvery tokens and callback calls
+	# is recorded.
+	def __init__(self, capacity = DEFAULT_CAPACITY, sampleEvery = 1):
+
+		if capacity is not None and capacity < 1:
+			raise ValueError('Tracer capacity must be at least 1.')
+
+		if sampleEvery < 1:
+			raise ValueError('sampleEvery must be at least 1.')
+
+		self.__capacity = capacity
+		self.__sampleEvery = sampleEvery
+
+		self.reset()
+
+	###########################################################################
+
+	# The number of events that have been recorded, including those that have
+	# since been discarded to make room for newer ones.
+	@property
+	def recorded(self):
+
+		return self.__recorded
+
+	###########################################################################
+
+	# Discards every event and restarts the trace's clock.
+	def reset(self):
+
+		self.__events = collections.deque(maxlen = self.__capacity)
+		self.__recorded = 0
+
+		# Timestamps are microseconds since this moment
+		self.__origin = time.perf_counter()
+
+		# Tokens and callback calls seen so far, for sampling
+		self.__tokens = 0
+		self.__calls = 0
+
+		# When the current call to parse() started
+		self.__parseStart = 0.0
+
+	###########################################################################
+
+	# Returns the current time in microseconds since the trace started.
+	def __now(self):
+
+		return (time.perf_counter() - self.__origin) * 1000000
+
+	###########################################################################
+
+	# Keeps an event.
+	def __record(self, event):
+
+		self.__events.append(event)
+		self.__recorded += 1
+
+	###########################################################################
+
+	# Called by RTFParser when it starts parsing a document.
+	def _beginParse(self):
+
+		self.__parseStart = self.__now()
+
+	###########################################################################
+
+	# Called by RTFParser when it's done parsing a document (or parsing was
+	# interrupted by an exception.)
+	def _endParse(self):
+
+		now = self.__now()
+		self.__record({'event': 'parse', 'ts': self.__parseStart, 'dur': now - self.__parseStart})
+
+	###########################################################################
+
+	# Called by ParseState when a new state is created. Replaces its tokenizer
+	# and parse methods with versions that record events.
+	def _instrumentState(self, state):
+
+		name = type(state).__name__
+		parser = state._parser
+
+		getNextToken = state._getNextToken
+		parse = state.parse
+		iterParse = state.iterParse
+
+		# The state's last token, which is recorded once we know how long it
+		# took
+		pending = [None]
+
+		def finishToken(now):
+
+			event = pending[0]
+
+			if event is not None:
+				event['dur'] = now - event['ts']
+				self.__record(event)
+				pending[0] = None
+
+		def tracedGetNextToken():
+
+			start = self.__now()
+			finishToken(start)
+
+			token = getNextToken()
+
+			if token and TokenType.EOF != token[0]:
+
+				self.__tokens += 1
+
+				if 0 == self.__tokens % self.__sampleEvery:
+					pending[0] = {
+						'event': 'token',
+						'ts':    start,
+						'type':  token[0].name,
+						'text':  token[1][:TOKEN_TEXT_LENGTH],
+						'pos':   parser._tokenStart,
+						'depth': parser._depth,
+						'state': name
+					}
+
+			return token
+
+		# Records the state's run once it's over.
+		def finishState(start, startPos, depth):
+
+			now = self.__now()
+			finishToken(now)
+
+			self.__record({
+				'event': 'state',
+				'ts':    start,
+				'dur':   now - start,
+				'name':  name,
+				'pos':   startPos,
+				'end':   parser._curPos,
+				'depth': depth
+			})
+
+		def tracedParse():
+
+			start, startPos, depth = self.__now(), parser._curPos, parser._depth
+
+			try:
+				return parse()
+			finally:
+				finishState(start, startPos, depth)
+
+		def tracedIterParse():
+
+			start, startPos, depth = self.__now(), parser._curPos, parser._depth
+
+			try:
+				yield from iterParse()
+			finally:
+				finishState(start, startPos, depth)
+
+		state._getNextToken = tracedGetNextToken
+		state.parse = tracedParse
+		state.iterParse = tracedIterParse
+
+	###########################################################################
+
+	# Called by RTFParser when the tracer is attached. Returns a copy of
+	# callbacks (a dict mapping callback names to functions) in which every
+	# callback (other than those that are None) records its calls.
+	def _wrapCallbacks(self, callbacks):
+
+		return {
+			name: self.__wrapCallback(name, callback) if callback is not None else None
+			for name, callback in callbacks.items()
+		}
+
+	###########################################################################
+
+	# Returns a version of a single callback that records its calls. Every
+	# callback is passed the parser as its first argument.
+	def __wrapCallback(self, name, callback):
+
+		def tracedCallback(parser, *args):
+
+			self.__calls += 1
+
+			if self.__calls % self.__sampleEvery:
+				return callback(parser, *args)
+
+			start = self.__now()
+
+			try:
+				return callback(parser, *args)
+
+			finally:
+				self.__record({
+					'event': 'callback',
+					'ts':    start,
+					'dur':   self.__now() - start,
+					'name':  name,
+					'pos':   parser._curPos,
+					'depth': parser._depth
+				})
+
+		return tracedCallback
+
+	###########################################################################
+
+	# Returns the events that have been kept, oldest first. Each event is a
+	# dict with 'event' (its kind), 'ts' (when it started, in microseconds
+	# since the trace started) and 'dur' (how long it took, in microseconds)
+	# along with whatever else was recorded for that kind of event.
+	def events(self):
+
+		return sorted(self.__events, key = lambda event: event['ts'])
+
+	###########################################################################
+
+	# Writes the events to a text file object as JSON lines, one event per
+	# line.
+	def writeJSONLines(self, out):
+
+		for event in self.events():
+			out.write(json.dumps(event) + '\n')
+
+	###########################################################################
+
+	# Writes the events to a text file object in Chrome's trace event format.
+	def writeChromeTrace(self, out):
+
+		traceEvents = []
+
+		for event in self.events():
+
+			if 'token' == event['event']:
+				label = event['type'] + ' ' + event['text']
+			elif 'parse' == event['event']:
+				label = 'parse'
+			else:
+				label = event['name']
+
+			traceEvents.append({
+				'name': label,
+				'cat':  event['event'],
+				'ph':   'X',
+				'ts':   event['ts'],
+				'dur':  event['dur'],
+				'pid':  1,
+				'tid':  1,
+				'args': {key: value for key, value in event.items() if key not in ('event', 'ts', 'dur')}
+			})
+
+		json.dump({'traceEvents': traceEvents, 'displayTimeUnit': 'ms'}, out)
@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+
+# The package's version. It should change whenever the parser's output does.
+# Parse results cached on disk (see cache.py) are keyed by this and by the
+# package's source code, so they're invalidated even if it doesn't.
+VERSION = '1.1'
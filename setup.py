@@ -1,14 +1,22 @@
 from distutils.core import setup
 import setuptools
+
+version = {}
+with open('pyrtfdom/version.py') as versionFile:
+  exec(versionFile.read(), version)
+
 setup(
   name = 'pyrtfdom',
-  packages = setuptools.find_packages(),
-  version = '1.0',
+  packages = setuptools.find_packages(exclude = ['benchmarks', 'benchmarks.*']),
+  version = version['VERSION'],
   license='gpl-3.0',
   description = 'Parses RTF documents into a DOM-like structure',
   author = 'https://github.com/crankycyclops',
   url = 'https://github.com/jvanmalder/pyrtfdom',
   keywords = ['RTF', 'DOM'],
+  entry_points = {
+    'console_scripts': ['pyrtfdom=pyrtfdom.cli:main']
+  },
   classifiers=[
     'Development Status :: 4 - Beta',
     'Intended Audience :: Developers',